@@ -0,0 +1,421 @@
+"""
+Plots of large timing distributions from per-group summaries instead of raw
+samples. summarize() computes, for every group of a frame and with a single
+sort of the values:
+    - the count, mean, standard deviation, minimum, and maximum,
+    - the quartiles and Tukey's whiskers (1.5 IQR), as seaborn's boxplot,
+    - a histogram with a fixed number of bins between the minimum and the
+      maximum,
+    - the outliers beyond the whiskers. The most extreme ones of each side
+      are always kept, so the tail events are drawn whatever the sample
+      size. The number of outliers of each group is kept as well.
+The plotting functions only draw these summaries, so the time to render a
+plot depends on the number of groups and bins, not on the number of samples.
+
+cumulative_summaries() computes the box summaries of growing prefixes of a
+frame (e.g., for the frames of an animation) from cumulative histograms, so
+each sample is only counted once whatever the number of prefixes.
+
+For samples that are streamed instead of held in a frame (see
+trace_stream.py), the summaries are computed by sketch_summaries() from
+bounded state: the sketch of every group (see sketches.py) and a reservoir
+of its most extreme values (see update_extremes()).
+"""
+
+import matplotlib.patches as mpatches
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+import sketches
+
+# Number of histogram bins per group.
+DEFAULT_BINS = 64
+
+# Number of outliers kept per group on each side (below and above the
+# whiskers), starting from the most extreme one.
+DEFAULT_OUTLIER_LIMIT = 50
+
+# Total width of the boxes or strips at an x position, as seaborn's dodge.
+DODGE_WIDTH = 0.8
+
+
+def summarize(df, value, keys, bins=DEFAULT_BINS, outlier_limit=DEFAULT_OUTLIER_LIMIT):
+    """
+    Summarize the value column for every group of keys, in the order of the
+    first appearance of the groups. Return a dictionary with:
+        - "summary": the keys and the "count", "mean", "std", "min", "q1",
+          "med", "q3", "max", "whislo", "whishi", and "outliers" of every
+          group,
+        - "fliers": the keys and the value of the kept outliers,
+        - "histograms": the keys and the "low", "high", and "count" of every
+          non-empty bin.
+    """
+    df = df[df[value].notna()]
+    grouped = df.groupby(keys, observed=True, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    groups = grouped.size().index.to_frame(index=False)
+    values = df[value].to_numpy(dtype=np.float64)
+
+    # Sort the values by group, then by value. Every group is then a slice.
+    order = np.lexsort((values, codes))
+    values = values[order]
+    codes = codes[order]
+    counts = np.bincount(codes, minlength=len(groups))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    ends = starts + counts
+
+    def quantile(q):
+        # Linear interpolation between the closest ranks, as numpy and pandas.
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, ends - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    minimum = values[starts]
+    maximum = values[ends - 1]
+    mean = np.bincount(codes, weights=values, minlength=len(groups)) / counts
+    squares = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=len(groups))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(squares / (counts - 1))
+    q1 = quantile(0.25)
+    med = quantile(0.5)
+    q3 = quantile(0.75)
+
+    # The whiskers reach the most extreme values within 1.5 IQR of the box.
+    low_limit = (q1 - 1.5 * (q3 - q1))[codes]
+    high_limit = (q3 + 1.5 * (q3 - q1))[codes]
+    inside = (values >= low_limit) & (values <= high_limit)
+    whislo = np.minimum.reduceat(np.where(inside, values, np.inf), starts)
+    whishi = np.maximum.reduceat(np.where(inside, values, -np.inf), starts)
+
+    # Keep the outlier_limit most extreme outliers of each side.
+    rows = np.arange(len(values))
+    kept = ~inside & (((values < low_limit) & (rows - starts[codes] < outlier_limit))
+                      | ((values > high_limit) & (ends[codes] - 1 - rows < outlier_limit)))
+
+    # Histogram between the minimum and the maximum of each group.
+    span = (maximum - minimum)[codes]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bin_index = np.where(span > 0, np.floor((values - minimum[codes]) / span * bins), 0)
+    bin_index = np.minimum(bin_index.astype(np.int64), bins - 1)
+    bin_counts = np.bincount(codes * bins + bin_index, minlength=len(groups) * bins)
+    non_empty = np.flatnonzero(bin_counts)
+    bin_groups = non_empty // bins
+    width = (maximum - minimum)[bin_groups] / bins
+    low = minimum[bin_groups] + width * (non_empty % bins)
+
+    summary = groups.assign(
+        count=counts, mean=mean, std=std, min=minimum, q1=q1, med=med, q3=q3, max=maximum,
+        whislo=whislo, whishi=whishi, outliers=np.bincount(codes, weights=~inside, minlength=len(groups)).astype(np.int64),
+    )
+    fliers = groups.iloc[codes[kept]].reset_index(drop=True).assign(**{value: values[kept]})
+    histograms = groups.iloc[bin_groups].reset_index(drop=True).assign(low=low, high=low + width, count=bin_counts[non_empty])
+    return {"summary": summary, "fliers": fliers, "histograms": histograms}
+
+
+def cumulative_summaries(df, value, keys, prefix, num_prefixes, bits=sketches.DEFAULT_BITS):
+    """
+    Summarize the value column of every group of keys for the growing
+    prefixes of the frame: prefix gives, for every row, the first prefix
+    that contains it (0 to num_prefixes - 1). Return a list with, for every
+    prefix, a dictionary with the "summary" (as summarize(), without the
+    histogram and the mean) and the "fliers" of the groups that have rows.
+
+    The values are rounded to integers and counted in the log-linear buckets
+    of sketches.py, so the quartiles and whiskers are within 2**-bits of the
+    exact ones. The minimum and the maximum are exact and always kept as
+    fliers when they are beyond the whiskers.
+    """
+    valid = df[value].notna().to_numpy()
+    df = df[valid]
+    prefix = np.asarray(prefix)[valid]
+    grouped = df.groupby(keys, observed=True, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    groups = grouped.size().index.to_frame(index=False)
+    values = np.rint(df[value].to_numpy(dtype=np.float64)).astype(np.int64)
+
+    # Count the values of every (group, bucket) pair per prefix, then
+    # accumulate the counts over the prefixes. The pairs are sorted by group
+    # and by bucket, i.e., by value within a group.
+    buckets = sketches.bucket_keys(values, bits)
+    pairs, pair_index = np.unique(np.stack([codes, buckets]), axis=1, return_inverse=True)
+    pair_index = pair_index.reshape(-1)
+    pair_values = sketches.bucket_values(pairs[1], bits)
+    counts = np.zeros((num_prefixes, pairs.shape[1]), dtype=np.int64)
+    np.add.at(counts, (prefix, pair_index), 1)
+    counts = np.cumsum(counts, axis=0)
+    cumulative = np.cumsum(counts, axis=1)
+
+    # The exact minimum and maximum of every group per prefix.
+    minimum = np.full((num_prefixes, len(groups)), np.iinfo(np.int64).max)
+    maximum = np.full((num_prefixes, len(groups)), np.iinfo(np.int64).min)
+    np.minimum.at(minimum, (prefix, codes), values)
+    np.maximum.at(maximum, (prefix, codes), values)
+    minimum = np.minimum.accumulate(minimum, axis=0)
+    maximum = np.maximum.accumulate(maximum, axis=0)
+
+    group_start = np.searchsorted(pairs[0], np.arange(len(groups)), side="left")
+    group_end = np.searchsorted(pairs[0], np.arange(len(groups)), side="right")
+    results = []
+    for i in range(num_prefixes):
+        row = np.concatenate([[0], cumulative[i]])
+        base = row[group_start]
+        count = row[group_end] - base
+        present = np.flatnonzero(count > 0)
+        base = base[present]
+        count = count[present]
+        low = minimum[i, present]
+        high = maximum[i, present]
+
+        def value_at(rank):
+            # The value of the bucket of the given rank (1 = smallest).
+            index = np.searchsorted(row[1:], base + rank, side="left")
+            return np.clip(pair_values[index], low, high)
+
+        def rank_at(limit, side):
+            # The number of values of the group in the buckets below limit.
+            index = np.array([np.searchsorted(pair_values[start:end], lim, side=side) + start
+                              for start, end, lim in zip(group_start[present], group_end[present], limit)], dtype=np.int64)
+            return row[index] - base
+
+        q1 = value_at(np.maximum(np.ceil(0.25 * count), 1))
+        med = value_at(np.maximum(np.ceil(0.5 * count), 1))
+        q3 = value_at(np.maximum(np.ceil(0.75 * count), 1))
+        iqr = q3 - q1
+        # A whisker at the smallest or largest rank is the exact extreme.
+        lowest = rank_at(q1 - 1.5 * iqr, "left") + 1
+        highest = rank_at(q3 + 1.5 * iqr, "right")
+        whislo = np.where(lowest == 1, low, value_at(lowest))
+        whishi = np.where(highest == count, high, value_at(highest))
+        summary = groups.iloc[present].reset_index(drop=True).assign(
+            count=count, min=low, q1=q1, med=med, q3=q3, max=high, whislo=whislo, whishi=whishi,
+        )
+        extremes = pd.concat([summary[low < whislo].assign(**{value: low[low < whislo]}),
+                              summary[high > whishi].assign(**{value: high[high > whishi]})], ignore_index=True)
+        results.append({"summary": summary, "fliers": extremes[list(keys) + [value]]})
+    return results
+
+
+def update_extremes(extremes, values, limit=DEFAULT_OUTLIER_LIMIT, **context):
+    """
+    Return the reservoir of the limit smallest and the limit largest values
+    seen so far, after adding a batch of values: a dictionary of columns
+    sorted by "value", with the context columns given for the values (e.g.,
+    their physical times). extremes is the previous reservoir, or None.
+    The reservoir holds at most 2 * limit rows, whatever the number of
+    values, and it holds every value while there are at most 2 * limit.
+    """
+    columns = {"value": np.asarray(values), **{name: np.asarray(column) for name, column in context.items()}}
+    if extremes is not None:
+        columns = {name: np.concatenate([extremes[name], column]) for name, column in columns.items()}
+    values = columns["value"]
+    if len(values) > 2 * limit:
+        # Only the kept values are sorted.
+        if limit > 0:
+            partition = np.argpartition(values, [limit - 1, len(values) - limit])
+            kept = np.concatenate([partition[:limit], partition[len(values) - limit:]])
+        else:
+            kept = np.zeros(0, dtype=np.int64)
+    else:
+        kept = np.arange(len(values))
+    order = kept[np.argsort(values[kept], kind="stable")]
+    return {name: column[order] for name, column in columns.items()}
+
+
+def extremes_sides(extremes, count):
+    """
+    Split a reservoir of update_extremes() of a group of count values into
+    its smallest and its largest values. Return (low, high, complete), where
+    complete is True if the reservoir holds every value of the group.
+    """
+    values = extremes["value"]
+    if len(values) == count:
+        return values, values, True
+    return values[:len(values) // 2], values[len(values) // 2:], False
+
+
+def sketch_summaries(entries, value, keys, bins=DEFAULT_BINS, outlier_limit=DEFAULT_OUTLIER_LIMIT):
+    """
+    Summarize streamed groups like summarize(). entries is a list of (key,
+    sketch, extremes), where key holds the values of the keys of the group,
+    and extremes is its reservoir of update_extremes() (or None, to only
+    use the exact minimum and maximum of the sketch). The groups keep the
+    order of entries.
+
+    A group whose reservoir holds every value is summarized exactly, as
+    summarize(). Otherwise, the quartiles and the histogram come from the
+    sketch buckets: the quartiles are the bucket values at the nearest rank
+    (see sketches.sketch_quantile()), not interpolated. The whiskers and the
+    number of outliers of a side are exact as long as the reservoir holds
+    a value within the whiskers on that side, and the kept outliers are the
+    most extreme ones of the reservoir.
+    """
+    summaries = []
+    for key, sketch, extremes in entries:
+        count = sketch["count"]
+        if count == 0:
+            continue
+        key = dict(zip(keys, key))
+        if extremes is None:
+            extremes = {"value": np.array([sketch["min"], sketch["max"]])}
+        low, high, complete = extremes_sides(extremes, count)
+        if complete:
+            summaries.append(summarize(pd.DataFrame({**key, value: low.astype(np.float64)}, index=range(count)), value, keys, bins, outlier_limit))
+            continue
+
+        stats = sketches.sketch_statistics(sketch)
+        q1, med, q3 = (sketches.sketch_quantile(sketch, q) for q in (0.25, 0.5, 0.75))
+        low_limit = q1 - 1.5 * (q3 - q1)
+        high_limit = q3 + 1.5 * (q3 - q1)
+        middles = np.clip(sketches.bucket_values(sketch["keys"], sketch["bits"]), sketch["min"], sketch["max"])
+        cumulative = np.cumsum(sketch["counts"])
+
+        # A side is exact if the reservoir reaches within the whiskers.
+        below = int(np.count_nonzero(low < low_limit))
+        if below < len(low):
+            whislo = low[below]
+        else:
+            below = sketches.sketch_rank(sketch, low_limit, "left")
+            whislo = middles[min(np.searchsorted(cumulative, below + 1, side="left"), len(middles) - 1)]
+        above = int(np.count_nonzero(high > high_limit))
+        if above < len(high):
+            whishi = high[len(high) - 1 - above]
+        else:
+            above = count - sketches.sketch_rank(sketch, high_limit, "right")
+            whishi = middles[min(np.searchsorted(cumulative, count - above, side="left"), len(middles) - 1)]
+
+        # Histogram of the bucket counts between the minimum and the maximum.
+        span = stats["max"] - stats["min"]
+        bin_index = np.zeros(len(middles), dtype=np.int64) if span == 0 else \
+            np.minimum(np.floor((middles - stats["min"]) / span * bins).astype(np.int64), bins - 1)
+        bin_counts = np.bincount(bin_index, weights=sketch["counts"], minlength=bins).astype(np.int64)
+        non_empty = np.flatnonzero(bin_counts)
+        width = span / bins
+
+        fliers = np.concatenate([low[low < low_limit], high[high > high_limit]]).astype(np.float64)
+        summaries.append({
+            "summary": pd.DataFrame([{
+                **key, "count": count, "mean": stats["mean"], "std": stats["std"], "min": stats["min"], "q1": q1,
+                "med": med, "q3": q3, "max": stats["max"], "whislo": whislo, "whishi": whishi, "outliers": below + above,
+            }]),
+            "fliers": pd.DataFrame({**key, value: fliers}, index=range(len(fliers))),
+            "histograms": pd.DataFrame({
+                **key, "low": stats["min"] + width * non_empty, "high": stats["min"] + width * (non_empty + 1),
+                "count": bin_counts[non_empty],
+            }, index=range(len(non_empty))),
+        })
+    return {
+        name: pd.concat([summary[name] for summary in summaries], ignore_index=True) if len(summaries) > 0
+        else pd.DataFrame(columns=list(keys) + columns)
+        for name, columns in [
+            ("summary", ["count", "mean", "std", "min", "q1", "med", "q3", "max", "whislo", "whishi", "outliers"]),
+            ("fliers", [value]),
+            ("histograms", ["low", "high", "count"]),
+        ]
+    }
+
+
+def positions(summary, x, hue, order, hue_order):
+    # The x position of every group, dodged by hue like seaborn's plots.
+    x_position = summary[x].map({label: i for i, label in enumerate(order)}).to_numpy(dtype=np.float64)
+    if hue is None:
+        return x_position, DODGE_WIDTH
+    width = DODGE_WIDTH / len(hue_order)
+    hue_index = summary[hue].map({label: j for j, label in enumerate(hue_order)}).to_numpy(dtype=np.float64)
+    return x_position - DODGE_WIDTH / 2 + (hue_index + 0.5) * width, width
+
+
+def default_orders(summary, x, hue, order, hue_order):
+    # By default, the labels are in order of first appearance, as seaborn.
+    if order is None:
+        order = list(pd.unique(summary[x]))
+    if hue is not None and hue_order is None:
+        hue_order = list(pd.unique(summary[hue]))
+    summary = summary[summary[x].isin(order)]
+    if hue is not None:
+        summary = summary[summary[hue].isin(hue_order)]
+    return summary, order, hue_order
+
+
+def finish_axes(ax, x, hue, order, hue_order, colors):
+    ax.set_xticks(range(len(order)))
+    ax.set_xticklabels(order)
+    ax.set_xlim(-0.5, len(order) - 0.5)
+    ax.set_xlabel(x)
+    if hue is not None:
+        handles = [mpatches.Patch(facecolor=colors[label], edgecolor="0.25", label=label) for label in hue_order]
+        ax.legend(handles=handles, title=hue)
+
+
+def boxplot(ax, summaries, x, y, hue=None, order=None, hue_order=None, palette=None):
+    """
+    Draw the boxes of summarize(df, y, [x, hue]) (or [x] without hue) like
+    seaborn's boxplot. The kept outliers are drawn as fliers. Return ax.
+    """
+    summary, order, hue_order = default_orders(summaries["summary"], x, hue, order, hue_order)
+    labels = hue_order if hue is not None else order
+    colors = dict(zip(labels, sns.color_palette(palette, len(labels))))
+    x_position, width = positions(summary, x, hue, order, hue_order)
+
+    # The fliers of every group, with the same keys as the summary.
+    keys = [x] if hue is None else [x, hue]
+    fliers = summaries["fliers"].groupby(keys, observed=True, sort=False)[y]
+    fliers = {key if isinstance(key, tuple) else (key,): values.to_numpy() for key, values in fliers}
+
+    for position, row in zip(x_position, summary.to_dict("records")):
+        key = tuple(row[k] for k in keys)
+        stats = {"med": row["med"], "q1": row["q1"], "q3": row["q3"], "whislo": row["whislo"], "whishi": row["whishi"],
+                 "fliers": fliers.get(key, np.zeros(0))}
+        color = colors[row[hue] if hue is not None else row[x]]
+        ax.bxp([stats], positions=[position], widths=[width * 0.8], patch_artist=True, manage_ticks=False,
+               boxprops={"facecolor": color, "edgecolor": "0.25"}, medianprops={"color": "0.25"},
+               whiskerprops={"color": "0.25"}, capprops={"color": "0.25"},
+               flierprops={"marker": "d", "markersize": 4, "markerfacecolor": "0.25", "markeredgecolor": "0.25"})
+    ax.set_ylabel(y)
+    finish_axes(ax, x, hue, order, hue_order, colors)
+    return ax
+
+
+def density_plot(ax, summaries, x, y, hue=None, order=None, hue_order=None, palette=None):
+    """
+    Draw the histograms of summarize(df, y, [x, hue]) as vertical density
+    strips, a binned counterpart of seaborn's stripplot. Every strip is
+    scaled to its widest bin. The medians are drawn as lines, and the kept
+    outliers, the minimum, and the maximum as points. Return ax.
+    """
+    summary, order, hue_order = default_orders(summaries["summary"], x, hue, order, hue_order)
+    labels = hue_order if hue is not None else order
+    colors = dict(zip(labels, sns.color_palette(palette, len(labels))))
+    x_position, width = positions(summary, x, hue, order, hue_order)
+    keys = [x] if hue is None else [x, hue]
+    group_position = {tuple(row): position for row, position in zip(summary[keys].itertuples(index=False, name=None), x_position)}
+
+    histograms = summaries["histograms"]
+    fliers = summaries["fliers"]
+    for key, histogram in histograms.groupby(keys, observed=True, sort=False):
+        key = key if isinstance(key, tuple) else (key,)
+        if key not in group_position:
+            continue
+        position = group_position[key]
+        color = colors[key[-1]]
+        scale = width * 0.9 * histogram["count"].to_numpy() / histogram["count"].max()
+        height = (histogram["high"] - histogram["low"]).to_numpy()
+        if height.max() > 0:
+            ax.barh(histogram["low"], scale, height=height, left=position - scale / 2, align="edge", color=color, linewidth=0)
+        else:
+            # All the values of the group are equal.
+            ax.plot([position - scale[0] / 2, position + scale[0] / 2], [histogram["low"].iloc[0]] * 2, color=color, linewidth=3)
+
+    for position, row in zip(x_position, summary.to_dict("records")):
+        ax.plot([position - width * 0.45, position + width * 0.45], [row["med"], row["med"]], color="0.25", linewidth=1)
+        ax.plot([position, position], [row["min"], row["max"]], linestyle="none", marker="d", markersize=4, color="0.25")
+
+    if len(fliers) > 0:
+        flier_keys = list(fliers[keys].itertuples(index=False, name=None))
+        known = np.array([key in group_position for key in flier_keys], dtype=bool)
+        flier_positions = np.array([group_position.get(key, np.nan) for key in flier_keys])
+        ax.plot(flier_positions[known], fliers[y].to_numpy()[known], linestyle="none", marker="d", markersize=4, color="0.25")
+    ax.set_ylabel(y)
+    finish_axes(ax, x, hue, order, hue_order, colors)
+    return ax
@@ -0,0 +1,231 @@
+"""
+This utility runs a benchmark campaign on a pool of boards instead of a single
+one. It takes the same argument lists that are normally passed to
+run_benchmark.main() (one per scheduler config, e.g., NP, LB, and EGS), and
+shards the resulting (program, scheduler config) pairs across the boards.
+
+Procedure description:
+1. For every scheduler config, LF compile the selected programs on the host
+   through the build cache of run_benchmark.py. Since the cache is keyed on
+   the lfc flags, the configs do not overwrite each other's generated code.
+2. Start one worker process per board. Each worker holds its own connection
+   (the module-level client of run_benchmark) and pulls jobs from a shared
+   queue. A board only runs one program at a time, so the measurements stay
+   as clean as in the single-board setup.
+3. For every job, the worker copies the generated program to the board and
+   compiles it with cmake (unless the board already has a cached build), runs
+   it, converts the trace, and copies the results back into the data directory
+   of the scheduler config. The resulting data directory layout is the same as
+   the one produced by run_benchmark.py.
+
+Assumptions:
+    - All boards in a pool are of the same platform, since the results of
+      different programs and schedulers are compared against each other.
+"""
+
+import multiprocessing
+import os
+from datetime import datetime
+from pathlib import Path
+
+import run_benchmark
+
+
+def boards_from_credentials(names):
+    """
+    Build a board list from credentials.py. For a name such as "RPI4", the
+    variables IP_RPI4, UN_RPI4, and PW_RPI4 are used. Additional boards can be
+    added to credentials.py with a suffix, e.g., IP_RPI4_2.
+    """
+    import credentials
+    boards = []
+    for name in names:
+        boards.append({
+            "name": name,
+            "hostname": getattr(credentials, "IP_" + name),
+            "username": getattr(credentials, "UN_" + name),
+            "password": getattr(credentials, "PW_" + name),
+        })
+    return boards
+
+
+def board_args(board):
+    # The board-specific arguments are appended last, so that they override
+    # the hostname, username, and password of the original argument list.
+    return ["-hn=" + board["hostname"], "-un=" + board["username"], "-pwd=" + board["password"]]
+
+
+def host_parse_config(arg_list, i, time):
+    """
+    Parse the argument list of the i-th scheduler config. The config is named
+    after its data directory (e.g., NP, LB, EGS). If no data directory is
+    given, one is created under data/<time>.
+    """
+    benchmarks_dir = Path(__file__).resolve().parent.parent
+    args = run_benchmark.parser.parse_args(arg_list)
+    if args.src is None or args.src_gen is None:
+        print("Board Pool: --src and --src-gen must be specified! Abort.")
+        exit(1)
+    if args.data_dir is None:
+        name = f"config{i}"
+        data_dir = benchmarks_dir / "data" / time / name
+        arg_list = arg_list + ["-dd=" + str(data_dir)]
+        args = run_benchmark.parser.parse_args(arg_list)
+    else:
+        name = os.path.basename(os.path.normpath(args.data_dir))
+    return {"name": name, "arg_list": arg_list, "args": args}
+
+
+def host_list_config_programs(config):
+    # Return the names of the programs selected by a scheduler config.
+    benchmarks_dir = Path(__file__).resolve().parent.parent
+    args = config["args"]
+    selected, excluded = run_benchmark.host_get_selection(args)
+    filenames = run_benchmark.host_list_lf_files_in_dir(benchmarks_dir / args.src, selected, excluded)
+    return [filename[:-3] for filename in filenames]
+
+
+def host_generate_config(config):
+    """
+    Generate the code of a scheduler config through the build cache and
+    return the cache entries of its programs. The cached code is also copied
+    into <src-gen>/<name> for record keeping.
+    """
+    benchmarks_dir = Path(__file__).resolve().parent.parent
+    args = config["args"]
+    selected, excluded = run_benchmark.host_get_selection(args)
+    programs = run_benchmark.host_update_lfc_cache(
+        args,
+        benchmarks_dir / args.src,
+        benchmarks_dir / args.src_gen / config["name"],
+        selected,
+        excluded,
+        benchmarks_dir / run_benchmark.HOST_CACHE_DIRNAME,
+    )
+    # With --cross-compile, the entries point to the executables built on
+    # the host instead of the generated code.
+    if args.cross_compile:
+        programs = run_benchmark.host_cross_compile_programs(programs, args)
+    return programs
+
+
+def host_prepare_jobs(arg_lists):
+    """
+    LF compile every scheduler config and return the list of jobs. A job
+    describes a single (program, scheduler config) pair.
+    """
+    benchmarks_dir = Path(__file__).resolve().parent.parent
+    time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # Format: Year-Month-Day_Hour-Minute-Second
+    configs = [host_parse_config(arg_list, i, time) for i, arg_list in enumerate(arg_lists)]
+    # Clear the host build cache once, before any config is generated.
+    if any(config["args"].clear_cache for config in configs):
+        run_benchmark.host_rm_dir(benchmarks_dir / run_benchmark.HOST_CACHE_DIRNAME)
+    jobs = []
+    for config in configs:
+        programs = host_generate_config(config)
+        for program, entry in programs.items():
+            jobs.append({
+                "name": config["name"],
+                "args": config["arg_list"],
+                "program": program,
+                "cache_entry": entry,
+            })
+    return jobs
+
+
+def board_run_job(args, job):
+    # The compiled program lives in the remote build cache. Only the data
+    # directory is separated by scheduler config, so that the results of
+    # different configs never overwrite each other.
+    name = job["name"]
+    program = job["program"]
+    remote_data = f"~/benchmarks-data/{name}"
+    run_benchmark.remote_rm_dir(f"{remote_data}/{program}.*")
+    run_benchmark.remote_create_dir(remote_data)
+
+    # Copy and compile the program, unless the remote cache already has it.
+    remote_program_dir = run_benchmark.remote_sync_cached_program(program, job["cache_entry"], args)
+
+    if args.no_run:
+        return
+
+    # Run the program and convert its trace.
+    run_benchmark.remote_run_program(remote_program_dir, remote_data, args)
+    if not args.no_tracing and not args.no_parse:
+        convert_for_chrome = True
+        run_benchmark.remote_run_trace_conversion(f"{program}.lft", remote_data, convert_for_chrome)
+
+    # Copy the results of this program back into the data directory of the
+    # scheduler config.
+    run_benchmark.host_fetch_program_results(program, remote_data, args)
+
+
+def board_worker(board, job_queue, result_queue, clear_cache=False):
+    """
+    Process jobs on a single board until the job queue is exhausted. Exactly
+    one summary is put into the result queue when the worker exits.
+    """
+    summary = {"board": board["name"], "done": [], "failed": []}
+    try:
+        args = run_benchmark.parser.parse_args(board_args(board))
+        if not run_benchmark.host_connect_to_remote(args):
+            print(f"Board Pool: Cannot connect to {board['name']} ({board['hostname']}).")
+            return
+        print(f"Board Pool: Connected to {board['name']} ({board['hostname']}).")
+        if clear_cache:
+            run_benchmark.remote_rm_dir(run_benchmark.REMOTE_CACHE)
+            run_benchmark.remote_rm_dir(run_benchmark.REMOTE_RUNTIME_CACHE)
+        while True:
+            job = job_queue.get()
+            if job is None:
+                break
+            job_id = (job["program"], job["name"])
+            try:
+                args = run_benchmark.parser.parse_args(job["args"] + board_args(board))
+                board_run_job(args, job)
+                summary["done"].append(job_id)
+            except Exception as e:
+                print(f"Board Pool: {job_id} failed on {board['name']}: {e}")
+                summary["failed"].append(job_id)
+        run_benchmark.host_close_connection_to_remote()
+    finally:
+        result_queue.put(summary)
+
+
+def main(boards, arg_lists):
+    """
+    Run every argument list in arg_lists (as would be passed to
+    run_benchmark.main()) on the given boards.
+    """
+    jobs = host_prepare_jobs(arg_lists)
+    clear_cache = any(run_benchmark.parser.parse_args(arg_list).clear_cache for arg_list in arg_lists)
+
+    job_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    # One sentinel per board to signal the end of the queue.
+    for _ in boards:
+        job_queue.put(None)
+
+    workers = []
+    for board in boards:
+        worker = multiprocessing.Process(target=board_worker, args=(board, job_queue, result_queue, clear_cache))
+        worker.start()
+        workers.append(worker)
+
+    # Drain the result queue before joining the workers.
+    summaries = [result_queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    finished = set()
+    for summary in summaries:
+        print(f"Board Pool: {summary['board']} ran {len(summary['done'])} job(s), {len(summary['failed'])} failed.")
+        finished.update(summary["done"])
+        finished.update(summary["failed"])
+    for job in jobs:
+        job_id = (job["program"], job["name"])
+        if job_id not in finished:
+            print(f"Board Pool: {job_id} was not run, no board was available.")
+    return summaries
@@ -0,0 +1,196 @@
+"""
+Statistical comparison of the schedulers from the execution times of the
+repeated runs of every program (the "data" of the program stats of
+experiment_performance.py). For every pair of schedulers (A, B), e.g., DY
+and LB, and every program, it computes:
+    - the speedups of B over A, i.e., stat(A) / stat(B), for the mean, the
+      median, and the maximum, with percentile bootstrap confidence
+      intervals. The resamples of every (dataset, program) are drawn at once
+      as a matrix of sorted indices into the sorted runs, so the statistics
+      of thousands of resamples take a few NumPy operations, and they are
+      shared by all the pairs of that dataset,
+    - the Mann-Whitney U test (two-sided), exact for small samples without
+      ties and with the tie-corrected normal approximation otherwise,
+    - Cliff's delta, the effect size of the U test: the probability that a
+      run of A is slower than a run of B, minus the converse.
+"""
+
+import functools
+import itertools
+import math
+
+import numpy as np
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 0
+
+
+def sorted_median(samples):
+    # The median of samples sorted along the last axis.
+    n = samples.shape[-1]
+    if n % 2 == 1:
+        return samples[..., n // 2].astype(np.float64)
+    return (samples[..., n // 2 - 1] + samples[..., n // 2]) / 2
+
+
+# Speedups computed for every pair of schedulers, from samples sorted along
+# the last axis.
+SPEEDUP_STATISTICS = {
+    "mean": lambda samples: samples.mean(axis=-1),
+    "median": sorted_median,
+    "max": lambda samples: samples[..., -1],
+}
+
+# Thresholds of the magnitude of Cliff's delta (Romano et al., 2006).
+CLIFFS_DELTA_MAGNITUDES = [(0.147, "negligible"), (0.33, "small"), (0.474, "medium"), (math.inf, "large")]
+
+# Below this many runs per scheduler, the exact distribution of U is used
+# when there are no ties.
+EXACT_U_LIMIT = 50
+
+
+def resample_statistics(values, resamples=DEFAULT_RESAMPLES, rng=None):
+    """
+    Return the statistics of SPEEDUP_STATISTICS for the values and for each
+    of their bootstrap resamples, as {"mean": (value, array), ...}.
+    """
+    rng = np.random.default_rng(DEFAULT_SEED) if rng is None else rng
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    # Sorted indices into the sorted values give sorted resamples. Sorting
+    # the indices is cheaper than sorting the resampled values.
+    indices = np.sort(rng.integers(0, len(values), size=(resamples, len(values)), dtype=np.int32), axis=-1)
+    samples = values[indices]
+    return {name: (float(statistic(values)), statistic(samples)) for name, statistic in SPEEDUP_STATISTICS.items()}
+
+
+def bootstrap_speedups(a, b, confidence=DEFAULT_CONFIDENCE):
+    """
+    Return the speedup of b over a (stat(a) / stat(b)) for every statistic
+    of SPEEDUP_STATISTICS, with its percentile bootstrap confidence interval,
+    as {"mean": {"speedup", "low", "high"}, ...}. a and b are the results of
+    resample_statistics() of the two datasets.
+    """
+    tail = (1 - confidence) / 2 * 100
+    # The percentiles of all the statistics in one call.
+    speedups = np.stack([a[name][1] / b[name][1] for name in SPEEDUP_STATISTICS])
+    low, high = np.percentile(speedups, [tail, 100 - tail], axis=1)
+    return {
+        name: {"speedup": a[name][0] / b[name][0], "low": float(low[i]), "high": float(high[i])}
+        for i, name in enumerate(SPEEDUP_STATISTICS)
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def exact_u_distribution(n1, n2):
+    # The number of arrangements of n1 + n2 untied values for every value of
+    # U, with the recurrence of Mann and Whitney (1947).
+    counts = {(0, j): np.ones(1, dtype=np.float64) for j in range(n2 + 1)}
+    for i in range(1, n1 + 1):
+        counts[(i, 0)] = np.ones(1, dtype=np.float64)
+        for j in range(1, n2 + 1):
+            # The largest value is either from the first sample, which adds j
+            # to U, or from the second.
+            shifted = np.concatenate([np.zeros(j), counts[(i - 1, j)]])
+            previous = counts[(i, j - 1)]
+            total = np.zeros(max(len(shifted), len(previous)))
+            total[:len(shifted)] += shifted
+            total[:len(previous)] += previous
+            counts[(i, j)] = total
+    return counts[(n1, n2)]
+
+
+def mann_whitney_u(a, b):
+    """
+    Return the U statistic of a, the two-sided p-value of the Mann-Whitney U
+    test, and Cliff's delta.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n1 = len(a)
+    n2 = len(b)
+    values = np.concatenate([a, b])
+
+    # Average ranks of the tied values.
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    _, first, tie_counts = np.unique(sorted_values, return_index=True, return_counts=True)
+    average_ranks = first + (tie_counts + 1) / 2
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat(average_ranks, tie_counts)
+
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    delta = 2 * u / (n1 * n2) - 1
+    has_ties = np.any(tie_counts > 1)
+
+    if not has_ties and max(n1, n2) <= EXACT_U_LIMIT:
+        distribution = exact_u_distribution(n1, n2)
+        cdf = np.cumsum(distribution) / distribution.sum()
+        lower = min(u, n1 * n2 - u)
+        p_value = min(1.0, 2 * cdf[int(round(lower))])
+    else:
+        # Normal approximation with tie and continuity corrections.
+        n = n1 + n2
+        mean = n1 * n2 / 2
+        variance = n1 * n2 / 12 * ((n + 1) - np.sum(tie_counts ** 3 - tie_counts) / (n * (n - 1)))
+        if variance <= 0:
+            p_value = 1.0
+        else:
+            z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+            p_value = min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+    return float(u), float(p_value), float(delta)
+
+
+def cliffs_delta_magnitude(delta):
+    for threshold, magnitude in CLIFFS_DELTA_MAGNITUDES:
+        if abs(delta) < threshold:
+            return magnitude
+    return CLIFFS_DELTA_MAGNITUDES[-1][1]
+
+
+def compare_schedulers(program_stats, datasets=("DY", "LB", "EGS"), resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+    """
+    Compare every pair of datasets of program_stats for every program that
+    has runs in both. Return {"<A> vs. <B>": {program: comparison}}, where a
+    comparison holds the number of runs, the bootstrap "speedups" of B over
+    A, the "p_value" of the U test, and Cliff's "delta" and its "magnitude"
+    (a positive delta means that B is faster). The seed makes the bootstrap
+    reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    resampled = {
+        dataset: {
+            program: resample_statistics(stats["data"], resamples, rng)
+            for program, stats in program_stats[dataset].items()
+            if len(stats["data"]) >= 2
+        }
+        for dataset in datasets
+    }
+    comparisons = {}
+    for first, second in itertools.combinations(datasets, 2):
+        pair = {}
+        for program in resampled[first]:
+            if program not in resampled[second]:
+                continue
+            a = program_stats[first][program]["data"]
+            b = program_stats[second][program]["data"]
+            u, p_value, delta = mann_whitney_u(a, b)
+            pair[program] = {
+                "runs": [len(a), len(b)],
+                "speedups": bootstrap_speedups(resampled[first][program], resampled[second][program], confidence),
+                "u": u,
+                "p_value": p_value,
+                "delta": delta,
+                "magnitude": cliffs_delta_magnitude(delta),
+            }
+        comparisons[f"{first} vs. {second}"] = pair
+    return comparisons
+
+
+def format_speedup(comparison, statistic="mean", alpha=0.05):
+    # E.g., "1.12 [1.05, 1.20]*" where * marks a significant U test.
+    if comparison is None:
+        return "-"
+    speedup = comparison["speedups"][statistic]
+    significant = "*" if comparison["p_value"] < alpha else ""
+    return f"{speedup['speedup']:.3g} [{speedup['low']:.3g}, {speedup['high']:.3g}]{significant}"
@@ -6,13 +6,20 @@ import argparse
 from pathlib import Path
 from datetime import datetime
 import run_benchmark
+import report
+import regression
+import results_db
+import compare
+import board_pool
+import pipeline
+import process_pool
 import pandas as pd
 import seaborn as sns 
 import matplotlib.pyplot as plt
 import shutil
 import imageio
 import os
-import re
+import json
 import numpy as np
 import pprint
 
@@ -28,6 +35,14 @@ PLATFORM = "RPI4"
 # Number of times the programs are repeated
 REPEAT = 10
 
+# Adaptive repetition. If TARGET_CI is set, the programs are first repeated
+# REPEAT times, then in batches of BATCH_SIZE runs until the half-width of the
+# confidence interval of their mean execution time, relative to the mean, is
+# at most TARGET_CI (e.g., 0.01 for 1%), or until MAX_RUNS runs.
+TARGET_CI   = None
+MAX_RUNS    = 100
+BATCH_SIZE  = 5
+
 # FIXME: This is completely useless!
 # This is ONLY used for naming files.
 # The script runs both LB and EGS regardless.
@@ -51,6 +66,58 @@ EXCLUDED_PROGRAMS = {
 # Dash mode
 DASH_MODE = False
 
+# Board pool config. If more than one board is listed, the (program, scheduler)
+# pairs are sharded across the boards instead of running everything on the
+# PLATFORM board. Each entry is a suffix of the variables in credentials.py,
+# e.g., "RPI4" uses IP_RPI4, UN_RPI4, and PW_RPI4.
+BOARDS = [] # e.g., "RPI4", "RPI4_2"
+
+# Pipeline config. If enabled, the steps of different (program, scheduler)
+# pairs overlap, e.g., the next program is copied while the board runs the
+# current one. Only one measured run executes on the board at a time. If
+# ISOLATE_RUNS is enabled, nothing is compiled on the board during a measured
+# run, at the cost of less overlap.
+OVERLAP_STAGES  = False
+ISOLATE_RUNS    = True
+
+# Cross-compilation config. If enabled, the programs are compiled on the host
+# with the given cmake toolchain file and sysroot (the native compiler if
+# None), and only the executables are copied to the board.
+CROSS_COMPILE   = False
+TOOLCHAIN_FILE  = None # e.g., "toolchains/rpi4.cmake"
+SYSROOT         = None
+
+# Low-noise run mode. If set, the programs are pinned to PIN_CPUS (taskset
+# syntax, e.g., "1-3") and run with SCHED_FIFO at RT_PRIORITY, the cpufreq
+# governor is locked to GOVERNOR (e.g., "performance"), and the IRQs are moved
+# to IRQ_CPUS (e.g., "0"). The board is restored after every program, and the
+# applied environment is saved with its results (<program>.env.json).
+PIN_CPUS    = None
+RT_PRIORITY = None
+GOVERNOR    = None
+IRQ_CPUS    = None
+
+# Statistical comparison of the schedulers (see compare.py). The bootstrap
+# confidence intervals of the speedups and the rank-based tests of every pair
+# of schedulers are saved to comparison.json. SPEEDUP_COLUMNS lists the pairs
+# whose mean speedup is added to the table, e.g., ("DY", "LB") for the speedup
+# of LB over DY. * marks the speedups whose U test has a p-value below ALPHA.
+COMPARE_SCHEDULERS  = True
+BOOTSTRAP_RESAMPLES = 10000
+CONFIDENCE          = 0.95
+ALPHA               = 0.05
+SPEEDUP_COLUMNS     = [("DY", "LB"), ("DY", "EGS")]
+
+# Store the results of every post processed experiment in the results store
+# (experiment-data/results.db, see results_db.py). Pass --from-db to render the
+# reports of an experiment from the store instead of its logs.
+STORE_RESULTS = True
+
+# Check the experiment for regressions against the baseline designated with
+# `python regression.py performance --set-baseline <experiment>`, if any. The
+# pass/fail report is saved to regression.json (see regression.py).
+CHECK_REGRESSIONS = True
+
 # Generate GIF
 GENERATE_GIF    = False
 NUM_FRAMES      = 50
@@ -76,20 +143,29 @@ parser.add_argument(
     type=str,
     help="Specify an existing experiment directory and run post processing only. E.g., performance/2024-03-03_23-18-51"
 )
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=os.cpu_count(),
+    help="Number of processes used to post process the (program, scheduler) pairs. Default: the number of CPUs."
+)
+parser.add_argument(
+    "-db",
+    "--from-db",
+    action="store_true",
+    help="Render the table and the comparison of --experiment-dir from the results store (experiment-data/results.db) instead of its logs."
+)
+parser.add_argument(
+    "-rb",
+    "--rebuild",
+    action="store_true",
+    help="Recompute the statistics of every (program, scheduler) pair, even if their logs did not change since the last post processing."
+)
 
 def extract_times_from_file(file_path):
-    pattern = r"---- Elapsed physical time \(in nsec\): ([\d,]+)"
-    times = []
-
     with open(file_path, 'r') as file:
-        for line in file:
-            match = re.search(pattern, line)
-            if match:
-                # Remove commas and convert the number to an integer
-                time_value = int(match.group(1).replace(',', ''))
-                times.append(time_value)
-                
-    return times
+        return run_benchmark.host_parse_elapsed_times(file)
 
 def calculate_statistics(times):
     if len(times) == 0:
@@ -99,67 +175,42 @@ def calculate_statistics(times):
     std_dev = np.std(times, ddof=1)  # Use ddof=1 for sample standard deviation
     return {"mean": mean, "max": max_val, "std": std_dev}
 
-def generate_latex_table(program_names, program_stats, references, file_path):
-    code = f"% Generated table at {file_path}\n"
-    code += r"""
-    \begin{table*}[ht]
-        \centering
-        \begin{tabular}{lcccccccccc}
-        \toprule 
-        & & \multicolumn{3}{c}{Average (us)} & \multicolumn{3}{c}{Maximum (us)} &
-        \multicolumn{3}{c}{Standard Deviation (us)} \\ 
-        \cmidrule(lr){3-5} \cmidrule(lr){6-8} \cmidrule(lr){9-11}
-        Program & LoC (\lf) & DY & LB & EG & DY & LB & EG & DY & LB & EG \\ 
-        \midrule 
-    """
-    for program in program_names:
-        # .3g = 3 significant digits
-        if program in list(program_stats['DY'].keys()):
-            np_mean = format(program_stats['DY'][program]['mean'] / 1000, '.3g')
-            np_max  = format(program_stats['DY'][program]['max'] / 1000, '.3g')
-            np_std  = format(program_stats['DY'][program]['std'] / 1000, '.3g')
-        else:
-            np_mean = "-"
-            np_max  = "-"
-            np_std  = "-"
-        if program in list(program_stats['LB'].keys()):
-            lb_mean = format(program_stats['LB'][program]['mean'] / 1000, '.3g')
-            lb_max  = format(program_stats['LB'][program]['max'] / 1000, '.3g')
-            lb_std  = format(program_stats['LB'][program]['std'] / 1000, '.3g')
-        else:
-            lb_mean = "-"
-            lb_max  = "-"
-            lb_std  = "-"
-        if program in list(program_stats['EGS'].keys()):
-            egs_mean = format(program_stats['EGS'][program]['mean'] / 1000, '.3g')
-            egs_max  = format(program_stats['EGS'][program]['max'] / 1000, '.3g')
-            egs_std  = format(program_stats['EGS'][program]['std'] / 1000, '.3g')
-        else:
-            egs_mean = "-"
-            egs_max  = "-"
-            egs_std  = "-"
-        code += f"\n\\texttt{{{program}}}"
-        if references[program] is not None:
-            code += f"~\cite{{{references[program]}}}"
-        code += f"  & {program_stats['LOC'][program]}  & {np_mean} & {lb_mean} & {egs_mean} & {np_max} & {lb_max} & {egs_max} & {np_std} & {lb_std} & {egs_std} \\\\"
-    code += r"""
-        \bottomrule
-        \end{tabular} 
-        \caption{Average, maximum, and standard deviation of the
+def post_process_pair(txt):
+    # Calculate the statistics of a single (program, scheduler) pair, with the
+    # environment of the runs if they were made in the low-noise run mode.
+    times = extract_times_from_file(txt)
+    stats = calculate_statistics(times)
+    if stats is not None:
+        stats["data"] = times
+        env = txt.with_suffix(".env.json")
+        if env.is_file():
+            with open(env, "r") as file:
+                stats["environment"] = json.load(file)
+    return stats
+
+def generate_latex_table(program_names, program_stats, references, file_path, comparisons=None):
+    caption = r"""Average, maximum, and standard deviation of the
         benchmark execution times using the
         dynamic scheduler (DY), the static \textsc{Load
         Balanced} scheduler (LB), and the static \textsc{Edge Generation}
-        scheduler (EGS).} 
-        \label{tab:accuracy_results}
-    \end{table*}
-    """
-
-    with open(file_path, 'w') as file:
-        file.write(code)
+        scheduler (EGS)."""
+    columns = None
+    if comparisons is not None:
+        caption += f""" The speedups of the average execution time are given
+        with their {CONFIDENCE * 100:g}\\% bootstrap confidence intervals. * marks
+        the speedups whose Mann-Whitney U test has $p < {ALPHA}$."""
+        columns = []
+        for first, second in SPEEDUP_COLUMNS:
+            pair = comparisons[f"{first} vs. {second}"]
+            header = f"{second.replace('EGS', 'EG')}/{first.replace('EGS', 'EG')}"
+            columns.append((header, {program: compare.format_speedup(pair[program], "mean", ALPHA) for program in pair}))
+    report.generate_latex_table(program_names, program_stats, file_path, caption, references, columns)
     
 def main(args=None):
     # Parse arguments.
     args = parser.parse_args(args)
+    if args.from_db and args.experiment_dir is None:
+        parser.error("--from-db requires --experiment-dir.")
     
     # Variable declarations
     expr_data_dirname = "experiment-data/"
@@ -209,6 +260,15 @@ def main(args=None):
             args_2.append("-f=--dash")
             args_3.append("-f=--dash")
 
+        # Compile on the host and only ship the executables to the board.
+        if CROSS_COMPILE:
+            for args_i in [args_1, args_2, args_3]:
+                args_i.append("--cross-compile")
+                if TOOLCHAIN_FILE is not None:
+                    args_i.append("--toolchain-file=" + TOOLCHAIN_FILE)
+                if SYSROOT is not None:
+                    args_i.append("--sysroot=" + SYSROOT)
+
         # For performance experiments, turn off tracing.
         args_1.append("--no-tracing")
         args_2.append("--no-tracing")
@@ -218,6 +278,13 @@ def main(args=None):
         args_1.append("--repeat="+str(REPEAT))
         args_2.append("--repeat="+str(REPEAT))
         args_3.append("--repeat="+str(REPEAT))
+        for flag, value in [("--pin-cpus", PIN_CPUS), ("--rt-priority", RT_PRIORITY), ("--governor", GOVERNOR), ("--irq-cpus", IRQ_CPUS)]:
+            if value is not None:
+                for args_i in [args_1, args_2, args_3]:
+                    args_i.append(flag+"="+str(value))
+        if TARGET_CI is not None:
+            for args_i in [args_1, args_2, args_3]:
+                args_i += ["--target-ci="+str(TARGET_CI), "--max-runs="+str(MAX_RUNS), "--batch-size="+str(BATCH_SIZE)]
 
         # For performance experiments, turn on fast mode.
         # FIXME: lfc commandline has no --fast!
@@ -241,12 +308,31 @@ def main(args=None):
             for prog in EXCLUDED_PROGRAMS['EGS']:
                 args_3.append("--exclude="+prog)
                 
+        # Save the metadata of the runs for the results store.
+        lfc_commit, lfc_dirty = run_benchmark.host_get_lfc_commit()
+        results_db.save_metadata(expr_run_dir, {
+            "started": datetime.strptime(time, "%Y-%m-%d_%H-%M-%S").isoformat(),
+            "platform": PLATFORM,
+            "dash_mode": DASH_MODE,
+            "lfc_version": run_benchmark.host_get_lfc_version(),
+            "lfc_commit": lfc_commit,
+            "lfc_dirty": lfc_dirty,
+            "repeat": REPEAT,
+            "target_ci": TARGET_CI,
+            "flags": {dataset: results_db.lfc_flags(args_i) for dataset, args_i in [("DY", args_1), ("LB", args_2), ("EGS", args_3)]},
+        })
+
         # Run the benchmark runner using the NP and the STATIC scheduler.
         # NOTE: The 2nd run's src-gen is copied back the host. So it's better to
         # be static because we want to inspect the graphs.
-        run_benchmark.main(args_1) # NP   
-        run_benchmark.main(args_2) # LB
-        run_benchmark.main(args_3) # EGS
+        if len(BOARDS) > 1:
+            board_pool.main(board_pool.boards_from_credentials(BOARDS), [args_1, args_2, args_3])
+        elif OVERLAP_STAGES:
+            pipeline.main([args_1, args_2, args_3], isolate_runs=ISOLATE_RUNS)
+        else:
+            run_benchmark.main(args_1) # NP   
+            run_benchmark.main(args_2) # LB
+            run_benchmark.main(args_3) # EGS
         
         # Move the static src-gen to the experiment folder for record keeping.
         # Use shutil.copytree to copy the directory
@@ -290,34 +376,66 @@ def main(args=None):
         'Throughput': 'menard2023performance',
     }
 
-    # Generate timing variation plots for each program.
-    for program in program_names:
-        
-        txt_dy = np_dir / (program + ".txt")
-        txt_lb = lb_dir / (program + ".txt")
-        txt_egs = egs_dir / (program + ".txt")
-
-        times_dy = extract_times_from_file(txt_dy)
-        times_lb = extract_times_from_file(txt_lb)
-        times_egs = extract_times_from_file(txt_egs)
-
-        stats_dy = calculate_statistics(times_dy)
-        stats_lb = calculate_statistics(times_lb)
-        stats_egs = calculate_statistics(times_egs)
-
-        if stats_dy is None: raise Exception(f"When running {program}, stats_dy is None.")
-        if stats_lb is None: raise Exception(f"When running {program}, stats_lb is None.")
-        if stats_egs is None: raise Exception(f"When running {program}, stats_egs is None.")
-
-        stats_dy["data"] = times_dy
-        stats_lb["data"] = times_lb
-        stats_egs["data"] = times_egs
-
-        program_stats['DY'][program] = stats_dy
-        program_stats['LB'][program] = stats_lb
-        program_stats['EGS'][program] = stats_egs
-
-    generate_latex_table(program_names, program_stats, references, expr_run_dir / "table.tex")
+    db_path = expr_data_dir / results_db.RESULTS_DB
+    if args.from_db:
+        # Render the reports from the execution times in the results store.
+        conn = results_db.connect(db_path)
+        times = results_db.load_performance_times(conn, expr_run_dir.name)
+        conn.close()
+        if len(times) == 0: raise Exception(f"{expr_run_dir.name} is not in {db_path}.")
+        for dataset in ['DY', 'LB', 'EGS']:
+            for program, entry in times.get(dataset, {}).items():
+                program_stats[dataset][program] = {**calculate_statistics(entry["data"]), **entry}
+    else:
+        # Only extract the execution times of the (program, scheduler) pairs whose
+        # log (or the post processing itself) changed since the last post
+        # processing of this experiment. The other statistics are reused from the
+        # report manifest.
+        datasets = [("DY", np_dir), ("LB", lb_dir), ("EGS", egs_dir)]
+        manifest_path = expr_run_dir / report.REPORT_MANIFEST
+        manifest = report.load_manifest(manifest_path)
+        code = report.code_fingerprint(Path(__file__).resolve(), Path(report.__file__).resolve())
+        pairs = []
+        for program in program_names:
+            for dataset, dir in datasets:
+                txt = dir / (program + ".txt")
+                key = f"performance:{dataset}:{program}"
+                env = txt.with_suffix(".env.json")
+                fingerprint = report.fingerprint(txt.name, report.file_fingerprint(manifest, txt), report.file_fingerprint(manifest, env), code)
+                stats = None if args.rebuild else report.lookup(manifest, key, fingerprint)
+                pairs.append((program, dataset, txt, key, fingerprint, stats))
+
+        # Extract the execution times of the other pairs in parallel. The results
+        # are merged in program order, so the output does not depend on the pool.
+        tasks = [(txt,) for _, _, txt, _, _, stats in pairs if stats is None]
+        new_stats = iter(process_pool.map_tasks(post_process_pair, tasks, args.jobs))
+        if len(tasks) < len(pairs):
+            print(f"Reusing the statistics of {len(pairs) - len(tasks)} unchanged (program, scheduler) pair(s).")
+        for program, dataset, _, key, fingerprint, stats in pairs:
+            if stats is None:
+                stats = next(new_stats)
+                if stats is None: raise Exception(f"When running {program}, stats_{dataset.lower()} is None.")
+                report.record(manifest, key, fingerprint, stats)
+            program_stats[dataset][program] = stats
+        report.save_manifest(manifest_path, manifest)
+
+        # Store the execution times of every run for cross-run queries.
+        if STORE_RESULTS:
+            conn = results_db.connect(db_path)
+            results_db.ingest_performance(conn, expr_run_dir.name, results_db.load_metadata(expr_run_dir), program_stats)
+            conn.close()
+
+    if CHECK_REGRESSIONS and (STORE_RESULTS or args.from_db):
+        regression.check_experiment(db_path, "performance", expr_run_dir.name, expr_run_dir)
+
+    # Compare the schedulers from the runs of every program.
+    comparisons = None
+    if COMPARE_SCHEDULERS:
+        comparisons = compare.compare_schedulers(program_stats, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE)
+        with open(expr_run_dir / "comparison.json", "w") as file:
+            json.dump(comparisons, file, indent=4)
+
+    generate_latex_table(program_names, program_stats, references, expr_run_dir / "table.tex", comparisons)
 
     with open(expr_run_dir / "data.txt", "w") as file:
         pprint.pprint(program_stats, stream=file)
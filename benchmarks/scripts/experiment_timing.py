@@ -6,13 +6,35 @@ import argparse
 from pathlib import Path
 from datetime import datetime
 import run_benchmark
+import binned_plots
+import outliers
+import report
+import regression
+import results_db
+import sketches
+import trace_loader
+import trace_spans
+import trace_stream
+import board_pool
+import pipeline
+import process_pool
+import numpy as np
 import pandas as pd
 import seaborn as sns 
 import matplotlib.pyplot as plt
 import shutil
-import imageio
+import imageio.v2 as imageio
+import io
 import os
 
+# The loaded traces are shared by all post-processing functions. With
+# copy-on-write, deriving columns from them never modifies the shared data.
+pd.set_option("mode.copy_on_write", True)
+
+# The plots are rendered by a process pool. Use a fixed salt for the SVG ids
+# (and no date in the SVG metadata) so that the plots are reproducible.
+plt.rcParams['svg.hashsalt'] = 'lf-benchmarks'
+
 # NOTE: Ensure that there is a credentials.py that defines the IP, username, and
 # password of the target platform.
 import credentials
@@ -30,6 +52,13 @@ STATIC_SCHEDULER_NAMES = ["LB", "EGS"]
 # Plot config
 ANNOTATE_MEAN_STD = False
 
+# If enabled, the distributions are drawn from per-group summaries (quartiles,
+# histograms, and the most extreme outliers, see binned_plots.py) instead of
+# the samples, so the plots render in constant time and keep the tail events.
+BINNED_PLOTS = True
+PLOT_BINS = 64
+PLOT_OUTLIER_LIMIT = 50
+
 # If empty, the script runs the entire src directory.
 # Input just the LF program name without the .lf extension.
 # TIPS: Add a simple program here to test the script workflow.
@@ -45,10 +74,71 @@ EXCLUDED_PROGRAMS = {
 # Dash mode
 DASH_MODE = False
 
+# Board pool config. If more than one board is listed, the (program, scheduler)
+# pairs are sharded across the boards instead of running everything on the
+# PLATFORM board. Each entry is a suffix of the variables in credentials.py,
+# e.g., "RPI4" uses IP_RPI4, UN_RPI4, and PW_RPI4.
+BOARDS = [] # e.g., "RPI4", "RPI4_2"
+
+# Pipeline config. If enabled, the steps of different (program, scheduler)
+# pairs overlap, e.g., the next program is copied while the board runs the
+# current one. Only one measured run executes on the board at a time. If
+# ISOLATE_RUNS is enabled, nothing is compiled on the board during a measured
+# run, at the cost of less overlap.
+OVERLAP_STAGES  = False
+ISOLATE_RUNS    = True
+
+# Cross-compilation config. If enabled, the programs are compiled on the host
+# with the given cmake toolchain file and sysroot (the native compiler if
+# None), and only the executables are copied to the board.
+CROSS_COMPILE   = False
+TOOLCHAIN_FILE  = None # e.g., "toolchains/rpi4.cmake"
+SYSROOT         = None
+
+# Trace decoding config. If enabled, the traces are not converted to CSV on
+# the board. Only the .lft files are copied back and decoded on the host.
+# The pointer size must match the board's OS (8 for 64-bit, 4 for 32-bit).
+HOST_TRACE_DECODING = False
+TRACE_POINTER_SIZE  = 8
+
+# Trace cache config. If enabled, each decoded trace is kept next to it (e.g.,
+# NP/PingPong.csv.cache/) and reloaded from there until the trace changes, so
+# regenerating the plots with --experiment-dir does not parse the traces again.
+TRACE_CACHE = True
+
+# Streaming config. If set, each trace is processed in chunks of this many
+# rows instead of being loaded at once, which bounds the memory used for long
+# traced runs (e.g., PingPong or Throughput). Only the sketches and the most
+# extreme values of every group are kept, so the plots are always binned.
+STREAMING_CHUNK_SIZE = None # e.g., 1000000
+# Number of reaction starts held back to reorder the starts of the workers by
+# physical time for the timing precision. A start that arrives later than
+# this is dropped with a warning.
+REORDER_WINDOW = 100000
+
+# PretVM instruction plot config. If enabled, the EXE, DU, WU, and WLT
+# instructions are also plotted. They span reaction executions and waits.
+PLOT_BLOCKING_INSTRUCTIONS = False
+
+# Statistics reported per group and per program. The percentiles come from
+# the sketches (see sketches.py) and are within ~1% of the exact values.
+GROUP_STATISTICS = ['mean', 'std', 'max', 'p50', 'p99', 'p99.9']
+
+# Store the statistics of every post processed experiment in the results store
+# (experiment-data/results.db, see results_db.py). Pass --from-db to render the
+# table of an experiment from the store instead of its traces.
+STORE_RESULTS = True
+
+# Check the experiment for regressions against the baseline designated with
+# `python regression.py timing --set-baseline <experiment>`, if any. The
+# pass/fail report is saved to regression.json (see regression.py).
+CHECK_REGRESSIONS = True
+
 # Generate GIF
 GENERATE_GIF    = False
 NUM_FRAMES      = 50
 FPS             = 5
+ANIMATION_FORMAT = "gif" # "mp4" needs imageio[ffmpeg]
 
 #############################################
 
@@ -70,39 +160,53 @@ parser.add_argument(
     type=str,
     help="Specify an existing experiment directory and run post processing only. E.g., timing/2024-03-03_23-18-51"
 )
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=os.cpu_count(),
+    help="Number of processes used to post process the (program, scheduler) pairs. Default: the number of CPUs."
+)
+parser.add_argument(
+    "-db",
+    "--from-db",
+    action="store_true",
+    help="Render the table of --experiment-dir from the lag statistics in the results store (experiment-data/results.db) instead of its traces. No plot is generated."
+)
+parser.add_argument(
+    "-rb",
+    "--rebuild",
+    action="store_true",
+    help="Recompute the statistics and plots of every program, even if their traces did not change since the last post processing."
+)
 
-def post_process_timing_precision(csv):
+def load_trace(csv):
+    # Load a trace once with typed columns. The result is shared by all the
+    # post-processing functions below.
     try:
-        df = pd.read_csv(csv)
+        return trace_loader.load_trace(csv, TRACE_POINTER_SIZE, cache=TRACE_CACHE)
     except FileNotFoundError:
         print("ERROR: file not found - " + str(csv))
         return None
+
+def post_process_timing_precision(trace):
+    if trace is None:
+        return None
     
-    # Strip leading and trailing spaces from column names
-    df.columns = df.columns.str.strip()
-    
-    # Keep only "Reaction starts" events
+    # Keep only "Reaction starts" events. The reaction events of the trace
+    # are already without 'delay' and 'NO REACTOR' and sorted by 'Reactor',
+    # 'Destination', and 'Elapsed Physical Time'.
+    df = trace['reactions']
     df = df[df['Event'] == 'Reaction starts']
     
-    # Remove rows where 'Reactor' starts with 'delay' and 'NO REACTOR'
-    df['Reactor'] = df['Reactor'].str.strip()
-    df = df[~df['Reactor'].str.startswith('delay')]
-    df = df[~df['Reactor'].str.startswith('NO REACTOR')]
-    
-    # Sort the DataFrame by 'Reactor', 'Destination', and 'Elapsed Physical Time'
-    df = df.sort_values(by=['Reactor', 'Destination', 'Elapsed Physical Time'])
-    
-    # Group by Reactor and Destination
-    groups = df.groupby(['Reactor', 'Destination'])
-    
     # Group by 'Reactor' and 'Destination', then calculate the difference in 'Elapsed Physical Time'
-    df['Time Difference'] = groups['Elapsed Physical Time'].diff()
+    df['Time Difference'] = df.groupby(['Reactor', 'Destination'], observed=True)['Elapsed Physical Time'].diff()
     
     # Remove rows with NaN 'Time Difference'
     df = df.dropna(subset=['Time Difference'])
     
     # Calculate standard deviation for 'Time Difference' in each group
-    std_deviation = groups['Time Difference'].std()
+    std_deviation = df.groupby(['Reactor', 'Destination'], observed=True)['Time Difference'].std()
 
     # Printing standard deviations
     print("Standard Deviations of Time Differences for each Group:")
@@ -110,145 +214,76 @@ def post_process_timing_precision(csv):
     
     return df
 
-def post_process_timing_accuracy(csv):
-    try:
-        df = pd.read_csv(csv)
-    except FileNotFoundError:
+def post_process_timing_accuracy(trace):
+    if trace is None:
         return None
     
-    # Strip leading and trailing spaces from column names
-    df.columns = df.columns.str.strip()
-    
-    # Keep only "Reaction starts" events
+    # Keep only "Reaction starts" events, already filtered and sorted.
+    df = trace['reactions']
     df = df[df['Event'] == 'Reaction starts']
     
-    # Remove rows where 'Reactor' starts with 'delay' and 'NO REACTOR'
-    df['Reactor'] = df['Reactor'].str.strip()
-    df = df[~df['Reactor'].str.startswith('delay')]
-    df = df[~df['Reactor'].str.startswith('NO REACTOR')]
-    
-    # Sort the DataFrame by 'Reactor', 'Destination', and 'Elapsed Physical Time'
-    df = df.sort_values(by=['Reactor', 'Destination', 'Elapsed Physical Time'])
-    
-    # Group by Reactor and Destination
-    grouped = df.groupby(['Reactor', 'Destination'])
-    
-    # Define a custom function to filter out the initial rows based on "Elapsed Logical Time"
-    def filter_initial_rows(group):
-        # Filter out initial rows
-        filtered_group = group[group['Elapsed Logical Time'] >= 20000000]
-        if len(filtered_group) > 1:
-            # FIXME: The goal here is to remove data points from the shutdown
-            # phase, which usually spans the last logical tag. If this
-            # assumption is not respected, this strategy no longer works.
-            
-            # Find the maximum 'Elapsed Logical Time' in the filtered group
-            max_elapsed_logical_time = filtered_group['Elapsed Logical Time'].max()
-            
-            # Filter out the rows with the maximum 'Elapsed Logical Time'
-            filtered_group = filtered_group[filtered_group['Elapsed Logical Time'] < max_elapsed_logical_time]
-            
-            # Return the filtered group only if it contains >= 20 rows after all filters
-            return filtered_group if len(filtered_group) >= 20 else None
-        else:
-            return None
+    keys = ['Reactor', 'Destination']
+    
+    # Filter out the initial rows based on "Elapsed Logical Time"
+    df = df[df['Elapsed Logical Time'] >= 20000000]
     
-    # Remove the first "reaction starts" data point for each group.
-    df_filtered = grouped.apply(filter_initial_rows)
+    # FIXME: The goal here is to remove data points from the shutdown
+    # phase, which usually spans the last logical tag. If this
+    # assumption is not respected, this strategy no longer works.
+    
+    # Filter out the rows with the maximum 'Elapsed Logical Time' of each
+    # group, and the groups with a single row left after the initial rows.
+    # The masks are computed for all groups at once with transform.
+    logical_times = df.groupby(keys, observed=True)['Elapsed Logical Time']
+    remaining = logical_times.transform('size')
+    max_elapsed_logical_time = logical_times.transform('max')
+    df = df[(remaining > 1) & (df['Elapsed Logical Time'] < max_elapsed_logical_time)]
+    
+    # Keep the groups only if they contain >= 20 rows after all filters
+    df_filtered = df[df.groupby(keys, observed=True)['Elapsed Logical Time'].transform('size') >= 20]
     
     # Calculate lag, i.e., elapsed physical time - elasped logical time.
     df_filtered['Lag'] = df_filtered['Elapsed Physical Time'] - df_filtered['Elapsed Logical Time']
     
-    # Add a 'Group' column for easier handling in plotting
-    df_filtered['Group'] = df_filtered.apply(lambda x: f"{x['Reactor']}, {x['Destination']}", axis=1)
+    # Add a 'Group' column for easier handling in plotting. The label is
+    # formatted once per group and the rows only store the group codes.
+    grouped = df_filtered.groupby(keys, observed=True)
+    labels = [f"{reactor}, {destination}" for reactor, destination in grouped.size().index]
+    df_filtered['Group'] = pd.Categorical.from_codes(grouped.ngroup().to_numpy(), categories=labels)
 
     return df_filtered
 
 def extract_timing_accuracy_outliers(df):
-    # Calculate the IQR for 'Lag'
-    Q1 = df['Lag'].quantile(0.25)
-    Q3 = df['Lag'].quantile(0.75)
-    IQR = Q3 - Q1
-
-    # Define the criteria for an outlier
-    is_outlier = ((df['Lag'] > (Q3 + 1.5 * IQR)) | (df['Lag'] < (Q1 - 1.5 * IQR)))
-
-    # Filter the DataFrame to extract outliers
-    outliers_df = df[is_outlier]
-
-    return outliers_df
+    # Extract the outliers of the 'Lag' with the IQR of each (Reactor,
+    # Destination), and return them with the thresholds of every group.
+    return outliers.extract_outliers(df, ['Reactor', 'Destination'], 'Lag')
 
-def post_process_execution_time(csv):
-    try:
-        df = pd.read_csv(csv)
-    except FileNotFoundError:
+def post_process_execution_time(trace):
+    if trace is None:
         return None
     
-    # Strip leading and trailing spaces from column names
-    df.columns = df.columns.str.strip()
-    
-    # Filter out rows without 'Reaction starts' or 'Reaction ends'
-    df = df[(df['Event'] == 'Reaction starts') | (df['Event'] == 'Reaction ends')]
-    
-    df['Reactor'] = df['Reactor'].str.strip()
-    df = df[~df['Reactor'].str.startswith('delay') & ~df['Reactor'].str.startswith('NO REACTOR')]
-    df = df.sort_values(by=['Reactor', 'Destination', 'Elapsed Physical Time'])
+    # Pair every reaction start with its end, per worker and reaction, so
+    # that every invocation gives an execution time sample.
+    result = trace_spans.pair_reaction_invocations(trace['reactions'])
+    if result['unmatched_starts'] > 0 or result['unmatched_ends'] > 0:
+        print(f"WARNING: {result['unmatched_starts']} reaction start(s) and {result['unmatched_ends']} reaction end(s) are unmatched.")
     
-    # Calculate execution times
-    starts = df[df['Event'] == 'Reaction starts'].groupby(['Reactor', 'Destination']).first().reset_index()
-    ends = df[df['Event'] == 'Reaction ends'].groupby(['Reactor', 'Destination']).first().reset_index()
-    
-    execution_times = ends['Elapsed Physical Time'] - starts['Elapsed Physical Time']
-    starts['Execution Time'] = execution_times
-    
-    return starts
+    return result['invocations']
 
-def post_process_instruction_execution_times(csv):
-    try:
-        df = pd.read_csv(csv)
-    except FileNotFoundError:
+def post_process_instruction_execution_times(trace):
+    if trace is None:
         return None
     
-    # Strip leading and trailing spaces from column names
-    df.columns = df.columns.str.strip()
-    
-    # Remove EXE, DU, WU, and WLT
-    df = df[~df['Event'].str.contains('EXE|DU|WLT|WU|End EXE|End DU|End WLT|End WU')]
+    # Reconstruct the instruction spans per worker. EXE, DU, WU, and WLT are
+    # only included if enabled.
+    opcodes = trace_spans.INSTRUCTION_OPCODES
+    if PLOT_BLOCKING_INSTRUCTIONS:
+        opcodes = opcodes + trace_spans.BLOCKING_OPCODES
+    result = trace_spans.reconstruct_instruction_spans(trace['events'], opcodes)
+    if result['unmatched_starts'] > 0 or result['unmatched_ends'] > 0:
+        print(f"WARNING: {result['unmatched_starts']} instruction start(s) and {result['unmatched_ends']} instruction end(s) are unmatched.")
     
-    # Filter to keep only relevant events
-    df = df[df['Event'].str.contains('ADD|ADDI|ADV|ADVI|BEQ|BGE|BLT|BNE|DU|JAL|JALR|STP|WLT|WU|End')]
-
-    # Separate start and end events
-    start_events = df[~df['Event'].str.startswith('End')].copy()
-    end_events = df[df['Event'].str.startswith('End')].copy()
-    
-    # Sort both data frames by Worker and Elapsed physical time
-    start_events = start_events.sort_values(by=['Source', 'Elapsed Physical Time'])
-    end_events = end_events.sort_values(by=['Source', 'Elapsed Physical Time'])
-    
-    start_events.reset_index(drop=True, inplace=True)
-    end_events.reset_index(drop=True, inplace=True)
-
-    # Remove 'End ' prefix from end events to align with start events
-    end_events['Event'] = end_events['Event'].str.replace('End ', '')
-
-    # Renaming end_events columns
-    end_events.rename(columns=lambda x: 'End_' + x if x != 'Elapsed Physical Time' else x, inplace=True)
-    
-    # Rename columns for clarity if needed
-    start_events.rename(columns={'Elapsed Physical Time': 'Start Time'}, inplace=True)
-    end_events.rename(columns={'Elapsed Physical Time': 'End Time'}, inplace=True)
-
-    # Concatenate start and end events to calculate execution times
-    execution_times_df = pd.concat([start_events, end_events], axis=1)
-    
-    # Calculate instruction execution time
-    execution_times_df['Instruction Execution Time'] = execution_times_df['End Time'] - execution_times_df['Start Time']
-    
-    # Prepare for plotting
-    execution_times_df['Group'] = execution_times_df['Event'] + ", " + execution_times_df['Source'].astype(str)
-
-    return execution_times_df
+    return result['spans']
 
 def combine_df(df_np, df_lb, df_egs):
     data_frames = []
@@ -264,7 +299,7 @@ def combine_df(df_np, df_lb, df_egs):
     
     # Combine the data from DY and STATIC datasets
     combined_df = pd.concat(data_frames).reset_index(drop=True)
-    combined_df['Group'] = combined_df['Reactor'] + ", " + combined_df['Destination'].astype(str)
+    combined_df['Group'] = combined_df['Reactor'].astype(str) + ", " + combined_df['Destination'].astype(str)
 
     # Further filter to remove groups that don't have any data
     # This is done by filtering groups with size > 0
@@ -274,21 +309,33 @@ def combine_df(df_np, df_lb, df_egs):
     
     return combined_df
 
-def generate_plot_timing_precision(plots_dir, program, df):
+def generate_plot_timing_precision(plots_dir, program, df, summaries=None):
+    # The plot is drawn from the rows of df, or from the summaries of
+    # streamed runs if df is None (see streamed_summaries()).
 
     # Now, 'combined_df' contains only groups with data
     plt.figure(figsize=(12, 8))
-    ax = sns.boxplot(x='Group', y='Time Difference', hue='Dataset', data=df, palette="Set3")
+    if summaries is None and BINNED_PLOTS:
+        summaries = binned_plots.summarize(df, 'Time Difference', ['Group', 'Dataset'], PLOT_BINS, PLOT_OUTLIER_LIMIT)
+    if summaries is not None:
+        ax = binned_plots.boxplot(plt.gca(), summaries, x='Group', y='Time Difference', hue='Dataset', palette="Set3")
+    else:
+        ax = sns.boxplot(x='Group', y='Time Difference', hue='Dataset', data=df, palette="Set3")
 
     # If enabled, annotate the plot with mean and std.
     if ANNOTATE_MEAN_STD:
-        # Calculate means and standard deviations for annotations
-        stats_df = df.groupby(['Group', 'Dataset'])['Time Difference'].agg(['mean', 'std']).reset_index()
+        # Calculate means, standard deviations, and maxes for annotations
+        if df is not None:
+            groups = df['Group'].unique()
+            stats_df = df.groupby(['Group', 'Dataset'])['Time Difference'].agg(['mean', 'std', 'max']).reset_index()
+        else:
+            groups = pd.unique(summaries['summary']['Group'])
+            stats_df = summaries['summary']
         
         # Variables to adjust the position of the annotations for readability
         hue_order = ['DY', 'LB', 'EGS']  # Adjust based on your actual hue order
         width = 0.35  # Approximate width of the bars
-        for i, group in enumerate(df['Group'].unique()):
+        for i, group in enumerate(groups):
             for j, scheduler in enumerate(hue_order):
                 # Extract mean and std for the current group and hue
                 means = stats_df[(stats_df['Group'] == group) & (stats_df['Dataset'] == scheduler)]['mean'].values
@@ -303,7 +350,7 @@ def generate_plot_timing_precision(plots_dir, program, df):
                 
                 # Position of the annotations
                 x_pos = i + width * (j - 0.5)  # Adjust this formula as needed
-                y_pos = df[(df['Group'] == group) & (df['Dataset'] == scheduler)]['Time Difference'].max()  # Top of the box
+                y_pos = stats_df[(stats_df['Group'] == group) & (stats_df['Dataset'] == scheduler)]['max'].values[0]  # Top of the box
                 
                 # Annotate the plot with mean and std
                 plt.text(x_pos, y_pos, f'{scheduler}\nMean: {mean:.2f}\nSTD: {std:.2f}', ha='center', va='bottom')
@@ -315,52 +362,75 @@ def generate_plot_timing_precision(plots_dir, program, df):
     plt.tight_layout()
     
     # Save the plot
-    plt.savefig(f"{plots_dir}/{program}_timing_precision.svg", format='svg')
+    plt.savefig(f"{plots_dir}/{program}_timing_precision.svg", format='svg', metadata={'Date': None})
 
-def generate_group_statistics(df, plots_dir, program):
-    # Calculate means, standard deviations, and maxes for all groups.
-    aggregated_stats = df.groupby(['Group', 'Dataset'])['Lag'].agg(['mean', 'std', 'max']).reset_index()
+def generate_group_statistics(dataset_sketches, json_filename):
+    # Calculate means, standard deviations, maxes, and tail percentiles for
+    # all groups from the sketches of each dataset ({dataset: {group: sketch}}).
+    rows = []
+    for dataset, group_sketches in dataset_sketches.items():
+        for group, sketch in group_sketches.items():
+            stats = sketches.sketch_statistics(sketch)
+            rows.append({'Group': group, 'Dataset': dataset, **{key: stats[key] for key in GROUP_STATISTICS}})
+    aggregated_stats = pd.DataFrame(rows, columns=['Group', 'Dataset'] + GROUP_STATISTICS)
+    aggregated_stats = aggregated_stats.sort_values(by=['Group', 'Dataset'], ignore_index=True)
 
     # Save to JSON file
-    json_filename = f"{plots_dir}/{program}_timing_accuracy_stats.json"
     aggregated_stats.to_json(json_filename, orient='records', indent=4)
 
     return aggregated_stats
 
-def generate_program_statistics(df):
-    # Calculate means, standard deviations, and maxes directly.
-    mean_lag = df['Lag'].mean()
-    std_lag = df['Lag'].std()
-    max_lag = df['Lag'].max()
-    
+def generate_program_statistics(group_sketches):
+    # Merge the sketches of all groups into the statistics of the program.
+    merged = sketches.new_sketch()
+    for sketch in group_sketches.values():
+        merged = sketches.merge_sketches(merged, sketch)
+    stats = sketches.sketch_statistics(merged)
+
     # Create a dictionary with the calculated statistics.
-    aggregated_stats = {
-        'mean': mean_lag,
-        'std': std_lag,
-        'max': max_lag
-    }
+    aggregated_stats = {key: stats[key] for key in GROUP_STATISTICS}
 
     return aggregated_stats
 
-def generate_plot_timing_accuracy(plots_dir, program, df):
+def generate_plot_timing_accuracy(plots_dir, program, df, lag_sketches, summaries=None):
+    # The plot is drawn from the rows of df, or from the summaries of
+    # streamed runs if df is None (see streamed_summaries()).
     
-    # Sample in case data set is very large.
-    n_samples = min(len(df), 10000)
-    sampled_df = df.sample(n=n_samples)
-
     # Now, 'combined_df' contains only groups with data
     plt.figure(figsize=(12, 8))
     hue_order = ['DY', 'LB', 'EGS']
-    ax = sns.stripplot(x='Group', y='Lag', hue='Dataset', hue_order=hue_order, palette='flare', data=sampled_df, size=7, jitter=True, dodge=True)
+    if summaries is None and BINNED_PLOTS:
+        summaries = binned_plots.summarize(df, 'Lag', ['Group', 'Dataset'], PLOT_BINS, PLOT_OUTLIER_LIMIT)
+    if summaries is not None:
+        # Draw the distribution of every group from its histogram, with its
+        # most extreme outliers, instead of a sample of the data set.
+        ax = binned_plots.density_plot(plt.gca(), summaries, x='Group', y='Lag', hue='Dataset', hue_order=hue_order, palette='flare')
+    else:
+        # Sample in case data set is very large.
+        n_samples = min(len(df), 10000)
+        sampled_df = df.sample(n=n_samples, random_state=0)
+        # The jitter of the strip plot uses the global NumPy random state.
+        # Seed it, so that the plot does not depend on the process that
+        # renders it.
+        np.random.seed(0)
+        ax = sns.stripplot(x='Group', y='Lag', hue='Dataset', hue_order=hue_order, palette='flare', data=sampled_df, size=7, jitter=True, dodge=True)
     
     # Generate and save statistics to JSON
-    stats_df = generate_group_statistics(df, plots_dir, program)
+    stats_df = generate_group_statistics(lag_sketches, f"{plots_dir}/{program}_timing_accuracy_stats.json")
     
     # If enabled, annotate the plot with mean and std.
     if ANNOTATE_MEAN_STD:
+        # The top of every box.
+        if df is not None:
+            groups = df['Group'].unique()
+            tops = df.groupby(['Group', 'Dataset'])['Lag'].max()
+        else:
+            groups = pd.unique(summaries['summary']['Group'])
+            tops = summaries['summary'].set_index(['Group', 'Dataset'])['max']
+        
         # Variables to adjust the position of the annotations for readability
         width = 0.2  # Approximate width of the bars
-        for i, group in enumerate(df['Group'].unique()):
+        for i, group in enumerate(groups):
             for j, scheduler in enumerate(hue_order):
                 # Extract mean and std for the current group and hue
                 means = stats_df[(stats_df['Group'] == group) & (stats_df['Dataset'] == scheduler)]['mean'].values
@@ -375,7 +445,7 @@ def generate_plot_timing_accuracy(plots_dir, program, df):
                 
                 # Position of the annotations
                 x_pos = i + width * (j - 0.5)  # Adjust this formula as needed
-                y_pos = df[(df['Group'] == group) & (df['Dataset'] == scheduler)]['Lag'].max()  # Top of the box
+                y_pos = tops[(group, scheduler)]  # Top of the box
                 
                 # Annotate the plot with mean and std
                 plt.text(x_pos, y_pos, f'{scheduler}\nMean: {mean:.2f}\nSTD: {std:.2f}', ha='center', va='bottom')
@@ -387,20 +457,26 @@ def generate_plot_timing_accuracy(plots_dir, program, df):
     plt.tight_layout()
     
     # Save the plot
-    plt.savefig(f"{plots_dir}/{program}_timing_accuracy.svg", format='svg')
+    plt.savefig(f"{plots_dir}/{program}_timing_accuracy.svg", format='svg', metadata={'Date': None})
 
-def generate_plot_reaction_execution_time(plots_dir, program, df):    
+def generate_plot_reaction_execution_time(plots_dir, program, df, summaries=None, group_sketches=None):    
+    # The plot is drawn from the rows of df, or from the summaries and the
+    # sketches ({dataset: {group: sketch}}) of streamed runs if df is None.
     plt.figure(figsize=(12, 8))
-    ax = sns.boxplot(x='Group', y='Execution Time', hue='Dataset', data=df, palette="Set2")
+    if summaries is None and BINNED_PLOTS:
+        summaries = binned_plots.summarize(df, 'Execution Time', ['Group', 'Dataset'], PLOT_BINS, PLOT_OUTLIER_LIMIT)
+    if summaries is not None:
+        ax = binned_plots.boxplot(plt.gca(), summaries, x='Group', y='Execution Time', hue='Dataset', palette="Set2")
+    else:
+        ax = sns.boxplot(x='Group', y='Execution Time', hue='Dataset', data=df, palette="Set2")
     
-    # Annotate each plot with mean, std, and max
-    groups = df['Group'].unique()
-    for i, group in enumerate(groups):
-        group_df = df[df['Group'] == group]
-        mean = group_df['Execution Time'].mean()
-        std = group_df['Execution Time'].std()
-        max_time = group_df['Execution Time'].max()
-        
+    # Annotate each plot with mean, std, and max, computed for all groups at
+    # once in order of appearance.
+    if df is not None:
+        stats = df.groupby('Group', sort=False)['Execution Time'].agg(['mean', 'std', 'max'])
+    else:
+        stats = merged_group_statistics(group_sketches)[['mean', 'std', 'max']]
+    for i, (mean, std, max_time) in enumerate(stats.itertuples(index=False)):
         # Positioning for the text annotation
         x = i
         # Adjust y position as needed, placing annotations at the top
@@ -414,25 +490,37 @@ def generate_plot_reaction_execution_time(plots_dir, program, df):
     plt.tight_layout()
     
     # Save the plot
-    plt.savefig(f"{plots_dir}/{program}_execution_time.svg", format='svg')
+    plt.savefig(f"{plots_dir}/{program}_execution_time.svg", format='svg', metadata={'Date': None})
+    
+def generate_plot_vm_execution_time(plots_dir, program, df, summaries=None):
+    # The plot is drawn from the instruction spans of df, or from the
+    # summaries of a streamed run if df is None.
+    if df is not None:
+        # Group the instruction spans by opcode and worker, in order of first
+        # appearance. The label is formatted once per group.
+        grouped = df.groupby(['Opcode', 'Worker'], observed=True, sort=False)
+        labels = [f"{opcode}, {worker}" for opcode, worker in grouped.size().index]
+        df = df.assign(Group=pd.Categorical.from_codes(grouped.ngroup().to_numpy(), categories=labels))
     
-def generate_plot_vm_execution_time(plots_dir, program, df):
     plt.figure(figsize=(12, 8))
-    ax = sns.boxplot(x='Group', y='Instruction Execution Time', data=df, palette="Set2")
+    if summaries is None and BINNED_PLOTS:
+        summaries = binned_plots.summarize(df, 'Duration', ['Group'], PLOT_BINS, PLOT_OUTLIER_LIMIT)
+    if summaries is not None:
+        ax = binned_plots.boxplot(plt.gca(), summaries, x='Group', y='Duration', palette="Set2")
+    else:
+        ax = sns.boxplot(x='Group', y='Duration', data=df, palette="Set2")
 
     # Annotate each plot with mean, std, and max
-    groups = df['Group'].unique()
-    for i, group in enumerate(groups):
-        group_df = df[df['Group'] == group]
-        mean = group_df['Instruction Execution Time'].mean()
-        std = group_df['Instruction Execution Time'].std()
-        max_time = group_df['Instruction Execution Time'].max()
-        
+    if df is not None:
+        stats = df.groupby('Group', observed=True)['Duration'].agg(['mean', 'std', 'max'])
+    else:
+        stats = summaries['summary'][['mean', 'std', 'max']]
+    for i, row in enumerate(stats.itertuples()):
         # Positioning for the text annotation
         x = i
         # Adjust y position as needed, placing annotations at the top
         y = ax.get_ylim()[1]  # Get the current upper limit of the y-axis to position the annotation
-        plt.text(x, y, f'Mean: {mean:.2f}\nSTD: {std:.2f}\nMax: {max_time}', ha='center', va='bottom', rotation=70, fontsize=9)
+        plt.text(x, y, f'Mean: {row.mean:.2f}\nSTD: {row.std:.2f}\nMax: {row.max}', ha='center', va='bottom', rotation=70, fontsize=9)
 
     plt.title("Instruction Execution Times")
     plt.xlabel('Instruction Type, Source')
@@ -441,112 +529,296 @@ def generate_plot_vm_execution_time(plots_dir, program, df):
     plt.tight_layout()
     
     # Save the plot
-    plt.savefig(f"{plots_dir}/{program}_vm_execution_time.svg", format='svg')
+    plt.savefig(f"{plots_dir}/{program}_vm_execution_time.svg", format='svg', metadata={'Date': None})
+
+def timing_accuracy_animation(df, num_frames=50):
+    """
+    Compute the frames of the timing accuracy animation of a combined
+    DataFrame (see combine_df()). Frame k shows the boxes of the first
+    (k + 1) / num_frames of the rows of every dataset, in order of physical
+    time. The boxes of all frames are computed from cumulative histograms in
+    a single pass over the rows, see binned_plots.cumulative_summaries().
+    """
+    # Position of every row in its dataset, in order of physical time.
+    position = df.groupby('Dataset', sort=False)['Elapsed Physical Time'].rank(method='first').to_numpy(dtype=np.int64) - 1
+    
+    # Calculate the number of rows per frame based on the largest dataset
+    max_length = df['Dataset'].value_counts().max()
+    chunk_size = max_length // num_frames + (1 if max_length % num_frames > 0 else 0)
+    
+    return {
+        'order': list(pd.unique(df['Group'])),
+        'hue_order': [dataset for dataset in ['DY', 'LB', 'EGS'] if dataset in set(df['Dataset'])],
+        'frames': binned_plots.cumulative_summaries(df, 'Lag', ['Group', 'Dataset'], position // chunk_size, num_frames),
+    }
+
+def streamed_timing_accuracy_animation(datasets, num_frames=50):
+    """
+    Same as timing_accuracy_animation(), from the lag snapshots of streamed
+    runs ({dataset: results} of post_process_pair_streaming()). Frame k
+    shows the boxes of the lags up to the last snapshot within the first
+    (k + 1) / num_frames of the lags of every dataset.
+    """
+    datasets = {dataset: results for dataset, results in datasets.items() if results['groups'] is not None and len(results['groups']['lag']) > 0}
+    if len(datasets) == 0:
+        return None
+    
+    # Calculate the number of lags per frame based on the largest dataset
+    max_length = max(results['lag_snapshots']['count'] for results in datasets.values())
+    chunk_size = max_length // num_frames + (1 if max_length % num_frames > 0 else 0)
+    
+    frames = []
+    for k in range(num_frames):
+        boundary = (k + 1) * chunk_size
+        entries = []
+        for dataset, results in datasets.items():
+            snapshots = results['lag_snapshots']
+            if boundary >= snapshots['count']:
+                lags = {key: group['sketch'] for key, group in results['groups']['lag'].items()}
+            elif boundary // snapshots['interval'] > 0:
+                lags = snapshots['snapshots'][boundary // snapshots['interval'] - 1]
+            else:
+                continue
+            entries += [((f"{reactor}, {destination}", dataset), sketch, None) for (reactor, destination), sketch in lags.items()]
+        frames.append(binned_plots.sketch_summaries(entries, 'Lag', ['Group', 'Dataset'], PLOT_BINS, PLOT_OUTLIER_LIMIT))
+    
+    return {
+        'order': list(dict.fromkeys(f"{reactor}, {destination}" for results in datasets.values() for reactor, destination in results['groups']['lag'])),
+        'hue_order': list(datasets.keys()),
+        'frames': frames,
+    }
 
-def create_animation_timing_accuracy(program, df_np, df_lb, plots_dir, frames_dir, gif_name, num_frames=50, fps=5):
-    # Ensure directories exist
-    os.makedirs(frames_dir, exist_ok=True)
-    os.makedirs(plots_dir, exist_ok=True)
+def render_animation_frame(summaries, order, hue_order):
+    # Render a frame of the timing accuracy animation into a PNG in memory.
+    # The groups and datasets are given, so that they stay in place in every
+    # frame.
+    fig = plt.figure(figsize=(12, 8))
+    binned_plots.boxplot(fig.gca(), summaries, x='Group', y='Lag', hue='Dataset', order=order, hue_order=hue_order, palette="Set3")
+    
+    plt.xticks(rotation=45)
+    plt.xlabel('Group (Reactor, Destination)')
+    plt.ylabel('Lag')
+    plt.title("Timing Accuracy: DY vs. STATIC")
+    plt.tight_layout()
     
-    # Sort the DataFrame by 'Reactor', 'Destination', and 'Elapsed Physical Time'
-    df_np = df_np.sort_values(by=['Elapsed Physical Time'])
-    df_lb = df_lb.sort_values(by=['Elapsed Physical Time'])
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    return buffer.getvalue()
 
-    # Calculate the total number of frames needed based on the largest dataset
-    max_length = max(len(df_np), len(df_lb))
-    chunk_size = max_length // num_frames + (1 if max_length % num_frames > 0 else 0) 
+def write_animation(path, frames, fps=5):
+    # Stream the rendered frames into the GIF (or MP4) writer.
+    with imageio.get_writer(path, fps=fps) as writer:
+        for frame in frames:
+            writer.append_data(imageio.imread(frame))
 
-    # Generate each frame
-    for frame in range(num_frames):
-        plt.clf()
-        plt.figure(figsize=(12, 8))
+def streamed_summaries(datasets, metric, value):
+    # Summarize a metric of streamed runs ({dataset: results} of
+    # post_process_pair_streaming()) per 'Group' and 'Dataset', with the
+    # groups in the order of combine_df().
+    entries = [
+        ((f"{reactor}, {destination}", dataset), group['sketch'], group['extremes'])
+        for dataset, results in datasets.items() if results['groups'] is not None
+        for (reactor, destination), group in results['groups'][metric].items()
+    ]
+    return binned_plots.sketch_summaries(entries, value, ['Group', 'Dataset'], PLOT_BINS, PLOT_OUTLIER_LIMIT)
 
-        # Current end index for each dataset
-        end_idx_np = min((frame + 1) * chunk_size, len(df_np))
-        end_idx_lb = min((frame + 1) * chunk_size, len(df_lb))
-        
-        # Combine the current chunks from both datasets
-        current_df_np = df_np.iloc[:end_idx_np]
-        current_df_lb = df_lb.iloc[:end_idx_lb]
-        current_combined_df = pd.concat([current_df_np, current_df_lb])
-        
-        # Generate and plot the current combined DataFrame
-        ax = sns.boxplot(x='Group', y='Lag', hue='Dataset', data=current_combined_df, palette="Set3")
-        
-        plt.xticks(rotation=45)
-        plt.xlabel('Group (Reactor, Destination)')
-        plt.ylabel('Lag')
-        plt.title("Timing Accuracy: DY vs. STATIC")
-        plt.tight_layout()
-
-        # Save the current frame
-        frame_path = os.path.join(frames_dir, f'{program}_frame_{frame:04}.png')
-        plt.savefig(frame_path)
-        plt.close()
-
-    # Compile all frames into a GIF
-    frame_filenames = sorted([os.path.join(frames_dir, f) for f in os.listdir(frames_dir) if f.startswith(f'{program}_frame_')])
-    images = [imageio.imread(filename) for filename in frame_filenames]
-    gif_path = os.path.join(plots_dir, gif_name)
-    imageio.mimsave(gif_path, images, fps=fps)
+def merged_group_statistics(dataset_sketches):
+    # Calculate the statistics of every group over all datasets from the
+    # sketches of each dataset ({dataset: {group: sketch}}), in order of
+    # first appearance.
+    merged = {}
+    for group_sketches in dataset_sketches.values():
+        for group, sketch in group_sketches.items():
+            merged[group] = sketches.merge_sketches(merged[group], sketch) if group in merged else sketch
+    return pd.DataFrame([sketches.sketch_statistics(sketch) for sketch in merged.values()], index=list(merged.keys()))
 
 def generate_latex_table(program_names, program_stats, file_path):
-    code = f"% Generated table at {file_path}\n"
-    code += r"""
-    \begin{table*}[ht]
-        \centering
-        \begin{tabular}{lcccccccccc}
-        \toprule 
-        & & \multicolumn{3}{c}{Average (us)} & \multicolumn{3}{c}{Maximum (us)} &
-        \multicolumn{3}{c}{Standard Deviation (us)} \\ 
-        \cmidrule(lr){3-5} \cmidrule(lr){6-8} \cmidrule(lr){9-11}
-        Program & LoC (\lf) & DY & LB & EG & DY & LB & EG & DY & LB & EG \\ 
-        \midrule 
-    """
-    for program in program_names:
-        # .3g = 3 significant digits
-        if program in list(program_stats['DY'].keys()):
-            np_mean = format(program_stats['DY'][program]['mean'] / 1000, '.3g')
-            np_max  = format(program_stats['DY'][program]['max'] / 1000, '.3g')
-            np_std  = format(program_stats['DY'][program]['std'] / 1000, '.3g')
-        else:
-            np_mean = "-"
-            np_max  = "-"
-            np_std  = "-"
-        if program in list(program_stats['LB'].keys()):
-            lb_mean = format(program_stats['LB'][program]['mean'] / 1000, '.3g')
-            lb_max  = format(program_stats['LB'][program]['max'] / 1000, '.3g')
-            lb_std  = format(program_stats['LB'][program]['std'] / 1000, '.3g')
-        else:
-            lb_mean = "-"
-            lb_max  = "-"
-            lb_std  = "-"
-        if program in list(program_stats['EGS'].keys()):
-            egs_mean = format(program_stats['EGS'][program]['mean'] / 1000, '.3g')
-            egs_max  = format(program_stats['EGS'][program]['max'] / 1000, '.3g')
-            egs_std  = format(program_stats['EGS'][program]['std'] / 1000, '.3g')
-        else:
-            egs_mean = "-"
-            egs_max  = "-"
-            egs_std  = "-"
-        code += f"\n\\texttt{{{program}}}  & {program_stats['LOC'][program]}  & {np_mean} & {lb_mean} & {egs_mean} & {np_max} & {lb_max} & {egs_max} & {np_std} & {lb_std} & {egs_std} \\\\"
-    code += r"""
-        \bottomrule
-        \end{tabular} 
-        \caption{Average, maximum, and standard deviation of the lags in microseconds of the
+    caption = r"""Average, maximum, and standard deviation of the lags in microseconds of the
         dynamic scheduler (DY), the static \textsc{Load
         Balanced} scheduler (LB), and the static \textsc{Edge Generation}
-        scheduler (EG).} 
-        \label{tab:accuracy_results}
-    \end{table*}
+        scheduler (EG)."""
+    report.generate_latex_table(program_names, program_stats, file_path, caption)
+    
+def post_process_pair(csv, vm_execution_time=False):
+    # Post process the trace of a single (program, scheduler) pair. The
+    # trace is loaded once and shared by all the analyses.
+    if STREAMING_CHUNK_SIZE is not None:
+        return post_process_pair_streaming(csv, vm_execution_time)
+    trace = load_trace(csv)
+    results = {
+        'timing_precision': post_process_timing_precision(trace),
+        'timing_accuracy': post_process_timing_accuracy(trace),
+        'execution_time': post_process_execution_time(trace),
+        'vm_execution_time': post_process_instruction_execution_times(trace) if vm_execution_time else None,
+    }
+    results['sketches'] = None if trace is None else {
+        'lag': sketches.group_sketches(results['timing_accuracy'], ['Reactor', 'Destination'], 'Lag'),
+        'time_difference': sketches.group_sketches(results['timing_precision'], ['Reactor', 'Destination'], 'Time Difference'),
+        'execution_time': sketches.group_sketches(results['execution_time'], ['Reactor', 'Destination'], 'Execution Time'),
+    }
+    return results
+
+def post_process_pair_streaming(csv, vm_execution_time=False):
+    # Same as post_process_pair(), but the trace is processed in chunks of
+    # STREAMING_CHUNK_SIZE rows instead of being loaded at once. The results
+    # are the summaries of stream_timing_metrics(), not the rows.
+    opcodes = None
+    if vm_execution_time:
+        opcodes = trace_spans.INSTRUCTION_OPCODES
+        if PLOT_BLOCKING_INSTRUCTIONS:
+            opcodes = opcodes + trace_spans.BLOCKING_OPCODES
+    try:
+        results = trace_stream.stream_timing_metrics(
+            csv, TRACE_POINTER_SIZE, STREAMING_CHUNK_SIZE, opcodes,
+            outlier_limit=PLOT_OUTLIER_LIMIT, num_frames=NUM_FRAMES if GENERATE_GIF else None,
+            reorder_window=REORDER_WINDOW)
+    except FileNotFoundError:
+        print("ERROR: file not found - " + str(csv))
+        return {'groups': None, 'sketches': None, 'lag_snapshots': None}
+    unmatched = results.pop('unmatched')
+    if unmatched['reaction_starts'] > 0 or unmatched['reaction_ends'] > 0:
+        print(f"WARNING: {unmatched['reaction_starts']} reaction start(s) and {unmatched['reaction_ends']} reaction end(s) are unmatched.")
+    if unmatched['instruction_starts'] > 0 or unmatched['instruction_ends'] > 0:
+        print(f"WARNING: {unmatched['instruction_starts']} instruction start(s) and {unmatched['instruction_ends']} instruction end(s) are unmatched.")
+    late_starts = results.pop('late_starts')
+    if late_starts > 0:
+        print(f"WARNING: {late_starts} reaction start(s) arrived after more than REORDER_WINDOW = {REORDER_WINDOW} later starts, and are left out of the timing precision.")
+    return results
+
+def generate_program_plots(program, results, plots_dir, animate=False):
     """
+    Generate the plots of a program from the post processing results of its
+    NP, LB, and EGS runs, either their rows (see post_process_pair()) or the
+    summaries of streamed runs (see post_process_pair_streaming()). Return
+    the program statistics of each dataset for the LaTeX table, and the
+    frames of the timing accuracy animation if animate is True (see
+    timing_accuracy_animation()), else None.
+    """
+    np_results, lb_results, egs_results = results['NP'], results['LB'], results['EGS']
+    streamed = 'groups' in np_results
 
-    with open(file_path, 'w') as file:
-        file.write(code)
+    # Save the sketches of every run, so that the statistics of repeated runs
+    # can be merged later without the traces.
+    datasets = {'DY': np_results, 'LB': lb_results, 'EGS': egs_results}
+    for dataset, dataset_results in datasets.items():
+        if dataset_results['sketches'] is not None:
+            sketches.save_sketches(f"{plots_dir}/{program}_{dataset}_sketches.json", dataset_results['sketches'])
+    dataset_sketches = {dataset: dataset_results['sketches'] for dataset, dataset_results in datasets.items() if dataset_results['sketches'] is not None}
     
+    ##################################
+    # Generate timing precision plot #
+    ##################################
+    if streamed:
+        generate_plot_timing_precision(plots_dir, program, None, streamed_summaries(datasets, 'time_difference', 'Time Difference'))
+    else:
+        df_combined = combine_df(np_results['timing_precision'], lb_results['timing_precision'], egs_results['timing_precision'])
+        generate_plot_timing_precision(plots_dir, program, df_combined)
+    generate_group_statistics(
+        {dataset: s['time_difference'] for dataset, s in dataset_sketches.items()},
+        f"{plots_dir}/{program}_timing_precision_stats.json")
+    
+    #################################
+    # Generate timing accuracy plot #
+    #################################
+    lag_sketches = {dataset: s['lag'] for dataset, s in dataset_sketches.items()}
+    if streamed:
+        generate_plot_timing_accuracy(plots_dir, program, None, lag_sketches, streamed_summaries(datasets, 'lag', 'Lag'))
+        
+        # Extract the most extreme outliers of every group, and save them
+        # with their logical and physical times.
+        for scheduler, dataset_results in [('NP', np_results), ('LB', lb_results), ('EGS', egs_results)]:
+            if dataset_results['groups'] is not None:
+                entries = [(key, group['sketch'], group['extremes']) for key, group in dataset_results['groups']['lag'].items()]
+                outliers_df, thresholds = outliers.extract_streamed_outliers(entries, ['Reactor', 'Destination'], 'Lag')
+                outliers.save_outliers(f"{plots_dir}/{program}_timing_accuracy_outliers_{scheduler}.npz", outliers_df, thresholds, ['Reactor', 'Destination'], 'Lag')
+        
+        # Compute the frames of the timing accuracy animation from the lag
+        # snapshots. They are rendered by main() on the process pool.
+        animation = streamed_timing_accuracy_animation(datasets, num_frames=NUM_FRAMES) if animate else None
+    else:
+        df_np_timing_accuracy = np_results['timing_accuracy']
+        df_lb_timing_accuracy = lb_results['timing_accuracy']
+        df_egs_timing_accuracy = egs_results['timing_accuracy']
+        df_combined = combine_df(df_np_timing_accuracy, df_lb_timing_accuracy, df_egs_timing_accuracy)
+        generate_plot_timing_accuracy(plots_dir, program, df_combined, lag_sketches)
+        
+        # Extract outliers, and save them with their logical and physical times
+        # (see outliers.load_outliers() to read them back).
+        for scheduler, df in [('NP', df_np_timing_accuracy), ('LB', df_lb_timing_accuracy), ('EGS', df_egs_timing_accuracy)]:
+            if df is not None:
+                outliers_df, thresholds = extract_timing_accuracy_outliers(df)
+                outliers.save_outliers(f"{plots_dir}/{program}_timing_accuracy_outliers_{scheduler}.npz", outliers_df, thresholds, ['Reactor', 'Destination'], 'Lag')
+        
+        # Compute the frames of the timing accuracy animation. They are rendered
+        # by main() on the process pool.
+        animation = timing_accuracy_animation(df_combined, num_frames=NUM_FRAMES) if animate else None
+    
+    # Program statistics for generating LaTeX table.
+    stats = {dataset: generate_program_statistics(s) for dataset, s in lag_sketches.items()}
+    
+    #########################################
+    # Generate reaction execution time plot #
+    #########################################
+    if streamed:
+        generate_plot_reaction_execution_time(
+            plots_dir, program, None, streamed_summaries(datasets, 'execution_time', 'Execution Time'),
+            {dataset: s['execution_time'] for dataset, s in dataset_sketches.items()})
+    else:
+        df_combined_reaction_exec = combine_df(np_results['execution_time'], lb_results['execution_time'], egs_results['execution_time'])
+        generate_plot_reaction_execution_time(plots_dir, program, df_combined_reaction_exec)
+    
+    ####################################
+    # Generate PretVM instruction plot #
+    ####################################
+    if streamed:
+        entries = [((f"{opcode}, {worker}",), group['sketch'], group['extremes']) for (opcode, worker), group in lb_results['groups']['vm_execution_time'].items()]
+        generate_plot_vm_execution_time(plots_dir, program, None, binned_plots.sketch_summaries(entries, 'Duration', ['Group'], PLOT_BINS, PLOT_OUTLIER_LIMIT))
+    else:
+        generate_plot_vm_execution_time(plots_dir, program, lb_results['vm_execution_time'])
+    
+    # Close the figures, since the process is reused for other programs.
+    plt.close('all')
+    
+    return stats, animation
+
+def program_fingerprint(manifest, program, schedulers):
+    """
+    Fingerprint the inputs of the statistics and plots of a program: its
+    traces, the post processing code, and the configs that change the plots.
+    """
+    traces = []
+    for scheduler, dir in schedulers:
+        try:
+            source = trace_loader.trace_source(dir / (program + ".csv"))
+            traces.append([scheduler, source.name, report.file_fingerprint(manifest, source)])
+        except FileNotFoundError:
+            traces.append([scheduler, None, None])
+    script_dir = Path(__file__).resolve().parent
+    code = report.code_fingerprint(*[script_dir / name for name in ["experiment_timing.py", "trace_loader.py", "trace_spans.py", "trace_stream.py", "sketches.py", "report.py", "binned_plots.py", "outliers.py"]])
+    config = {
+        'STATIC_SCHEDULER_NAMES': STATIC_SCHEDULER_NAMES,
+        'ANNOTATE_MEAN_STD': ANNOTATE_MEAN_STD,
+        'BINNED_PLOTS': BINNED_PLOTS,
+        'PLOT_BINS': PLOT_BINS,
+        'PLOT_OUTLIER_LIMIT': PLOT_OUTLIER_LIMIT,
+        'TRACE_POINTER_SIZE': TRACE_POINTER_SIZE,
+        'STREAMING_CHUNK_SIZE': STREAMING_CHUNK_SIZE,
+        'REORDER_WINDOW': REORDER_WINDOW,
+        'PLOT_BLOCKING_INSTRUCTIONS': PLOT_BLOCKING_INSTRUCTIONS,
+        'GROUP_STATISTICS': GROUP_STATISTICS,
+        'GENERATE_GIF': GENERATE_GIF,
+        'NUM_FRAMES': NUM_FRAMES,
+        'FPS': FPS,
+        'ANIMATION_FORMAT': ANIMATION_FORMAT,
+    }
+    return report.fingerprint(traces, code, config)
+
 def main(args=None):
     # Parse arguments.
     args = parser.parse_args(args)
+    if args.from_db and args.experiment_dir is None:
+        parser.error("--from-db requires --experiment-dir.")
     
     # Variable declarations
     expr_data_dirname = "experiment-data/"
@@ -582,11 +854,6 @@ def main(args=None):
     plots_dir = expr_run_dir / "plots"
     plots_dir.mkdir(exist_ok=True)
     
-    # Storing frames for creating GIFs
-    if GENERATE_GIF:
-        frames_dir = expr_run_dir / "frames"
-        frames_dir.mkdir(exist_ok=True)
-    
     if args.experiment_dir is None:
         # Prepare arguments for each run_benchmark call.
         args_1 = ["-hn=" + IP, "-un=" + UN, "-pwd=" + PW, "-f=--scheduler=NP", "-dd="+str(np_dir.resolve()), "--src=timing/src", "--src-gen=timing/src-gen"]
@@ -595,6 +862,20 @@ def main(args=None):
         if DASH_MODE:
             args_2.append("-f=--dash")
             args_3.append("-f=--dash")
+
+        # Decode the traces on the host instead of the board.
+        if HOST_TRACE_DECODING:
+            for args_i in [args_1, args_2, args_3]:
+                args_i.append("--no-parse")
+
+        # Compile on the host and only ship the executables to the board.
+        if CROSS_COMPILE:
+            for args_i in [args_1, args_2, args_3]:
+                args_i.append("--cross-compile")
+                if TOOLCHAIN_FILE is not None:
+                    args_i.append("--toolchain-file=" + TOOLCHAIN_FILE)
+                if SYSROOT is not None:
+                    args_i.append("--sysroot=" + SYSROOT)
         
         # Select programs
         if len(SELECT_PROGRAMS) > 0:
@@ -612,12 +893,29 @@ def main(args=None):
             for prog in EXCLUDED_PROGRAMS['EGS']:
                 args_3.append("--exclude="+prog)
                 
+        # Save the metadata of the runs for the results store.
+        lfc_commit, lfc_dirty = run_benchmark.host_get_lfc_commit()
+        results_db.save_metadata(expr_run_dir, {
+            "started": datetime.strptime(time, "%Y-%m-%d_%H-%M-%S").isoformat(),
+            "platform": PLATFORM,
+            "dash_mode": DASH_MODE,
+            "lfc_version": run_benchmark.host_get_lfc_version(),
+            "lfc_commit": lfc_commit,
+            "lfc_dirty": lfc_dirty,
+            "flags": {dataset: results_db.lfc_flags(args_i) for dataset, args_i in [("DY", args_1), ("LB", args_2), ("EGS", args_3)]},
+        })
+
         # Run the benchmark runner using the NP and the STATIC scheduler.
         # NOTE: The 2nd run's src-gen is copied back the host. So it's better to
         # be static because we want to inspect the graphs.
-        run_benchmark.main(args_1) # NP   
-        run_benchmark.main(args_2) # LB
-        run_benchmark.main(args_3) # EGS
+        if len(BOARDS) > 1:
+            board_pool.main(board_pool.boards_from_credentials(BOARDS), [args_1, args_2, args_3])
+        elif OVERLAP_STAGES:
+            pipeline.main([args_1, args_2, args_3], isolate_runs=ISOLATE_RUNS)
+        else:
+            run_benchmark.main(args_1) # NP   
+            run_benchmark.main(args_2) # LB
+            run_benchmark.main(args_3) # EGS
         
         # Move the static src-gen to the experiment folder for record keeping.
         # Use shutil.copytree to copy the directory
@@ -650,70 +948,86 @@ def main(args=None):
         },
     }
     
-    # Generate timing variation plots for each program.
+    db_path = expr_data_dir / results_db.RESULTS_DB
+    if args.from_db:
+        # Compute the program statistics from the lag sketches in the results
+        # store.
+        conn = results_db.connect(db_path)
+        lag_sketches = results_db.load_group_sketches(conn, expr_run_dir.name, "lag")
+        conn.close()
+        if len(lag_sketches) == 0: raise Exception(f"{expr_run_dir.name} is not in {db_path}.")
+        all_stats = {}
+        for dataset, program_sketches in lag_sketches.items():
+            for program, group_sketches in program_sketches.items():
+                all_stats.setdefault(program, {})[dataset] = generate_program_statistics(group_sketches)
+    else:
+        # Only post process the programs whose traces (or the post processing
+        # itself) changed since the last post processing of this experiment. The
+        # statistics of the other programs are reused from the report manifest.
+        schedulers = [("NP", np_dir), ("LB", lb_dir), ("EGS", egs_dir)]
+        manifest_path = expr_run_dir / report.REPORT_MANIFEST
+        manifest = report.load_manifest(manifest_path)
+        all_stats = {}
+        fingerprints = {}
+        for program in program_names:
+            fingerprints[program] = program_fingerprint(manifest, program, schedulers)
+            if not args.rebuild:
+                stats = report.lookup(manifest, f"timing:{program}", fingerprints[program], plots_dir)
+                if stats is not None:
+                    all_stats[program] = stats
+        stale_programs = [program for program in program_names if program not in all_stats]
+        if len(all_stats) > 0:
+            print(f"Reusing the statistics and plots of {len(all_stats)} unchanged program(s): {', '.join(all_stats.keys())}.")
+    
+        # Post process every (program, scheduler) pair in parallel. The PretVM
+        # instructions are only analyzed for LB. The plots of a program are
+        # generated as soon as its pairs are done, and the results of the
+        # pairs are then dropped, so only the results of the programs in
+        # flight are held at a time.
+        groups = [[(dir / (program + ".csv"), scheduler == "LB") for scheduler, dir in schedulers] for program in stale_programs]
+        def plot_task(i, pair_results):
+            results = dict(zip([scheduler for scheduler, _ in schedulers], pair_results))
+            return (stale_programs[i], results, plots_dir, GENERATE_GIF)
+        program_results = process_pool.map_task_groups(post_process_pair, groups, generate_program_plots, plot_task, args.jobs)
+        animations = []
+        for program, (stats, animation) in zip(stale_programs, program_results):
+            all_stats[program] = stats
+            if animation is not None:
+                animations.append((program, animation))
+    
+        # Render the frames of all the animations in parallel, in memory, and
+        # stream them into the writer of each animation in frame order.
+        tasks = [(summaries, animation['order'], animation['hue_order']) for _, animation in animations for summaries in animation['frames']]
+        frames = iter(process_pool.map_tasks(render_animation_frame, tasks, args.jobs))
+        for program, animation in animations:
+            write_animation(plots_dir / f"{program}_timing_accuracy_animation.{ANIMATION_FORMAT}", [next(frames) for _ in animation['frames']], fps=FPS)
+        del animations
+    
+        for program in stale_programs:
+            outputs = [path.name for path in plots_dir.glob(f"{program}_*") if path.is_file()]
+            report.record(manifest, f"timing:{program}", fingerprints[program], all_stats[program], outputs)
+        report.save_manifest(manifest_path, manifest)
+
+        # Store the sketches of every run for cross-run queries.
+        if STORE_RESULTS:
+            program_sketches = {}
+            for program in program_names:
+                for dataset in ['DY', 'LB', 'EGS']:
+                    path = plots_dir / f"{program}_{dataset}_sketches.json"
+                    if path.is_file():
+                        program_sketches.setdefault(program, {})[dataset] = sketches.load_sketches(path)
+            conn = results_db.connect(db_path)
+            results_db.ingest_timing(conn, expr_run_dir.name, results_db.load_metadata(expr_run_dir), program_sketches)
+            conn.close()
+    
+    if CHECK_REGRESSIONS and (STORE_RESULTS or args.from_db):
+        regression.check_experiment(db_path, "timing", expr_run_dir.name, expr_run_dir)
+
+    # Populating program stats for generating LaTeX table. The results are
+    # merged in program order, so the table does not depend on the pool.
     for program in program_names:
-        
-        csv_np = np_dir / (program + ".csv")
-        csv_lb = lb_dir / (program + ".csv")
-        csv_egs = egs_dir / (program + ".csv")
-        
-        ##################################
-        # Generate timing precision plot #
-        ##################################
-        df_np_timing_precision = post_process_timing_precision(csv_np)
-        df_lb_timing_precision = post_process_timing_precision(csv_lb)
-        df_egs_timing_precision = post_process_timing_precision(csv_egs)
-        df_combined = combine_df(df_np_timing_precision, df_lb_timing_precision, df_egs_timing_precision)
-        generate_plot_timing_precision(plots_dir, program, df_combined)
-        
-        #################################
-        # Generate timing accuracy plot #
-        #################################
-        df_np_timing_accuracy = post_process_timing_accuracy(csv_np)
-        df_lb_timing_accuracy = post_process_timing_accuracy(csv_lb)
-        df_egs_timing_accuracy = post_process_timing_accuracy(csv_egs)
-        df_combined = combine_df(df_np_timing_accuracy, df_lb_timing_accuracy, df_egs_timing_accuracy)
-        generate_plot_timing_accuracy(plots_dir, program, df_combined)
-        
-        # Extract outliers
-        if df_np_timing_accuracy is not None:
-            np_timing_accuracy_outliers_df = extract_timing_accuracy_outliers(df_np_timing_accuracy)
-            np_timing_accuracy_outliers_df.to_csv(f"{plots_dir}/{program}_timing_accuracy_outliers_NP.csv", index=False)
-        if df_lb_timing_accuracy is not None:
-            lb_timing_accuracy_outliers_df = extract_timing_accuracy_outliers(df_lb_timing_accuracy)
-            lb_timing_accuracy_outliers_df.to_csv(f"{plots_dir}/{program}_timing_accuracy_outliers_LB.csv", index=False)
-        if df_egs_timing_accuracy is not None:
-            egs_timing_accuracy_outliers_df = extract_timing_accuracy_outliers(df_egs_timing_accuracy)
-            egs_timing_accuracy_outliers_df.to_csv(f"{plots_dir}/{program}_timing_accuracy_outliers_EGS.csv", index=False)
-        
-        # Generate GIFs for timing accuracy
-        # FIXME: Account for the EGS df for animation.
-        if GENERATE_GIF:
-            gif_name = f"{program}_timing_accuracy_animation.gif"
-            create_animation_timing_accuracy(program, df_np_timing_accuracy, df_lb_timing_accuracy, plots_dir, frames_dir, gif_name, num_frames=NUM_FRAMES, fps=FPS)
-        
-        # Populating program stats for generating LaTeX table.
-        if df_np_timing_accuracy is not None:
-            program_stats['DY'][program] = generate_program_statistics(df_np_timing_accuracy)
-        if df_lb_timing_accuracy is not None:
-            program_stats['LB'][program] = generate_program_statistics(df_lb_timing_accuracy)
-        if df_egs_timing_accuracy is not None:
-            program_stats['EGS'][program] = generate_program_statistics(df_egs_timing_accuracy)
-        
-        #########################################
-        # Generate reaction execution time plot #
-        #########################################
-        df_np_reaction_exec = post_process_execution_time(csv_np)
-        df_lb_reaction_exec = post_process_execution_time(csv_lb)
-        df_egs_reaction_exec = post_process_execution_time(csv_egs)
-        df_combined_reaction_exec = combine_df(df_np_reaction_exec, df_lb_reaction_exec, df_egs_reaction_exec)
-        generate_plot_reaction_execution_time(plots_dir, program, df_combined_reaction_exec)
-        
-        ####################################
-        # Generate PretVM instruction plot #
-        ####################################
-        df_lb_vm_exec = post_process_instruction_execution_times(csv_lb)
-        generate_plot_vm_execution_time(plots_dir, program, df_lb_vm_exec)
+        for dataset, program_stat in all_stats.get(program, {}).items():
+            program_stats[dataset][program] = program_stat
 
     generate_latex_table(program_names, program_stats, expr_run_dir / "table.tex")
 
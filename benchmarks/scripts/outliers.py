@@ -0,0 +1,147 @@
+"""
+Outliers of the timing metrics per group, e.g., per (Reactor, Destination).
+A value is an outlier of its group if it is beyond the group's Tukey fences
+Q1 - k * IQR and Q3 + k * IQR. The thresholds of all groups are computed in
+a single grouped pass, so a slow group does not hide the outliers of a fast
+one, as a single global IQR would.
+
+For streamed traces, extract_streamed_outliers() computes the same tables
+from the sketch of every group and its reservoir of extreme values (see
+binned_plots.update_extremes()), so only the most extreme outliers of each
+group are kept.
+
+The outliers are exported in a .npz archive of columns (see save_outliers()):
+the keys, the value, and the time context of every outlier (e.g., the
+logical and physical time), with the thresholds of every group. Strings are
+stored as categorical codes, so the archive stays compact for millions of
+outliers. Use load_outliers() to read it back.
+"""
+
+import numpy as np
+import pandas as pd
+
+import binned_plots
+import sketches
+
+# Context columns exported with the outliers, if the frame has them.
+CONTEXT_COLUMNS = ["Source", "Elapsed Logical Time", "Microstep", "Elapsed Physical Time"]
+
+
+def iqr_thresholds(df, keys, column, k=1.5):
+    """
+    Return the "count", "q1", "q3", "low", and "high" thresholds of the
+    column for every group of keys, sorted by keys.
+    """
+    grouped = df.groupby(keys, observed=True)[column]
+    quartiles = grouped.quantile([0.25, 0.75]).unstack()
+    thresholds = pd.DataFrame({
+        "count": grouped.size(),
+        "q1": quartiles[0.25],
+        "q3": quartiles[0.75],
+    })
+    iqr = thresholds["q3"] - thresholds["q1"]
+    thresholds["low"] = thresholds["q1"] - k * iqr
+    thresholds["high"] = thresholds["q3"] + k * iqr
+    return thresholds.reset_index()
+
+
+def extract_outliers(df, keys, column, k=1.5):
+    """
+    Return the rows of df whose column is an outlier of their group, and the
+    thresholds of every group (see iqr_thresholds()) with their number of
+    "outliers".
+    """
+    thresholds = iqr_thresholds(df, keys, column, k)
+    # The group codes follow the sorted keys, as the thresholds.
+    codes = df.groupby(keys, observed=True).ngroup().to_numpy()
+    values = df[column].to_numpy()
+    is_outlier = (values < thresholds["low"].to_numpy()[codes]) | (values > thresholds["high"].to_numpy()[codes])
+    thresholds["outliers"] = np.bincount(codes[is_outlier], minlength=len(thresholds))
+    return df[is_outlier], thresholds
+
+
+def extract_streamed_outliers(entries, keys, column, k=1.5):
+    """
+    Same as extract_outliers(), from bounded state instead of a frame.
+    entries is a list of (key, sketch, extremes), where key holds the values
+    of the keys of the group, and extremes is its reservoir (see
+    binned_plots.update_extremes()), with the context columns of the values.
+    A group whose reservoir holds every value is exact. Otherwise, the
+    quartiles come from the sketch, the outliers are those of the
+    reservoir, and their number is exact as long as the reservoir reaches
+    within the thresholds on both sides.
+    """
+    rows = []
+    frames = []
+    for key, sketch, extremes in entries:
+        count = sketch["count"]
+        low_values, high_values, complete = binned_plots.extremes_sides(extremes, count)
+        if complete:
+            q1, q3 = np.quantile(low_values, [0.25, 0.75])
+        else:
+            q1, q3 = sketches.sketch_quantile(sketch, 0.25), sketches.sketch_quantile(sketch, 0.75)
+        low = q1 - k * (q3 - q1)
+        high = q3 + k * (q3 - q1)
+
+        below = int(np.count_nonzero(low_values < low))
+        if not complete and below == len(low_values):
+            below = sketches.sketch_rank(sketch, low, "left")
+        above = int(np.count_nonzero(high_values > high))
+        if not complete and above == len(high_values):
+            above = count - sketches.sketch_rank(sketch, high, "right")
+        rows.append({**dict(zip(keys, key)), "count": count, "q1": q1, "q3": q3, "low": low, "high": high, "outliers": below + above})
+
+        values = extremes["value"]
+        is_outlier = (values < low) | (values > high)
+        context = {name: values[is_outlier] for name, values in extremes.items() if name != "value"}
+        frames.append(pd.DataFrame({**dict(zip(keys, key)), column: values[is_outlier], **context}, index=range(np.count_nonzero(is_outlier))))
+    thresholds = pd.DataFrame(rows, columns=list(keys) + ["count", "q1", "q3", "low", "high", "outliers"])
+    outliers = pd.concat(frames, ignore_index=True) if len(frames) > 0 else pd.DataFrame(columns=list(keys) + [column])
+    return outliers, thresholds
+
+
+def encode_columns(df, prefix):
+    # The arrays of the columns of df. Strings are stored as codes, with the
+    # categories in "<prefix>categories:<column>".
+    arrays = {}
+    for name, values in df.items():
+        if values.dtype == object:
+            values = values.astype("category")
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # As a list, so that strings become a fixed-width string array.
+            arrays[f"{prefix}categories:{name}"] = np.asarray(values.cat.categories.tolist())
+            arrays[f"{prefix}{name}"] = values.cat.codes.to_numpy()
+        else:
+            arrays[f"{prefix}{name}"] = values.to_numpy()
+    return arrays
+
+
+def decode_columns(archive, prefix):
+    columns = {}
+    for key in archive.files:
+        if not key.startswith(prefix) or key.startswith(f"{prefix}categories:"):
+            continue
+        name = key[len(prefix):]
+        values = archive[key]
+        if f"{prefix}categories:{name}" in archive.files:
+            values = pd.Categorical.from_codes(values, categories=archive[f"{prefix}categories:{name}"])
+        columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def save_outliers(path, outliers, thresholds, keys, column):
+    # Save the keys, the value, and the context of the outliers, with the
+    # thresholds of every group, as an uncompressed .npz archive.
+    columns = list(keys) + [column] + [c for c in CONTEXT_COLUMNS if c in outliers.columns and c not in keys]
+    arrays = encode_columns(outliers[columns], "outliers:")
+    arrays.update(encode_columns(thresholds, "thresholds:"))
+    np.savez(path, **arrays)
+
+
+def load_outliers(path):
+    """
+    Load an archive written by save_outliers(). Return the outliers and the
+    thresholds as DataFrames.
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        return decode_columns(archive, "outliers:"), decode_columns(archive, "thresholds:")
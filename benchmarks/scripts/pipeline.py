@@ -0,0 +1,175 @@
+"""
+This utility runs a benchmark campaign on a single board as a DAG of stages,
+instead of the strict phases of run_benchmark.main() (generate all, copy all,
+compile all, run all) repeated for every scheduler config. It takes the same
+argument lists that are normally passed to run_benchmark.main() (one per
+scheduler config, e.g., NP, LB, and EGS).
+
+The stages of every (program, scheduler config) pair are:
+    generate -> copy -> cmake -> run -> convert -> fetch
+where `generate` is shared by all programs of a scheduler config, since lfc
+compiles a whole config in a single batch.
+
+A stage starts as soon as its dependencies are done and the resources it
+needs are free. The resources are:
+    - host:    the lfc code generation on the host
+    - link:    the SFTP channel to the board
+    - build:   the board-side compilation (skipped for cross-compiled programs)
+               and trace conversion
+    - measure: the measured run on the board
+So while the board runs one program, the host generates the next config and
+the board copies and compiles the next programs. Only one measured run
+executes on the board at a time. With isolate_runs, the board-side build
+stages also hold the `measure` resource, so that nothing is compiled on the
+board during a measured run.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import run_benchmark
+import board_pool
+
+
+def stage(name, func, deps=(), resources=()):
+    return {"name": name, "func": func, "deps": list(deps), "resources": set(resources)}
+
+
+def run_stages(stages, max_workers=8):
+    """
+    Run a list of stages, given in a topological order. A stage is started
+    once all its dependencies are done and none of its resources is held by a
+    running stage. Stages are started in list order, so earlier pairs take
+    priority. Stages whose dependencies failed are skipped.
+    Return a dictionary mapping each stage name to "done", "failed", or
+    "skipped".
+    """
+    status = {}
+    pending = list(stages)
+    running = {}
+    busy = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(pending) > 0 or len(running) > 0:
+            for st in list(pending):
+                if any(status.get(dep) in ("failed", "skipped") for dep in st["deps"]):
+                    status[st["name"]] = "skipped"
+                    pending.remove(st)
+                elif all(status.get(dep) == "done" for dep in st["deps"]) \
+                        and len(busy & st["resources"]) == 0 \
+                        and len(running) < max_workers:
+                    busy |= st["resources"]
+                    running[executor.submit(st["func"])] = st
+                    pending.remove(st)
+
+            if len(running) == 0:
+                # Nothing can make progress, e.g., because of an unknown
+                # dependency.
+                for st in pending:
+                    status[st["name"]] = "skipped"
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                st = running.pop(future)
+                busy -= st["resources"]
+                try:
+                    future.result()
+                    status[st["name"]] = "done"
+                except Exception as e:
+                    print(f"Pipeline: stage {st['name']} failed: {e}")
+                    status[st["name"]] = "failed"
+    return status
+
+
+def build_stages(configs, isolate_runs=False):
+    """
+    Build the stages of every (program, scheduler config) pair. The results
+    of the stages are passed along in the context dictionary.
+    """
+    context = {}
+    stages = []
+    build_resources = ["build", "measure"] if isolate_runs else ["build"]
+
+    for config in configs:
+        name = config["name"]
+        args = config["args"]
+        remote_data = f"~/benchmarks-data/{name}"
+
+        def generate(config=config):
+            context[config["name"]] = board_pool.host_generate_config(config)
+            run_benchmark.remote_create_dir(f"~/benchmarks-data/{config['name']}")
+
+        generate_stage = f"generate:{name}"
+        stages.append(stage(generate_stage, generate, resources=["host"]))
+
+        for program in board_pool.host_list_config_programs(config):
+            pair = f"{name}:{program}"
+
+            def copy(name=name, program=program, args=args):
+                if program not in context[name]:
+                    raise Exception(f"no generated code for {program}")
+                context[(name, program)] = run_benchmark.remote_upload_cached_program(program, context[name][program], args)
+
+            def cmake(name=name, program=program, args=args):
+                remote_dir, hit = context[(name, program)]
+                entry = context[name][program]
+                if not hit and not run_benchmark.remote_build_cached_program(program, entry, remote_dir, args):
+                    raise Exception(f"compiling {program} failed")
+
+            def run(name=name, program=program, args=args, remote_data=remote_data):
+                remote_dir, _ = context[(name, program)]
+                run_benchmark.remote_rm_dir(f"{remote_data}/{program}.*")
+                run_benchmark.remote_run_program(remote_dir, remote_data, args)
+
+            def convert(program=program, remote_data=remote_data):
+                convert_for_chrome = True
+                run_benchmark.remote_run_trace_conversion(f"{program}.lft", remote_data, convert_for_chrome)
+
+            def fetch(program=program, args=args, remote_data=remote_data):
+                run_benchmark.host_fetch_program_results(program, remote_data, args)
+
+            stages.append(stage(f"copy:{pair}", copy, [generate_stage], ["link"]))
+            stages.append(stage(f"cmake:{pair}", cmake, [f"copy:{pair}"], build_resources))
+            if args.no_run:
+                continue
+            stages.append(stage(f"run:{pair}", run, [f"cmake:{pair}"], ["measure"]))
+            last_stage = f"run:{pair}"
+            if not args.no_tracing and not args.no_parse:
+                stages.append(stage(f"convert:{pair}", convert, [last_stage], build_resources))
+                last_stage = f"convert:{pair}"
+            stages.append(stage(f"fetch:{pair}", fetch, [last_stage], ["link"]))
+    return stages
+
+
+def main(arg_lists, isolate_runs=False):
+    """
+    Run every argument list in arg_lists (as would be passed to
+    run_benchmark.main()) on the board given by the first argument list.
+    """
+    time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # Format: Year-Month-Day_Hour-Minute-Second
+    configs = [board_pool.host_parse_config(arg_list, i, time) for i, arg_list in enumerate(arg_lists)]
+
+    if not run_benchmark.host_connect_to_remote(configs[0]["args"]):
+        print("Pipeline: Cannot connect to host! Abort.")
+        exit(1)
+    print("Pipeline: Connected to remote host " + configs[0]["args"].hostname + ".")
+
+    if any(config["args"].clear_cache for config in configs):
+        benchmarks_dir = Path(__file__).resolve().parent.parent
+        run_benchmark.host_rm_dir(benchmarks_dir / run_benchmark.HOST_CACHE_DIRNAME)
+        run_benchmark.remote_rm_dir(run_benchmark.REMOTE_CACHE)
+        run_benchmark.remote_rm_dir(run_benchmark.REMOTE_RUNTIME_CACHE)
+
+    start_time = perf_counter()
+    status = run_stages(build_stages(configs, isolate_runs))
+    run_benchmark.host_close_connection_to_remote()
+
+    # Report the stages that did not complete.
+    for name, result in status.items():
+        if result != "done":
+            print(f"Pipeline: {name} {result}.")
+    done = sum(1 for result in status.values() if result == "done")
+    print(f"Pipeline: {done}/{len(status)} stages done in {perf_counter() - start_time:.2f} s.")
+    return status
@@ -0,0 +1,73 @@
+"""
+Process pools for the post processing of the experiment scripts.
+
+map_tasks() calls a function on every task of a list, and returns the
+results in task order.
+
+map_task_groups() is for tasks that come in groups whose results are
+consumed together by a follow-up task, e.g., the (program, scheduler) pairs
+of a program and the plots of the program. The follow-up task of a group is
+submitted as soon as the last task of the group is done, and the results of
+the group are then dropped from the parent process. At most jobs tasks are
+in flight, so the parent only holds the results of a few groups at a time,
+instead of the results of every task before the first follow-up task starts.
+
+In both, a task is a tuple of arguments, and jobs <= 1 runs the tasks
+serially in the calling process.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def map_tasks(func, tasks, jobs):
+    # Call func on every task (a tuple of arguments) with a pool of jobs
+    # processes. The results are returned in task order, so the output does
+    # not depend on which task finishes first.
+    if jobs <= 1 or len(tasks) <= 1:
+        return [func(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        return list(executor.map(func, *zip(*tasks)))
+
+
+def map_task_groups(func, groups, then, then_task, jobs):
+    """
+    Call func on every task of groups (a list of lists of tasks) with a pool
+    of jobs processes. Once all the tasks of group i are done, call then on
+    the task returned by then_task(i, results), where results are those of
+    the tasks of the group in task order. then_task is called in the calling
+    process. Return the results of then in group order.
+
+    The follow-up tasks are submitted before the remaining tasks of func,
+    so that the results of a group are passed on as early as possible.
+    """
+    if jobs <= 1:
+        return [then(*then_task(i, [func(*task) for task in tasks])) for i, tasks in enumerate(groups)]
+
+    results = [None] * len(groups)
+    pending = [[None] * len(tasks) for tasks in groups]
+    remaining = [len(tasks) for tasks in groups]
+    queue = deque((i, j) for i, tasks in enumerate(groups) for j in range(len(tasks)))
+    ready = deque(i for i, tasks in enumerate(groups) if len(tasks) == 0)
+    running = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(jobs, len(queue) + len(ready)))) as executor:
+        while queue or ready or running:
+            while len(running) < jobs and (queue or ready):
+                if ready:
+                    i = ready.popleft()
+                    running[executor.submit(then, *then_task(i, pending[i]))] = (i, None)
+                    pending[i] = None
+                else:
+                    i, j = queue.popleft()
+                    running[executor.submit(func, *groups[i][j])] = (i, j)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, j = running.pop(future)
+                if j is None:
+                    results[i] = future.result()
+                    continue
+                pending[i][j] = future.result()
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    ready.append(i)
+    return results
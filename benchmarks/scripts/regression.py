@@ -0,0 +1,311 @@
+"""
+Performance regression checker. It compares an experiment of the results
+store (see results_db.py) against the baseline experiment of its kind, and
+writes a machine-readable pass/fail report. The checks are, for every
+(program, dataset) of the baseline:
+    - performance experiments: the execution times of the repeated runs.
+      A pair regresses if the Mann-Whitney U test (see compare.py) rejects
+      equal distributions at ALPHA, the candidate is slower, and the
+      bootstrap confidence interval of the slowdown of the mean is above
+      MAX_SLOWDOWN,
+    - timing experiments: the distributions of the lags and the reaction
+      execution times, from the sketches of their groups merged per program.
+      A pair regresses if the two-sample Kolmogorov-Smirnov test on the
+      sketch histograms rejects equal distributions at ALPHA, and the mean
+      or the p99 increased by more than MAX_SKETCH_INCREASE, and by more
+      than MIN_SKETCH_INCREASE_NS of the metric.
+A pair that is missing from the candidate also fails the check.
+
+Usage:
+    python regression.py performance --set-baseline <experiment>
+    python regression.py performance <experiment> [--baseline <experiment>] [-o report.json]
+The exit code is 1 if a regression is found, so the checker can gate CI.
+"""
+
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import compare
+import results_db
+import sketches
+
+################## CONFIGS ##################
+
+# Significance level of the tests.
+ALPHA = 0.01
+
+# Tolerated slowdown of the mean execution time of performance runs.
+MAX_SLOWDOWN = 0.05
+
+# Tolerated relative increase of the mean and p99 of the timing metrics, and
+# the smallest absolute increase (in nsec) that counts as a regression, so
+# that sub-microsecond changes of tiny values are not reported.
+MAX_SKETCH_INCREASE = 0.10
+MIN_SKETCH_INCREASE_NS = {"lag": 10000, "execution_time": 1000}
+
+# Whether a (program, dataset) of the baseline that is missing from the
+# candidate fails the check.
+FAIL_ON_MISSING = True
+
+BOOTSTRAP_RESAMPLES = 10000
+
+#############################################
+
+REGRESSION_REPORT = "regression.json"
+
+
+def thresholds():
+    return {
+        "alpha": ALPHA,
+        "max_slowdown": MAX_SLOWDOWN,
+        "max_sketch_increase": MAX_SKETCH_INCREASE,
+        "min_sketch_increase_ns": MIN_SKETCH_INCREASE_NS,
+        "fail_on_missing": FAIL_ON_MISSING,
+    }
+
+
+def relative_change(baseline, candidate):
+    if baseline == 0:
+        return math.inf if candidate > baseline else 0.0
+    return (candidate - baseline) / abs(baseline)
+
+
+def check_execution_times(baseline, candidate, rng):
+    """
+    Compare the execution times of the runs of a (program, dataset). Return
+    the entry of the report, without the program and dataset.
+    """
+    if len(baseline) < 2 or len(candidate) < 2:
+        return {"status": "skipped", "reason": "fewer than two runs"}
+    _, p_value, delta = compare.mann_whitney_u(baseline, candidate)
+    speedup = compare.bootstrap_speedups(
+        compare.resample_statistics(baseline, BOOTSTRAP_RESAMPLES, rng),
+        compare.resample_statistics(candidate, BOOTSTRAP_RESAMPLES, rng),
+    )["mean"]
+    # The slowdown of the candidate is the inverse of its speedup.
+    change = 1 / speedup["speedup"] - 1
+    low, high = 1 / speedup["high"] - 1, 1 / speedup["low"] - 1
+    status = "pass"
+    if p_value < ALPHA:
+        if delta < 0 and low > MAX_SLOWDOWN:
+            status = "regression"
+        elif delta > 0 and high < -MAX_SLOWDOWN:
+            status = "improvement"
+    return {
+        "status": status,
+        "baseline": {"runs": len(baseline), "mean": float(np.mean(baseline))},
+        "candidate": {"runs": len(candidate), "mean": float(np.mean(candidate))},
+        "change": change,
+        "ci": [low, high],
+        "p_value": p_value,
+        "delta": delta,
+    }
+
+
+def ks_test(a, b):
+    """
+    Return the two-sample Kolmogorov-Smirnov distance of two sketches, from
+    their histograms, and its asymptotic p-value (Stephens, 1970).
+    """
+    keys = np.union1d(a["keys"], b["keys"])
+    cdfs = []
+    for sketch in [a, b]:
+        counts = np.zeros(len(keys))
+        counts[np.searchsorted(keys, sketch["keys"])] = sketch["counts"]
+        cdfs.append(np.cumsum(counts) / sketch["count"])
+    distance = float(np.max(np.abs(cdfs[0] - cdfs[1])))
+    n = a["count"] * b["count"] / (a["count"] + b["count"])
+    lam = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * distance
+    if lam < 1e-3:
+        return distance, 1.0
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam) for k in range(1, 101))
+    return distance, min(max(p_value, 0.0), 1.0)
+
+
+def check_sketches(metric, baseline, candidate):
+    """
+    Compare the sketches of a timing metric of a (program, dataset), merged
+    over all groups. Return the entry of the report.
+    """
+    merged = []
+    for group_sketches in [baseline, candidate]:
+        sketch = sketches.new_sketch()
+        for group_sketch in group_sketches.values():
+            sketch = sketches.merge_sketches(sketch, group_sketch)
+        merged.append(sketch)
+    if merged[0]["count"] == 0 or merged[1]["count"] == 0:
+        return {"status": "skipped", "reason": "no samples"}
+    stats = [sketches.sketch_statistics(sketch, quantiles=(0.99,)) for sketch in merged]
+    distance, p_value = ks_test(*merged)
+    changes = {name: relative_change(stats[0][name], stats[1][name]) for name in ["mean", "p99"]}
+    regressed = [
+        name for name in ["mean", "p99"]
+        if changes[name] > MAX_SKETCH_INCREASE and stats[1][name] - stats[0][name] > MIN_SKETCH_INCREASE_NS[metric]
+    ]
+    improved = [
+        name for name in ["mean", "p99"]
+        if changes[name] < -MAX_SKETCH_INCREASE and stats[0][name] - stats[1][name] > MIN_SKETCH_INCREASE_NS[metric]
+    ]
+    status = "pass"
+    if p_value < ALPHA:
+        if len(regressed) > 0:
+            status = "regression"
+        elif len(improved) > 0:
+            status = "improvement"
+    return {
+        "status": status,
+        "baseline": {key: stats[0][key] for key in ["count", "mean", "p99", "max"]},
+        "candidate": {key: stats[1][key] for key in ["count", "mean", "p99", "max"]},
+        "change": changes,
+        "regressed": regressed,
+        "ks_distance": distance,
+        "p_value": p_value,
+    }
+
+
+def check_pairs(check, baseline, candidate):
+    # Run the check on every (program, dataset) of the baseline
+    # ({dataset: {program: data}}).
+    entries = []
+    for dataset, programs in baseline.items():
+        for program, data in programs.items():
+            entry = {"check": check, "program": program, "dataset": dataset}
+            if program not in candidate.get(dataset, {}):
+                entry["status"] = "missing"
+            else:
+                entry.update(check_pair(check, data, candidate[dataset][program]))
+            entries.append(entry)
+    return entries
+
+
+def check_pair(check, baseline, candidate):
+    # The bootstrap of every pair starts from the same seed, so the report
+    # does not depend on the other pairs.
+    if check == "execution_time":
+        return check_execution_times(baseline, candidate, np.random.default_rng(compare.DEFAULT_SEED))
+    return check_sketches(check.split(":")[1], baseline, candidate)
+
+
+def check_regressions(conn, kind, candidate, baseline=None):
+    """
+    Compare the candidate experiment against the baseline experiment (the
+    designated baseline of the kind if None). Return the report.
+    """
+    baseline = results_db.get_baseline(conn, kind) if baseline is None else baseline
+    if baseline is None:
+        raise Exception(f"No baseline is designated for the {kind} experiments.")
+    for name in [baseline, candidate]:
+        if not results_db.has_experiment(conn, kind, name):
+            raise Exception(f"The {kind} experiment {name} is not in the results store.")
+
+    if kind == "performance":
+        times = [
+            {dataset: {program: entry["data"] for program, entry in programs.items()} for dataset, programs in results_db.load_performance_times(conn, name).items()}
+            for name in [baseline, candidate]
+        ]
+        entries = check_pairs("execution_time", *times)
+    else:
+        entries = []
+        for metric in MIN_SKETCH_INCREASE_NS:
+            group_sketches = [results_db.load_group_sketches(conn, name, metric) for name in [baseline, candidate]]
+            entries += check_pairs(f"timing:{metric}", *group_sketches)
+
+    failures = ["regression"] + (["missing"] if FAIL_ON_MISSING else [])
+    regressions = [entry for entry in entries if entry["status"] in failures]
+    return {
+        "kind": kind,
+        "baseline": baseline,
+        "candidate": candidate,
+        "lfc_commits": {
+            name: dict(zip(["commit", "dirty"], results_db.lfc_commit_of(conn, kind, name))) for name in [baseline, candidate]
+        },
+        "thresholds": thresholds(),
+        "passed": len(regressions) == 0,
+        "regressions": regressions,
+        "results": entries,
+    }
+
+
+def save_report(path, report):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=4)
+
+
+def print_report(report):
+    print(f"Regression check of {report['candidate']} against {report['baseline']}: {'PASSED' if report['passed'] else 'FAILED'}.")
+    for entry in report["regressions"]:
+        if entry["status"] == "missing":
+            print(f"    {entry['program']} ({entry['dataset']}, {entry['check']}): missing.")
+        elif entry["check"] == "execution_time":
+            print(f"    {entry['program']} ({entry['dataset']}): {entry['change']:+.1%} mean execution time, CI [{entry['ci'][0]:+.1%}, {entry['ci'][1]:+.1%}], p = {entry['p_value']:.2g}.")
+        else:
+            changes = ", ".join(f"{entry['change'][name]:+.1%} {name}" for name in entry["regressed"])
+            print(f"    {entry['program']} ({entry['dataset']}, {entry['check']}): {changes}, p = {entry['p_value']:.2g}.")
+
+
+def check_experiment(db_path, kind, name, expr_run_dir):
+    """
+    Check a post processed experiment against the designated baseline of its
+    kind, if any, and save the report in the experiment directory. Return
+    the report, or None if there is no baseline to check against.
+    """
+    conn = results_db.connect(db_path)
+    try:
+        baseline = results_db.get_baseline(conn, kind)
+        if baseline is None or baseline == name:
+            return None
+        report = check_regressions(conn, kind, name, baseline)
+    finally:
+        conn.close()
+    save_report(Path(expr_run_dir) / REGRESSION_REPORT, report)
+    print_report(report)
+    return report
+
+
+parser = argparse.ArgumentParser(description="Check an experiment of the results store for performance regressions.")
+parser.add_argument("kind", choices=["performance", "timing"], help="The kind of the experiments.")
+parser.add_argument("candidate", nargs="?", help="The name of the experiment directory to check.")
+parser.add_argument("-b", "--baseline", type=str, help="The experiment to check against. Default: the designated baseline.")
+parser.add_argument("--set-baseline", type=str, help="Designate an experiment as the baseline of the kind, and exit.")
+parser.add_argument(
+    "--db",
+    type=str,
+    default=str(Path(__file__).resolve().parent.parent / "experiment-data" / results_db.RESULTS_DB),
+    help="The results store. Default: experiment-data/results.db.",
+)
+parser.add_argument("-o", "--output", type=str, help=f"Where to write the report. Default: {REGRESSION_REPORT} in the current directory.")
+parser.add_argument("--alpha", type=float, default=ALPHA, help="The significance level of the tests.")
+parser.add_argument("--max-slowdown", type=float, default=MAX_SLOWDOWN, help="The tolerated slowdown of the mean execution time, e.g., 0.05 for 5%%.")
+parser.add_argument("--max-increase", type=float, default=MAX_SKETCH_INCREASE, help="The tolerated increase of the mean and p99 of the lags and reaction execution times.")
+
+
+def main(args=None):
+    global ALPHA, MAX_SLOWDOWN, MAX_SKETCH_INCREASE
+    args = parser.parse_args(args)
+    ALPHA, MAX_SLOWDOWN, MAX_SKETCH_INCREASE = args.alpha, args.max_slowdown, args.max_increase
+
+    conn = results_db.connect(args.db)
+    try:
+        if args.set_baseline is not None:
+            if not results_db.has_experiment(conn, args.kind, args.set_baseline):
+                parser.error(f"The {args.kind} experiment {args.set_baseline} is not in {args.db}.")
+            results_db.set_baseline(conn, args.kind, args.set_baseline)
+            print(f"{args.set_baseline} is the baseline of the {args.kind} experiments.")
+            return 0
+        if args.candidate is None:
+            parser.error("the candidate experiment is required.")
+        report = check_regressions(conn, args.kind, args.candidate, args.baseline)
+    finally:
+        conn.close()
+    save_report(args.output or REGRESSION_REPORT, report)
+    print_report(report)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
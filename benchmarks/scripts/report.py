@@ -0,0 +1,166 @@
+"""
+Incremental reporting for the experiment scripts. The statistics and the
+plots of every program are recorded in a manifest (report.json in the
+experiment directory) with a fingerprint of their inputs:
+    - the content of the data files (traces or logs) they are computed from,
+    - the code of the scripts that compute them,
+    - the configs that change their output.
+When the experiment directory is post processed again, e.g., after adding one
+benchmark or re-running one scheduler, only the entries whose fingerprint
+changed (or whose output files are missing) are recomputed. The LaTeX table
+is then reassembled from the recorded rows.
+
+The manifest also remembers the size, modification time, and hash of every
+data file, so unchanged files are not hashed again.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+REPORT_MANIFEST = "report.json"
+
+# Version of the manifest layout. Bump it to invalidate existing manifests.
+REPORT_VERSION = 1
+
+
+def load_manifest(path):
+    # Return an empty manifest if there is none or if it has another version.
+    try:
+        with open(path, "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or manifest.get("version") != REPORT_VERSION:
+        manifest = {"version": REPORT_VERSION, "files": {}, "entries": {}}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    # Write the manifest atomically, so an interrupted run does not leave a
+    # truncated manifest behind.
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, "w") as file:
+        json.dump(manifest, file, indent=4, default=to_builtin)
+    os.replace(tmp, path)
+
+
+def to_builtin(value):
+    # Convert NumPy scalars and arrays for json.dump().
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(manifest, path):
+    """
+    Return the SHA-256 of the file, or None if it does not exist. The hash is
+    reused from the manifest while the size and modification time of the
+    file do not change.
+    """
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    known = manifest["files"].get(str(path))
+    if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["sha256"]
+    sha256 = hash_file(path)
+    manifest["files"][str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+    return sha256
+
+
+def code_fingerprint(*paths):
+    # The hash of the given source files, e.g., the __file__ of the modules
+    # that compute an entry.
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(hash_file(path).encode())
+    return h.hexdigest()
+
+
+def fingerprint(*parts):
+    # Combine JSON-serializable parts (hashes, configs, ...) into one hash.
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=to_builtin).encode()).hexdigest()
+
+
+def lookup(manifest, key, fingerprint, base_dir="."):
+    """
+    Return the recorded result of the entry, or None if the entry is missing,
+    was recorded from other inputs, or if one of its output files (relative
+    to base_dir) is missing.
+    """
+    entry = manifest["entries"].get(key)
+    if entry is None or entry["fingerprint"] != fingerprint:
+        return None
+    if any(not (Path(base_dir) / output).is_file() for output in entry["outputs"]):
+        return None
+    return entry["result"]
+
+
+def record(manifest, key, fingerprint, result, outputs=()):
+    manifest["entries"][key] = {"fingerprint": fingerprint, "result": result, "outputs": sorted(outputs)}
+
+
+def format_stat(stats, program, name):
+    # .3g = 3 significant digits, in microseconds.
+    if program not in stats:
+        return "-"
+    return format(stats[program][name] / 1000, '.3g')
+
+
+def generate_latex_table(program_names, program_stats, file_path, caption, references=None, columns=None):
+    """
+    Generate the LaTeX table of the average, maximum, and standard deviation
+    of every program for the DY, LB, and EGS datasets of program_stats. If
+    references is given, the programs are cited. columns optionally appends
+    columns to the table, as a list of (header, {program: cell}), e.g., the
+    speedups of compare.py.
+    """
+    columns = [] if columns is None else columns
+    extra_spec = "c" * len(columns)
+    extra_top = " &" * len(columns)
+    extra_headers = "".join(f" & {header}" for header, _ in columns)
+    code = f"% Generated table at {file_path}\n"
+    code += r"""
+    \begin{table*}[ht]
+        \centering
+        \begin{tabular}{lcccccccccc""" + extra_spec + r"""}
+        \toprule 
+        & & \multicolumn{3}{c}{Average (us)} & \multicolumn{3}{c}{Maximum (us)} &
+        \multicolumn{3}{c}{Standard Deviation (us)}""" + extra_top + r""" \\ 
+        \cmidrule(lr){3-5} \cmidrule(lr){6-8} \cmidrule(lr){9-11}
+        Program & LoC (\lf) & DY & LB & EG & DY & LB & EG & DY & LB & EG""" + extra_headers + r""" \\ 
+        \midrule 
+    """
+    for program in program_names:
+        cells = [format_stat(program_stats[dataset], program, name) for name in ['mean', 'max', 'std'] for dataset in ['DY', 'LB', 'EGS']]
+        cells += [cells_of_column.get(program, "-") for _, cells_of_column in columns]
+        code += f"\n\\texttt{{{program}}}"
+        if references is not None and references[program] is not None:
+            code += f"~\\cite{{{references[program]}}}"
+        code += f"  & {program_stats['LOC'][program]}  & " + " & ".join(cells) + " \\\\"
+    code += r"""
+        \bottomrule
+        \end{tabular} 
+        \caption{""" + caption + r"""} 
+        \label{tab:accuracy_results}
+    \end{table*}
+    """
+
+    with open(file_path, 'w') as file:
+        file.write(code)
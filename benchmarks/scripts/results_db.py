@@ -0,0 +1,344 @@
+"""
+SQLite store of the results of all the experiment runs (results.db in the
+experiment-data directory), so that programs and schedulers can be compared
+across dates, boards, and lfc versions without parsing the experiment
+directories again. The tables are:
+    - experiments: one row per experiment directory ("performance" or
+      "timing"), with its metadata: platform, dash mode, lfc version, the
+      commit of the lingua-franca submodule (and whether it had uncommitted
+      changes), start time, and the configs of the run (see
+      save_metadata()),
+    - runs: one row per (experiment, program, dataset), with the scheduler,
+      the mapper, the lfc flags, and the environment of the runs,
+    - timings: the execution time of every repetition of a performance run,
+    - group_stats: the statistics of a timing metric ("lag",
+      "time_difference", or "execution_time") for every (Reactor,
+      Destination) group of a timing run, with its sketch (see sketches.py),
+      so that the statistics of several groups can be merged exactly,
+    - baselines: the experiment of every kind that new experiments are
+      checked against (see regression.py).
+The runs are indexed by program and scheduler, and the experiments by start
+time and lfc commit, for "program x scheduler over time" queries (see
+program_history()).
+
+Ingesting an experiment again replaces its rows, so the store can be
+refreshed every time an experiment directory is post processed.
+"""
+
+import json
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import sketches
+
+RESULTS_DB = "results.db"
+
+# Metadata of the runs of an experiment directory, written when the
+# experiment is run.
+EXPERIMENT_METADATA = "metadata.json"
+
+# Version of the schema. Bump it when the tables change.
+SCHEMA_VERSION = 2
+
+# Statements that upgrade a store from the version before, by version.
+MIGRATIONS = {
+    2: [
+        "ALTER TABLE experiments ADD COLUMN lfc_commit TEXT",
+        "ALTER TABLE experiments ADD COLUMN lfc_dirty INTEGER",
+    ],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    started TEXT,
+    platform TEXT,
+    dash_mode INTEGER,
+    lfc_version TEXT,
+    lfc_commit TEXT,
+    lfc_dirty INTEGER,
+    metadata TEXT,
+    UNIQUE (kind, name)
+);
+CREATE INDEX IF NOT EXISTS experiments_started ON experiments (kind, started);
+CREATE INDEX IF NOT EXISTS experiments_lfc_commit ON experiments (kind, lfc_commit);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id) ON DELETE CASCADE,
+    program TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    scheduler TEXT,
+    mapper TEXT,
+    flags TEXT,
+    environment TEXT,
+    UNIQUE (experiment_id, program, dataset)
+);
+CREATE INDEX IF NOT EXISTS runs_program_dataset ON runs (program, dataset, experiment_id);
+CREATE INDEX IF NOT EXISTS runs_program_scheduler ON runs (program, scheduler, mapper);
+
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    repeat INTEGER NOT NULL,
+    elapsed_ns INTEGER NOT NULL,
+    PRIMARY KEY (run_id, repeat)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS group_stats (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    group_name TEXT NOT NULL,
+    count INTEGER,
+    mean REAL,
+    std REAL,
+    min REAL,
+    max REAL,
+    p50 REAL,
+    p99 REAL,
+    p999 REAL,
+    sketch TEXT,
+    PRIMARY KEY (run_id, metric, group_name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS baselines (
+    kind TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+"""
+
+# The scheduler and the mapper of every dataset, when the experiment has no
+# metadata.
+DATASET_SCHEDULERS = {
+    "DY": ("NP", None),
+    "LB": ("STATIC", "LB"),
+    "EGS": ("STATIC", "EGS"),
+}
+
+
+def connect(path):
+    # Open the store, and create or upgrade its tables if needed.
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        conn.close()
+        raise Exception(f"{path} has schema version {version}, expected {SCHEMA_VERSION}.")
+    if version > 0:
+        with conn:
+            for upgrade in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in MIGRATIONS[upgrade]:
+                    conn.execute(statement)
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def save_metadata(expr_run_dir, metadata):
+    with open(Path(expr_run_dir) / EXPERIMENT_METADATA, "w") as file:
+        json.dump(metadata, file, indent=4)
+
+
+def load_metadata(expr_run_dir):
+    """
+    Return the metadata saved in the experiment directory. For older
+    directories without metadata, only the start time is known, from the
+    name of the directory.
+    """
+    path = Path(expr_run_dir) / EXPERIMENT_METADATA
+    if path.is_file():
+        with open(path, "r") as file:
+            return json.load(file)
+    match = re.match(r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}", Path(expr_run_dir).name)
+    started = datetime.strptime(match.group(0), "%Y-%m-%d_%H-%M-%S").isoformat() if match else None
+    return {"started": started}
+
+
+def lfc_flags(arg_list):
+    # The lfc flags of a list of run_benchmark.py arguments.
+    return [arg[len("-f="):] for arg in arg_list if arg.startswith("-f=")]
+
+
+def scheduler_of_flags(flags, dataset):
+    # The scheduler and the mapper given to lfc, e.g., ("STATIC", "LB").
+    scheduler, mapper = DATASET_SCHEDULERS.get(dataset, (None, None))
+    for flag in flags or []:
+        if flag.startswith("--scheduler="):
+            scheduler = flag.split("=", 1)[1]
+        elif flag.startswith("--mapper="):
+            mapper = flag.split("=", 1)[1]
+    return scheduler, mapper
+
+
+def ingest_experiment(conn, kind, name, metadata):
+    """
+    Insert the experiment, or replace the rows of an experiment ingested
+    before. Return its id.
+    """
+    conn.execute("DELETE FROM experiments WHERE kind = ? AND name = ?", (kind, name))
+    cursor = conn.execute(
+        "INSERT INTO experiments (kind, name, started, platform, dash_mode, lfc_version, lfc_commit, lfc_dirty, metadata) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            kind,
+            name,
+            metadata.get("started"),
+            metadata.get("platform"),
+            metadata.get("dash_mode"),
+            metadata.get("lfc_version"),
+            metadata.get("lfc_commit"),
+            metadata.get("lfc_dirty"),
+            json.dumps(metadata),
+        ),
+    )
+    return cursor.lastrowid
+
+
+def ingest_run(conn, experiment_id, program, dataset, metadata, environment=None):
+    flags = metadata.get("flags", {}).get(dataset)
+    scheduler, mapper = scheduler_of_flags(flags, dataset)
+    cursor = conn.execute(
+        "INSERT INTO runs (experiment_id, program, dataset, scheduler, mapper, flags, environment) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            experiment_id,
+            program,
+            dataset,
+            scheduler,
+            mapper,
+            None if flags is None else json.dumps(flags),
+            None if environment is None else json.dumps(environment),
+        ),
+    )
+    return cursor.lastrowid
+
+
+def ingest_performance(conn, name, metadata, program_stats, datasets=("DY", "LB", "EGS")):
+    """
+    Store a performance experiment, with the execution time of every
+    repetition of every (program, dataset) of program_stats (see
+    experiment_performance.py).
+    """
+    with conn:
+        experiment_id = ingest_experiment(conn, "performance", name, metadata)
+        for dataset in datasets:
+            for program, stats in program_stats[dataset].items():
+                run_id = ingest_run(conn, experiment_id, program, dataset, metadata, stats.get("environment"))
+                conn.executemany(
+                    "INSERT INTO timings (run_id, repeat, elapsed_ns) VALUES (?, ?, ?)",
+                    [(run_id, repeat, int(time)) for repeat, time in enumerate(stats["data"])],
+                )
+
+
+def ingest_timing(conn, name, metadata, program_sketches):
+    """
+    Store a timing experiment, with the statistics and the sketch of every
+    metric and group of program_sketches ({program: {dataset: {metric:
+    {group: sketch}}}}, as saved by experiment_timing.py).
+    """
+    with conn:
+        experiment_id = ingest_experiment(conn, "timing", name, metadata)
+        for program, dataset_sketches in program_sketches.items():
+            for dataset, metric_sketches in dataset_sketches.items():
+                run_id = ingest_run(conn, experiment_id, program, dataset, metadata)
+                rows = []
+                for metric, group_sketches in metric_sketches.items():
+                    for group, sketch in group_sketches.items():
+                        stats = sketches.sketch_statistics(sketch)
+                        rows.append((
+                            run_id, metric, group, stats["count"], stats["mean"], stats["std"], stats["min"], stats["max"],
+                            stats["p50"], stats["p99"], stats["p99.9"], json.dumps(sketches.to_json(sketch)),
+                        ))
+                conn.executemany(
+                    "INSERT INTO group_stats (run_id, metric, group_name, count, mean, std, min, max, p50, p99, p999, sketch) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+
+def load_performance_times(conn, name):
+    """
+    Return the execution times of the runs of a performance experiment, as
+    {dataset: {program: {"data": [...], "environment": ...}}}.
+    """
+    result = {}
+    rows = conn.execute(
+        "SELECT runs.id, runs.dataset, runs.program, runs.environment FROM runs "
+        "JOIN experiments ON experiments.id = runs.experiment_id "
+        "WHERE experiments.kind = 'performance' AND experiments.name = ? ORDER BY runs.id",
+        (name,),
+    ).fetchall()
+    for run_id, dataset, program, environment in rows:
+        times = [time for (time,) in conn.execute("SELECT elapsed_ns FROM timings WHERE run_id = ? ORDER BY repeat", (run_id,))]
+        entry = {"data": times}
+        if environment is not None:
+            entry["environment"] = json.loads(environment)
+        result.setdefault(dataset, {})[program] = entry
+    return result
+
+
+def load_group_sketches(conn, name, metric="lag"):
+    """
+    Return the sketches of a metric of the runs of a timing experiment, as
+    {dataset: {program: {group: sketch}}}.
+    """
+    result = {}
+    rows = conn.execute(
+        "SELECT runs.dataset, runs.program, group_stats.group_name, group_stats.sketch FROM group_stats "
+        "JOIN runs ON runs.id = group_stats.run_id "
+        "JOIN experiments ON experiments.id = runs.experiment_id "
+        "WHERE experiments.kind = 'timing' AND experiments.name = ? AND group_stats.metric = ? "
+        "ORDER BY runs.id, group_stats.group_name",
+        (name, metric),
+    )
+    for dataset, program, group, sketch in rows:
+        result.setdefault(dataset, {}).setdefault(program, {})[group] = sketches.from_json(json.loads(sketch))
+    return result
+
+
+def program_history(conn, program, dataset=None):
+    """
+    Return the performance of a program over all the experiments, oldest
+    first, as rows of (started, experiment, platform, lfc version, lfc
+    commit, lfc dirty, dataset, scheduler, mapper, runs, mean, min, max) in
+    nanoseconds.
+    """
+    query = (
+        "SELECT experiments.started, experiments.name, experiments.platform, experiments.lfc_version, "
+        "experiments.lfc_commit, experiments.lfc_dirty, "
+        "runs.dataset, runs.scheduler, runs.mapper, COUNT(*), AVG(timings.elapsed_ns), MIN(timings.elapsed_ns), MAX(timings.elapsed_ns) "
+        "FROM runs JOIN experiments ON experiments.id = runs.experiment_id "
+        "JOIN timings ON timings.run_id = runs.id "
+        "WHERE experiments.kind = 'performance' AND runs.program = ?"
+    )
+    parameters = [program]
+    if dataset is not None:
+        query += " AND runs.dataset = ?"
+        parameters.append(dataset)
+    query += " GROUP BY runs.id ORDER BY experiments.started, runs.dataset"
+    return conn.execute(query, parameters).fetchall()
+
+
+def set_baseline(conn, kind, name):
+    # Designate the experiment as the baseline of its kind.
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO baselines (kind, name) VALUES (?, ?)", (kind, name))
+
+
+def get_baseline(conn, kind):
+    # Return the name of the baseline experiment of the kind, or None.
+    row = conn.execute("SELECT name FROM baselines WHERE kind = ?", (kind,)).fetchone()
+    return None if row is None else row[0]
+
+
+def lfc_commit_of(conn, kind, name):
+    # Return the lfc commit of the experiment and whether it was dirty.
+    row = conn.execute("SELECT lfc_commit, lfc_dirty FROM experiments WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+    return (None, None) if row is None else (row[0], None if row[1] is None else bool(row[1]))
+
+
+def has_experiment(conn, kind, name):
+    return conn.execute("SELECT 1 FROM experiments WHERE kind = ? AND name = ?", (kind, name)).fetchone() is not None
@@ -42,7 +42,8 @@ Procedure description:
 6. Process the tracing data
 
 Dependencies:
-- sshpass (for allowing passing in password on the commandline)
+- paramiko (all commands and file transfers go over a single ssh connection)
+  The password is passed in on the commandline.
   Only use this script for non-safety-critical boards. This is NOT secure!
 """
 
@@ -54,9 +55,24 @@ import sys
 import csv
 import subprocess
 import os
+import fnmatch
+import posixpath
+import shlex
+import stat
+from time import perf_counter
+import hashlib
+import json
+import re
+import math
+import statistics
+import shutil
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+import report
+
 # Define the arguments to pass in the command line
 # The values default to
 parser = argparse.ArgumentParser(description="Set of the lft trace files to render.")
@@ -119,16 +135,112 @@ parser.add_argument(
     "--repeat", type=int, default=0, help="The number of times the LF program should repeat (for performance benchmarking)"
 )
 parser.add_argument(
-    "-nl", "--no-lfc", action="store_true", help="Skip re-compiling the LF code if src-gen already exists."
+    "--target-ci",
+    type=float,
+    help="Repeat adaptively: after the first --repeat runs, run the LF program in batches of --batch-size until the half-width of the confidence interval of its mean execution time, relative to the mean, is at most this value (e.g., 0.01 for 1%%), or until --max-runs runs.",
+)
+parser.add_argument(
+    "--max-runs", type=int, default=100, help="The maximum number of runs of a program with --target-ci."
+)
+parser.add_argument(
+    "--batch-size", type=int, default=5, help="The number of runs between two checks of the confidence interval with --target-ci."
+)
+parser.add_argument(
+    "--confidence", type=float, default=0.95, help="The confidence level of the interval checked with --target-ci."
+)
+parser.add_argument(
+    "--pin-cpus",
+    type=str,
+    help="Pin the LF program and all its worker threads to a list of CPUs of the remote, e.g., 1-3 (taskset syntax).",
+)
+parser.add_argument(
+    "--rt-priority",
+    type=int,
+    help="Run the LF program with the SCHED_FIFO policy and this real-time priority (1-99) on the remote. Requires sudo.",
+)
+parser.add_argument(
+    "--governor",
+    type=str,
+    help="Lock the cpufreq governor of the remote during the runs, e.g., performance. Requires sudo.",
+)
+parser.add_argument(
+    "--irq-cpus",
+    type=str,
+    help="Move the IRQs of the remote to a list of CPUs during the runs, e.g., 0, away from --pin-cpus. irqbalance is stopped meanwhile. Requires sudo.",
+)
+parser.add_argument(
+    "-nl", "--no-lfc", action="store_true", help="Skip re-compiling the LF code if src-gen already exists. This bypasses the build cache."
+)
+parser.add_argument(
+    "-cc", "--clear-cache", action="store_true", help="Clear the host and remote build caches before running, forcing a full rebuild."
 )
 parser.add_argument(
-    "-ns", "--no-scp", action="store_true", help="Skip secure copying the LF code if src-gen is already copied."
+    "-ns", "--no-scp", action="store_true", help="Skip secure copying the LF code if src-gen is already copied (with --no-lfc). With the build cache, the code is only copied on a remote cache miss, whether or not this flag is set."
 )
 parser.add_argument(
     "-nc", "--no-cmake", action="store_true", help="Skip compiling cmake projects if src-gen is already compiled."
 )
+parser.add_argument(
+    "-lj",
+    "--lfc-jobs",
+    type=int,
+    default=4,
+    help="The maximum number of lfc processes running at once when files cannot be compiled in a single batch.",
+)
 parser.add_argument("-nr", "--no-run", action="store_true", help="Skip running the compiled programs.")
-parser.add_argument("-np", "--no-parse", action="store_true", help="Skip conversion of traces to csv")
+parser.add_argument(
+    "-np",
+    "--no-parse",
+    action="store_true",
+    help="Skip conversion of traces to csv on the remote. Only the .lft files are copied back, to be decoded on the host by trace_loader.py.",
+)
+parser.add_argument(
+    "-nsr",
+    "--no-shared-runtime",
+    action="store_true",
+    help="Compile the reactor-c runtime for every program instead of linking a runtime library shared by programs with the same runtime configuration.",
+)
+parser.add_argument(
+    "-xc",
+    "--cross-compile",
+    action="store_true",
+    help="Compile the programs on the host and only copy the executables to the remote, instead of running cmake on the remote.",
+)
+parser.add_argument(
+    "--toolchain-file",
+    type=str,
+    help="The cmake toolchain file used with --cross-compile. If not specified, the native host compiler is used.",
+)
+parser.add_argument("--sysroot", type=str, help="The sysroot of the remote used with --cross-compile.")
+parser.add_argument(
+    "-bj",
+    "--build-jobs",
+    type=int,
+    default=os.cpu_count(),
+    help="The maximum number of programs compiled at once on the host with --cross-compile.",
+)
+# Build cache locations. A program is stored under a key computed from its
+# source, its imports, the lfc flags, and the lfc version, so unchanged programs
+# skip code generation, copying, and compilation.
+HOST_CACHE_DIRNAME = "lfc-cache"
+REMOTE_CACHE = "~/benchmarks-cache"
+CACHE_COMPLETE_STAMP = ".lfc-cache-complete"
+
+# Shared runtime locations. The reactor-c runtime is compiled once per runtime
+# configuration (e.g., scheduler, tracing, and number of workers) and linked
+# into every program with the same configuration.
+REMOTE_RUNTIME_CACHE = "~/benchmarks-runtime"
+RUNTIME_TARGET = "reactor-c"
+# Directories of the generated code that belong to the runtime.
+RUNTIME_DIRS = ["core", "lib", "include/core", "include/api", "low_level_platform", "platform", "logging", "trace", "tag", "version"]
+
+# Files of the remote holding the settings of the low-noise run mode.
+CPUFREQ_GOVERNORS = "/sys/devices/system/cpu/cpufreq/policy*/scaling_governor"
+IRQ_AFFINITIES = "/proc/irq/*/smp_affinity_list"
+
+# The line printed by an LF program at shutdown with its execution time.
+ELAPSED_TIME_PATTERN = r"---- Elapsed physical time \(in nsec\): ([\d,]+)"
+
 # Creat the SSh client
 client = paramiko.SSHClient()
 # Veryfing host keys
@@ -136,6 +248,8 @@ client.load_system_host_keys()
 # OR: Since this is meant to run on a private local network, we can avoid verifying
 # host key, using AutoAddPolicy
 client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+# The SFTP channel used for all file transfers over the client's connection.
+sftp = None
 
 
 ####################################################
@@ -144,32 +258,119 @@ client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
 
 def host_close_connection_to_remote():
-    # Close the client itself
+    # Close the SFTP channel, if any, and the client itself
+    global sftp
+    if sftp is not None:
+        sftp.close()
+        sftp = None
     client.close()
 
 
-def host_compile_lf_file(args, filename):
+def host_compile_lf_file(args, filename, output_path=None):
+    result = host_compile_lf_files(args, [filename], output_path)
+    host_print_result(result)
+    return result
+
+
+def host_compile_lf_files(args, filenames, output_path=None):
+    """
+    Invoke lfc once for all the files, so that the JVM startup and the Xtext
+    initialization are only paid once.
+    """
     # cmd = ["lfc-dev", "-n", f"{args.flags}", f"{filename}"]
     cmd = ["lfc-dev", "-n"]
     if not args.no_tracing:
         cmd.append("--tracing")
-    cmd += args.flag + [filename]
+    # Generate into <output_path>/src-gen instead of the default src-gen
+    # next to the src directory. Used by the board pool to keep the code
+    # generated for different scheduler configs apart.
+    if output_path is not None:
+        cmd += ["-o", str(output_path)]
+    cmd += (args.flag or []) + [str(filename) for filename in filenames]
     print("Executing local command: " + " ".join(cmd))
-    result = host_execute_cmd(cmd)
-    print("Exit code:", result.returncode)
-    print("Output:", result.stdout)
-    print("Error:", result.stderr)
+    return host_execute_cmd(cmd)
 
 
-def host_compile_lf_files_in_dir(args, dir, selected, excluded):
-    # Enumerate over files in the directory
-    for filename in os.listdir(dir):
-        if filename.endswith(".lf"):
-            if filename not in excluded:
-                if selected is None or filename in selected:
-                    file_path = os.path.join(dir, filename)
-                    print(file_path)
-                    host_compile_lf_file(args, file_path)
+def host_compile_lf_files_in_dir(args, dir, selected, excluded, output_path=None):
+    """
+    Compile the selected LF files in a single batched lfc invocation. If the
+    batch fails, the files are recompiled one by one in a bounded pool of lfc
+    processes, so that the failing files are reported individually.
+    Return a dictionary mapping each file to its lfc result.
+    """
+    file_paths = [os.path.join(dir, filename) for filename in host_list_lf_files_in_dir(dir, selected, excluded)]
+    if len(file_paths) == 0:
+        return {}
+
+    results = {}
+    if len(file_paths) > 1:
+        batch_result = host_compile_lf_files(args, file_paths, output_path)
+        if batch_result.returncode == 0:
+            # The whole batch succeeded, so every file shares the same result.
+            host_print_result(batch_result)
+            results = {file_path: batch_result for file_path in file_paths}
+        else:
+            print("Batched lfc invocation failed. Falling back to one lfc process per file.")
+            host_print_result(batch_result)
+
+    if len(results) == 0:
+        with ThreadPoolExecutor(max_workers=args.lfc_jobs) as executor:
+            futures = {
+                file_path: executor.submit(host_compile_lf_files, args, [file_path], output_path)
+                for file_path in file_paths
+            }
+            results = {file_path: future.result() for file_path, future in futures.items()}
+
+    # Report the results per file.
+    for file_path, result in results.items():
+        print(f"{file_path}: exit code {result.returncode}")
+        if result.returncode != 0:
+            print("Error:", result.stderr)
+    return results
+
+
+def host_compute_cache_key(args, lf_file):
+    """
+    Compute the build cache key of an LF program. The key covers the lfc
+    version, the flags passed to lfc, and the contents of the program and
+    everything it depends on.
+    """
+    h = hashlib.sha256()
+    h.update(host_get_lfc_version().encode())
+    flags = (args.flag or []) + ([] if args.no_tracing else ["--tracing"])
+    h.update("\0".join(flags).encode())
+    for dependency in sorted(host_find_lf_dependencies(lf_file)):
+        h.update(os.path.basename(dependency).encode())
+        with open(dependency, "rb") as file:
+            h.update(file.read())
+    return h.hexdigest()[:16]
+
+
+def host_compute_runtime_key(dir):
+    """
+    Compute the key of the runtime configuration of a generated program. The
+    key covers the runtime sources and the settings in CMakeLists.txt that
+    configure the runtime (e.g., the scheduler, tracing, and the number of
+    workers). Lines referring to the program's own sources are ignored, so
+    that different programs with the same configuration share the key.
+    """
+    dir = Path(dir)
+    h = hashlib.sha256()
+    for runtime_dir in RUNTIME_DIRS:
+        for root, _, filenames in sorted(os.walk(dir / runtime_dir)):
+            for filename in sorted(filenames):
+                path = Path(root) / filename
+                h.update(str(path.relative_to(dir)).encode())
+                with open(path, "rb") as file:
+                    h.update(file.read())
+    with open(dir / "CMakeLists.txt", "r") as file:
+        for line in file:
+            line = line.strip()
+            if re.match(r"(set|add_compile_definitions|add_definitions|target_compile_definitions)\s*\(", line) \
+                    and not re.search(r"\.(c|h|cc|cpp)\b", line) \
+                    and dir.name not in line:
+                h.update(line.encode())
+    return h.hexdigest()[:16]
 
 
 def host_connect_to_remote(args):
@@ -190,6 +391,65 @@ def host_create_dir(dir):
     print("Error:", result.stderr)
 
 
+def host_cross_compile_program(program, entry, args, toolchain_key):
+    """
+    Compile the cached generated code of a program on the host, and stage
+    the executable in a directory laid out like a remote program directory
+    (i.e., <program>/build/<program>). The build is cached per program key and
+    toolchain. Return the cache entry of the staged executable, or None if
+    the compilation failed.
+    """
+    build_root = Path(entry["dir"]).parent / f"{program}-xc-{toolchain_key}"
+    ship_dir = build_root / "ship"
+    exe = ship_dir / "build" / program
+    new_entry = {"key": f"{entry['key']}-xc-{toolchain_key}", "dir": ship_dir, "prebuilt": True}
+    if exe.is_file():
+        print(f"Host build cache hit: {program} ({new_entry['key']})")
+        return new_entry
+
+    build_dir = build_root / "build"
+    cmd = ["cmake", "-S", str(entry["dir"]), "-B", str(build_dir), "-DCMAKE_BUILD_TYPE=Release"]
+    if args.toolchain_file is not None:
+        cmd.append(f"-DCMAKE_TOOLCHAIN_FILE={os.path.abspath(args.toolchain_file)}")
+    if args.sysroot is not None:
+        cmd.append(f"-DCMAKE_SYSROOT={os.path.abspath(args.sysroot)}")
+    result = host_execute_cmd(cmd)
+    if result.returncode == 0:
+        result = host_execute_cmd(["cmake", "--build", str(build_dir)])
+    if result.returncode != 0 or not (build_dir / program).is_file():
+        print(f"Cross-compiling {program} failed.")
+        host_print_result(result)
+        return None
+
+    # Only the executable is shipped to the remote.
+    exe.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(build_dir / program, exe)
+    return new_entry
+
+
+def host_cross_compile_programs(programs, args):
+    """
+    Cross-compile the programs returned by host_update_lfc_cache() in
+    parallel on the host cores. Return the cache entries of the staged
+    executables. Programs that fail to compile are dropped.
+    """
+    # The toolchain is part of the cache key of the executables.
+    h = hashlib.sha256()
+    if args.toolchain_file is not None:
+        with open(args.toolchain_file, "rb") as file:
+            h.update(file.read())
+    h.update(str(args.sysroot).encode())
+    toolchain_key = h.hexdigest()[:8]
+
+    with ThreadPoolExecutor(max_workers=args.build_jobs) as executor:
+        futures = {
+            program: executor.submit(host_cross_compile_program, program, entry, args, toolchain_key)
+            for program, entry in programs.items()
+        }
+        results = {program: future.result() for program, future in futures.items()}
+    return {program: entry for program, entry in results.items() if entry is not None}
+
+
 def host_execute_cmd(cmd, shell=False):
     print("Executing command: " + str(cmd))
     # Enable the lf conda environment and inherit the current environment.
@@ -198,6 +458,46 @@ def host_execute_cmd(cmd, shell=False):
     return subprocess.run(cmd, shell=shell, capture_output=True, text=True, encoding='ISO-8859-1', env=env)
 
 
+def host_fetch_program_results(program, remote_data, args):
+    # Copy the results of a single program back into the data directory.
+    # Results only exist when tracing is on or the program is repeated.
+    if not args.no_tracing or args.repeat > 0:
+        host_create_dir(args.data_dir)
+        host_copy_dir(f"{remote_data}/{program}.*", args.data_dir, args, from_host_to_remote=False)
+
+
+def host_find_lf_dependencies(lf_file, found=None):
+    """
+    Return the set of files that the LF program depends on, including itself.
+    These are imported .lf files (recursively), and the files listed under the
+    `files` and `cmake-include` target properties. Paths that do not exist on
+    the host (e.g., /lib/c/reactor-c/...) are provided by lfc and are covered by
+    the lfc version.
+    """
+    if found is None:
+        found = set()
+    lf_file = os.path.realpath(lf_file)
+    if lf_file in found or not os.path.isfile(lf_file):
+        return found
+    found.add(lf_file)
+    with open(lf_file, "r") as file:
+        content = file.read()
+    lf_dir = os.path.dirname(lf_file)
+    # Imports of other LF files
+    for path in re.findall(r'import\s+[^;"]*?from\s+"([^"]+)"', content):
+        host_find_lf_dependencies(os.path.join(lf_dir, path), found)
+    # Target properties listing additional files
+    for match in re.findall(r'(?:files|cmake-include)\s*:\s*(\[[^\]]*\]|"[^"]*")', content):
+        for path in re.findall(r'"([^"]+)"', match):
+            full_path = os.path.join(lf_dir, path)
+            if os.path.isdir(full_path):
+                for root, _, filenames in os.walk(full_path):
+                    found.update(os.path.realpath(os.path.join(root, f)) for f in filenames)
+            elif os.path.isfile(full_path):
+                found.add(os.path.realpath(full_path))
+    return found
+
+
 # Note: func must accept full_entry_path as the first argument and has at most
 # two other arguments.
 def host_forall_subdirs_do(func, dir, arg1=None, arg2=None, arg3=None):
@@ -208,6 +508,104 @@ def host_forall_subdirs_do(func, dir, arg1=None, arg2=None, arg3=None):
             func(full_entry_path, arg1, arg2, arg3)
 
 
+@lru_cache(maxsize=None)
+def host_get_lfc_version():
+    result = host_execute_cmd(["lfc-dev", "--version"])
+    return result.stdout.strip()
+
+
+@lru_cache(maxsize=None)
+def host_get_lfc_commit():
+    """
+    Return the commit of the lingua-franca submodule that lfc-dev is built
+    from, and whether its working tree has uncommitted changes. Return
+    (None, None) if the submodule is not a git checkout.
+    """
+    lf_dir = Path(__file__).resolve().parent.parent.parent / "lingua-franca"
+    result = host_execute_cmd(["git", "-C", str(lf_dir), "rev-parse", "HEAD"])
+    if result.returncode != 0:
+        return None, None
+    status = host_execute_cmd(["git", "-C", str(lf_dir), "status", "--porcelain"])
+    return result.stdout.strip(), status.stdout.strip() != ""
+
+
+def host_get_sftp():
+    # Open the SFTP channel lazily and keep it open for the whole connection.
+    global sftp
+    if sftp is None:
+        sftp = client.open_sftp()
+    return sftp
+
+
+def host_get_selection(args):
+    # Translate --select and --exclude into lists of .lf file names.
+    selected = None
+    excluded = []
+    if args.select is not None:
+        selected = [prog + ".lf" for prog in args.select] # Add the .lf extension.
+    if args.exclude is not None:
+        excluded = [prog + ".lf" for prog in args.exclude] # Add the .lf extension.
+    return selected, excluded
+
+
+def host_list_lf_files_in_dir(dir, selected, excluded):
+    # Return the .lf files in dir that are selected and not excluded.
+    filenames = []
+    for filename in sorted(os.listdir(dir)):
+        if filename.endswith(".lf"):
+            if filename not in excluded:
+                if selected is None or filename in selected:
+                    filenames.append(filename)
+    return filenames
+
+
+def host_parse_elapsed_times(lines):
+    # Return the execution times (in nsec) printed in the lines of output.
+    times = []
+    for line in lines:
+        match = re.search(ELAPSED_TIME_PATTERN, line)
+        if match:
+            times.append(int(match.group(1).replace(',', '')))
+    return times
+
+
+def host_relative_ci_half_width(times, confidence=0.95):
+    """
+    Return the half-width of the Student t confidence interval of the mean of
+    the times, relative to the mean, or infinity with fewer than two times.
+    """
+    n = len(times)
+    if n < 2:
+        return float("inf")
+    mean = statistics.fmean(times)
+    if mean == 0:
+        return float("inf")
+    half_width = host_t_quantile((1 + confidence) / 2, n - 1) * statistics.stdev(times) / math.sqrt(n)
+    return half_width / abs(mean)
+
+
+def host_t_quantile(p, df):
+    # The p-quantile of the Student t distribution with df degrees of freedom.
+    # It is exact for df = 1 and 2, and from the Cornish-Fisher expansion
+    # around the normal quantile (Abramowitz and Stegun 26.7.5) otherwise,
+    # within 0.2% of the exact value.
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = statistics.NormalDist().inv_cdf(p)
+    return z + (z**3 + z) / (4 * df) \
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2) \
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3) \
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * df**4)
+
+
+def host_print_result(result):
+    print("Exit code:", result.returncode)
+    print("Output:", result.stdout)
+    print("Error:", result.stderr)
+
+
 def host_rm_dir(dir):
     cmd = ["rm", "-rf", dir]
     result = host_execute_cmd(cmd)
@@ -216,48 +614,214 @@ def host_rm_dir(dir):
     print("Error:", result.stderr)
 
 
-def host_scp_dir(src, dest, args, from_host_to_remote=True):
-    _src = src
-    _dest = dest
-    remote_prefix = f"{args.username}@{args.hostname}:"
+def host_copy_dir(src, dest, args, from_host_to_remote=True):
+    """
+    Copy a directory between the host and the remote over SFTP, reusing the
+    ssh connection of the client instead of a new scp handshake per call.
+    Like `scp -r`, if dest is an existing directory, src is copied into it,
+    otherwise dest becomes the copy. When copying from the remote, the last
+    component of src can also be a glob pattern (e.g., `~/data/PingPong.*`),
+    in which case the matching files are copied into dest.
+    Files that already exist at the destination with the same size and
+    SHA-256 hash are skipped. Return the transfer statistics.
+    """
+    sftp = host_get_sftp()
+    start_time = perf_counter()
+    label = str(src)
+
+    # Map each relative path to its source size.
     if from_host_to_remote:
-        _dest = remote_prefix + _dest
+        src = str(src)
+        dest = remote_expand_path(sftp, str(dest))
+        root = posixpath.join(dest, os.path.basename(os.path.normpath(src))) if remote_is_dir(sftp, dest) else dest
+        src_files = {}
+        for dirpath, _, filenames in os.walk(src):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                src_files[os.path.relpath(path, src).replace(os.sep, "/")] = os.path.getsize(path)
+        dest_files = remote_list_files(sftp, root)
+        src_path = lambda rel: os.path.join(src, rel)
+        dest_path = lambda rel: posixpath.join(root, rel)
     else:
-        _src = remote_prefix + _src
-    # Construct the scp command
-    scp_command = f'sshpass -p "{args.password}" scp -r {_src} {_dest}'
-    print(f"Executing: {scp_command}")
-    # Execute the scp command
-    # FIXME: For some reason, to execute this command on macOS, shell must be
-    # True, otherwise the OS returns a File Not Found error.
-    result = host_execute_cmd(scp_command, shell=True)
-    # Check result
-    if result.returncode == 0:
-        print(f"Successfully copied {_src} to {_dest}")
+        src = remote_expand_path(sftp, str(src))
+        dest = str(dest)
+        pattern = None
+        if any(c in posixpath.basename(src) for c in "*?["):
+            src, pattern = posixpath.split(src)
+            root = dest
+        else:
+            root = os.path.join(dest, posixpath.basename(posixpath.normpath(src))) if os.path.isdir(dest) else dest
+        src_files = remote_list_files(sftp, src, pattern)
+        dest_files = {}
+        for rel in src_files:
+            path = os.path.join(root, rel)
+            if os.path.isfile(path):
+                dest_files[rel] = os.path.getsize(path)
+        src_path = lambda rel: posixpath.join(src, rel)
+        dest_path = lambda rel: os.path.join(root, rel)
+
+    # Compare the hashes of the files whose sizes match.
+    candidates = [rel for rel, size in src_files.items() if dest_files.get(rel) == size]
+    if from_host_to_remote:
+        src_hashes = {rel: report.hash_file(src_path(rel)) for rel in candidates}
+        dest_hashes = remote_hash_files(root, candidates)
     else:
-        print(f"Error copying {_src} to {_dest}: {result.stderr}")
+        src_hashes = remote_hash_files(src, candidates)
+        dest_hashes = {rel: report.hash_file(dest_path(rel)) for rel in candidates}
+    unchanged = set(rel for rel in candidates if src_hashes.get(rel) == dest_hashes.get(rel))
+    to_copy = [rel for rel in sorted(src_files) if rel not in unchanged]
+
+    # Create the directories and copy the files.
+    dirs = set(posixpath.dirname(rel) for rel in to_copy)
+    if from_host_to_remote:
+        if len(to_copy) > 0:
+            remote_create_dir(" ".join(shlex.quote(dest_path(d) if d else root) for d in dirs))
+        for rel in to_copy:
+            sftp.put(src_path(rel), dest_path(rel))
+            # Keep the permissions, e.g., the executable bit of binaries.
+            sftp.chmod(dest_path(rel), os.stat(src_path(rel)).st_mode & 0o777)
+    else:
+        for d in dirs:
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+        for rel in to_copy:
+            sftp.get(src_path(rel), dest_path(rel))
+
+    # Report the transfer statistics.
+    elapsed = perf_counter() - start_time
+    stats = {
+        "files": len(to_copy),
+        "skipped": len(unchanged),
+        "bytes": sum(src_files[rel] for rel in to_copy),
+        "seconds": elapsed,
+    }
+    throughput = stats["bytes"] / elapsed / 1e6 if elapsed > 0 else 0
+    direction = "to" if from_host_to_remote else "from"
+    print(f"Copied {label} {direction} the remote: {stats['files']} file(s), {stats['bytes']} bytes in {elapsed:.2f} s ({throughput:.2f} MB/s), {stats['skipped']} unchanged file(s) skipped.")
+    return stats
 
 
 def host_process_trace_data():
     return 1
 
 
+def host_update_lfc_cache(args, dir, src_gen, selected, excluded, cache_dir):
+    """
+    Make sure that every selected program in dir has up-to-date generated code
+    in the build cache, invoking lfc only for programs whose key changed.
+    The cached code is then copied into src_gen, so that src_gen contains
+    exactly the selected programs, as if they were freshly generated.
+    Return a dictionary mapping each program to its cache key and directory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    programs = {}
+    stale = []
+    for filename in host_list_lf_files_in_dir(dir, selected, excluded):
+        program = filename[:-3]
+        key = host_compute_cache_key(args, os.path.join(dir, filename))
+        programs[program] = {"key": key, "dir": Path(cache_dir) / key / program}
+        if programs[program]["dir"].is_dir():
+            print(f"Build cache hit: {program} ({key})")
+        else:
+            stale.append(filename)
+
+    # Generate the stale programs in one batch into a temporary directory, then
+    # move each program to its location in the cache.
+    if len(stale) > 0 and not args.no_lfc:
+        tmp_dir = Path(cache_dir) / f"tmp-{os.getpid()}"
+        host_rm_dir(tmp_dir)
+        host_compile_lf_files_in_dir(args, dir, stale, [], tmp_dir)
+        for filename in stale:
+            program = filename[:-3]
+            generated = tmp_dir / "src-gen" / program
+            if generated.is_dir():
+                programs[program]["dir"].parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(generated), str(programs[program]["dir"]))
+        host_rm_dir(tmp_dir)
+
+    # Drop the programs that could not be generated.
+    for program in list(programs.keys()):
+        if not programs[program]["dir"].is_dir():
+            print(f"Build cache: no generated code for {program}. Skipping.")
+            del programs[program]
+
+    # Populate src-gen from the cache.
+    host_rm_dir(src_gen)
+    os.makedirs(src_gen, exist_ok=True)
+    for program, entry in programs.items():
+        shutil.copytree(entry["dir"], Path(src_gen) / program, symlinks=True)
+        if (entry["dir"] / "CMakeLists.txt").is_file():
+            entry["runtime_key"] = host_compute_runtime_key(entry["dir"])
+    return programs
+
+
 ####################################################
 ###############   Remote Functions   ###############
 ####################################################
 
 
+def remote_apply_run_environment(args):
+    """
+    Apply the low-noise run mode of the arguments (--governor and --irq-cpus)
+    to the remote. The previous governors and IRQ affinities are saved first.
+    Return the environment of the runs, with what is needed to restore the
+    remote (see remote_restore_run_environment()), or None if the low-noise
+    run mode is off.
+    """
+    if args.pin_cpus is None and args.rt_priority is None and args.governor is None and args.irq_cpus is None:
+        return None
+    environment = {
+        "pin_cpus": args.pin_cpus,
+        "rt_priority": args.rt_priority,
+        "governor": args.governor,
+        "irq_cpus": args.irq_cpus,
+        "kernel": remote_read_cmd("uname -r").strip(),
+        "previous": {},
+    }
+    # Save the current settings as "<file> <value>" lines, then apply the new
+    # ones. The IRQs that cannot be moved (e.g., per-CPU timers) are skipped.
+    cmd = ""
+    if args.governor is not None:
+        cmd += f"for f in {CPUFREQ_GOVERNORS}; do echo \"$f $(cat $f)\"; echo {shlex.quote(args.governor)} > $f; done; "
+    if args.irq_cpus is not None:
+        environment["irqbalance"] = remote_read_cmd("systemctl is-active irqbalance 2>/dev/null").strip() == "active"
+        if environment["irqbalance"]:
+            cmd += "systemctl stop irqbalance; "
+        cmd += f"for f in {IRQ_AFFINITIES}; do echo \"$f $(cat $f)\"; echo {shlex.quote(args.irq_cpus)} > $f 2>/dev/null; done; "
+    if cmd != "":
+        _, stdout, stderr = remote_execute_sudo_cmd(cmd, args.password)
+        for line in stdout.read().decode("utf8").splitlines():
+            path, _, value = line.partition(" ")
+            environment["previous"][path] = value
+        remote_print(stderr, is_err=True)
+
+    # Record what was actually applied.
+    if args.governor is not None:
+        environment["governors"] = remote_read_files(CPUFREQ_GOVERNORS)
+        environment["frequencies"] = remote_read_files(CPUFREQ_GOVERNORS.replace("scaling_governor", "scaling_cur_freq"))
+    if args.irq_cpus is not None:
+        affinities = remote_read_files(IRQ_AFFINITIES)
+        environment["irqs_moved"] = sum(value == args.irq_cpus for value in affinities.values())
+        environment["irqs_not_moved"] = sorted(path for path, value in affinities.items() if value != args.irq_cpus)
+    print("Run environment: " + ", ".join(f"{key}={environment[key]}" for key in ["pin_cpus", "rt_priority", "governor", "irq_cpus"]))
+    return environment
+
+
 # FIXME: How to remove arg1 and arg2?
 def remote_compile_cmake_project(dir, arg1, arg2, arg3):
     print("Compiling: " + dir)
     cmd = f"cd {dir} ; mkdir build ; cd build ; cmake .. ; make"
     _, _, stderr = remote_execute_cmd(cmd)
     remote_print(stderr, is_err=True)
+    # Return the exit status of make.
+    return stderr.channel.recv_exit_status()
 
 
 def remote_create_dir(dir):
     command = f"mkdir -p {dir}"
-    remote_execute_cmd(command)
+    _, stdout, _ = remote_execute_cmd(command)
+    # Wait for the directory to exist before issuing the next command.
+    stdout.channel.recv_exit_status()
 
 
 def remote_execute_cmd(cmd):
@@ -266,8 +830,78 @@ def remote_execute_cmd(cmd):
     return stdin, stdout, stderr
 
 
-def remote_forall_files_in_dir_do(func, dir, arg1=None, arg2=None, arg3=None):
-    ls_command = f"find {dir} -maxdepth 1 -type f"  # List all files under the remote dir.
+def remote_execute_run_cmd(cmd, args):
+    # Execute a command built with remote_run_environment_prefix(), which may
+    # need the sudo password on its stdin.
+    stdin, stdout, stderr = remote_execute_cmd(cmd)
+    if args.rt_priority is not None:
+        stdin.write(args.password + "\n")
+        stdin.flush()
+    stdin.channel.shutdown_write()
+    return stdin, stdout, stderr
+
+
+def remote_execute_sudo_cmd(cmd, password):
+    # Execute a shell command as the superuser. The password is passed on
+    # stdin, so it does not show up in the process list of the remote.
+    print("Executing remote command as superuser: " + cmd)
+    stdin, stdout, stderr = client.exec_command(f"sudo -S -p '' sh -c {shlex.quote(cmd)}")
+    stdin.write(password + "\n")
+    stdin.flush()
+    stdin.channel.shutdown_write()
+    return stdin, stdout, stderr
+
+
+def remote_expand_path(sftp, path):
+    # SFTP does not expand ~, so resolve it against the remote home directory.
+    if path == "~" or path.startswith("~/"):
+        return sftp.normalize(".") + path[1:]
+    return path
+
+
+def remote_hash_files(dir, rels):
+    # Return the SHA-256 hashes of the files (relative to dir) in one command.
+    hashes = {}
+    if len(rels) == 0:
+        return hashes
+    cmd = f"cd {shlex.quote(dir)} && sha256sum -- " + " ".join(shlex.quote(rel) for rel in rels)
+    _, stdout, _ = remote_execute_cmd(cmd)
+    for line in stdout.read().decode("utf8").splitlines():
+        digest, _, rel = line.partition("  ")
+        hashes[rel] = digest
+    return hashes
+
+
+def remote_is_dir(sftp, path):
+    try:
+        return stat.S_ISDIR(sftp.stat(path).st_mode)
+    except IOError:
+        return False
+
+
+def remote_list_files(sftp, dir, pattern=None):
+    """
+    Return a dictionary mapping the path (relative to dir) of every file under
+    dir to its size. If pattern is given, only the files directly in dir
+    whose names match the pattern are listed.
+    """
+    files = {}
+    if not remote_is_dir(sftp, dir):
+        return files
+    if pattern is not None:
+        for attr in sftp.listdir_attr(dir):
+            if stat.S_ISREG(attr.st_mode) and fnmatch.fnmatch(attr.filename, pattern):
+                files[attr.filename] = attr.st_size
+        return files
+    _, stdout, _ = remote_execute_cmd(f"find {shlex.quote(dir)} -type f -printf '%s %P\\n'")
+    for line in stdout.read().decode("utf8").splitlines():
+        size, _, rel = line.partition(" ")
+        files[rel] = int(size)
+    return files
+
+
+def remote_forall_files_in_dir_do(func, dir, arg1=None, arg2=None, arg3=None, pattern="*"):
+    ls_command = f"find {dir} -maxdepth 1 -type f -name {shlex.quote(pattern)}"  # List the files under the remote dir that match pattern.
     _, stdout, _ = remote_execute_cmd(ls_command)
     files = stdout.readlines()
     files = [file.strip() for file in files]
@@ -300,6 +934,45 @@ def remote_print(stdout_or_stderr, is_err=False):
     print(f'{prefix}:{stdout_or_stderr.read().decode("utf8")}')
 
 
+def remote_read_cmd(cmd):
+    # Return the standard output of a command.
+    _, stdout, _ = remote_execute_cmd(cmd)
+    return stdout.read().decode("utf8")
+
+
+def remote_read_files(pattern):
+    # Return the first line of every file matching the glob pattern.
+    values = {}
+    for line in remote_read_cmd(f"for f in {pattern}; do echo \"$f $(cat $f 2>/dev/null)\"; done").splitlines():
+        path, _, value = line.partition(" ")
+        values[path] = value
+    return values
+
+
+def remote_record_run_environment(environment, data_dir, bin):
+    # Save the environment of the runs next to their results, as
+    # <program>.env.json, so that it is fetched with them.
+    if environment is None:
+        return
+    sftp = host_get_sftp()
+    with sftp.open(f"{remote_expand_path(sftp, data_dir)}/{bin}.env.json", "w") as file:
+        file.write(json.dumps(environment, indent=4))
+
+
+def remote_restore_run_environment(environment, args):
+    # Restore the governors and IRQ affinities saved by
+    # remote_apply_run_environment(), and restart irqbalance.
+    if environment is None:
+        return
+    cmd = "".join(f"echo {shlex.quote(value)} > {shlex.quote(path)} 2>/dev/null; " for path, value in environment["previous"].items())
+    if environment.get("irqbalance", False):
+        cmd += "systemctl start irqbalance; "
+    if cmd != "":
+        _, stdout, stderr = remote_execute_sudo_cmd(cmd, args.password)
+        stdout.channel.recv_exit_status()
+        remote_print(stderr, is_err=True)
+
+
 def remote_rm_dir(dir):
     cmd = f"rm -rf {dir}"
     _, stdout, stderr = remote_execute_cmd(cmd)
@@ -317,19 +990,80 @@ def remote_run_program(dir, data_dir, command_line_args, arg3=None):
     there too. This directory is likely stored in the remote_data variable.
     """
     bin = os.path.basename(os.path.normpath(dir))
-    cmd = f"cd {data_dir}"
-    if (command_line_args.repeat == 0):
-        cmd += f" && {dir}build/{bin}"
-    else:
-        # Repeat the execution and write outputs in a txt file.
-        cmd += f" && for i in {{1..{command_line_args.repeat}}}; do {dir}build/{bin}; done > {bin}.txt"
-    if not command_line_args.no_tracing:
-        cmd += f" && mv main_0.lft {bin}.lft" # Rename the .lft file to that we know which is which.
-    _, stdout, stderr = remote_execute_cmd(cmd)
-    remote_print(stdout)
-    remote_print(stderr, is_err=True)
+    # Apply the low-noise run mode, if any, and restore the remote afterwards.
+    environment = remote_apply_run_environment(command_line_args)
+    try:
+        remote_record_run_environment(environment, data_dir, bin)
+        if command_line_args.repeat > 0 and command_line_args.target_ci is not None:
+            return remote_run_program_adaptively(dir, data_dir, command_line_args)
+        cmd = f"cd {data_dir}" + remote_run_environment_prefix(command_line_args)
+        if (command_line_args.repeat == 0):
+            cmd += f" && {dir}build/{bin}"
+        else:
+            # Repeat the execution and write outputs in a txt file.
+            cmd += f" && for i in {{1..{command_line_args.repeat}}}; do {dir}build/{bin}; done > {bin}.txt"
+        if not command_line_args.no_tracing:
+            cmd += f" && mv main_0.lft {bin}.lft" # Rename the .lft file to that we know which is which.
+        _, stdout, stderr = remote_execute_run_cmd(cmd, command_line_args)
+        remote_print(stdout)
+        remote_print(stderr, is_err=True)
+    finally:
+        remote_restore_run_environment(environment, command_line_args)
     
 
+def remote_run_environment_prefix(args):
+    """
+    Return the commands that put the shell running the programs in the
+    low-noise run mode: pinned to --pin-cpus and scheduled with SCHED_FIFO at
+    --rt-priority. The programs and their worker threads inherit both.
+    """
+    prefix = ""
+    if args.pin_cpus is not None:
+        prefix += f" && taskset -a -p -c {shlex.quote(args.pin_cpus)} $$ > /dev/null"
+    if args.rt_priority is not None:
+        prefix += f" && sudo -S -p '' chrt -f -p {args.rt_priority} $$"
+    return prefix
+
+
+def remote_run_program_adaptively(dir, data_dir, command_line_args):
+    """
+    Run the program --repeat times, then in batches of --batch-size runs until
+    the confidence interval of its mean execution time is tight enough (see
+    --target-ci) or --max-runs runs are done. The outputs of every batch are
+    appended to the txt file and streamed back to parse the execution times.
+    Return the execution times.
+    """
+    bin = os.path.basename(os.path.normpath(dir))
+    times = []
+    runs = 0
+    batch = min(command_line_args.repeat, command_line_args.max_runs)
+    # The first batch truncates the outputs of a previous run of the program.
+    tee = "tee"
+    while batch > 0:
+        cmd = f"cd {data_dir}" + remote_run_environment_prefix(command_line_args)
+        cmd += f" && for i in {{1..{batch}}}; do {dir}build/{bin}; done | {tee} {bin}.txt"
+        _, stdout, stderr = remote_execute_run_cmd(cmd, command_line_args)
+        # Parse the execution times as the lines come in.
+        times += host_parse_elapsed_times(line for line in stdout)
+        remote_print(stderr, is_err=True)
+        tee = "tee -a"
+        runs += batch
+        half_width = host_relative_ci_half_width(times, command_line_args.confidence)
+        print(f"{bin}: {runs} run(s), relative CI half-width {half_width:.2%} (target {command_line_args.target_ci:.2%}).")
+        if half_width <= command_line_args.target_ci:
+            break
+        batch = min(command_line_args.batch_size, command_line_args.max_runs - runs)
+        # Stop if the program does not print its execution time.
+        if len(times) == 0:
+            print(f"{bin}: no execution time found in the output. Stopping.")
+            break
+    if not command_line_args.no_tracing:
+        # Rename the .lft file of the last run so that we know which is which.
+        _, stdout, _ = remote_execute_cmd(f"cd {data_dir} && mv main_0.lft {bin}.lft")
+        stdout.channel.recv_exit_status()
+    return times
+
+
 def remote_run_trace_conversion(file, dir, convert_for_chrome=False, arg3=None):
     convert_command = f"cd {dir} && trace_to_csv {file}"
     if convert_for_chrome:
@@ -340,6 +1074,138 @@ def remote_run_trace_conversion(file, dir, convert_for_chrome=False, arg3=None):
     remote_print(stderr, is_err=True)
 
 
+def remote_build_cached_program(program, entry, remote_dir, args):
+    """
+    Compile a program in the remote build cache. Return True on success.
+    Prebuilt (cross-compiled) programs only need to be marked as complete.
+    Unless --no-shared-runtime is set, the program is linked against the
+    shared runtime library of its runtime configuration if there is one.
+    Otherwise, the runtime library of the program is saved for the next
+    programs with the same configuration.
+    """
+    prebuilt = entry.get("prebuilt", False)
+    runtime_key = None if args.no_shared_runtime else entry.get("runtime_key")
+    if args.no_cmake and not prebuilt:
+        return True
+    if not prebuilt:
+        shared = runtime_key is not None and remote_link_shared_runtime(remote_dir, runtime_key)
+        status = remote_compile_cmake_project(remote_dir, None, None, None)
+        if status != 0 and shared:
+            # Fall back to compiling the runtime with the program.
+            print(f"Linking {program} against the shared runtime failed. Compiling the runtime instead.")
+            remote_unlink_shared_runtime(remote_dir)
+            shared = False
+            status = remote_compile_cmake_project(remote_dir, None, None, None)
+        if status != 0:
+            print(f"Compiling {program} failed. It will be rebuilt next time.")
+            return False
+        if runtime_key is not None and not shared:
+            remote_save_shared_runtime(remote_dir, runtime_key)
+    # Mark the build as complete, so that later runs can reuse it.
+    _, stdout, _ = remote_execute_cmd(f"touch {remote_dir}build/{CACHE_COMPLETE_STAMP}")
+    stdout.channel.recv_exit_status()
+    return True
+
+
+def remote_link_shared_runtime(remote_dir, runtime_key):
+    """
+    If the runtime cache has a library for the runtime key, patch the
+    CMakeLists.txt of the program, so that the runtime target links the
+    library instead of compiling the runtime sources.
+    Return True if the program was patched.
+    """
+    # The path is used inside CMakeLists.txt, so ~ must be expanded.
+    runtime_cmake = f"{REMOTE_RUNTIME_CACHE}/{runtime_key}/runtime.cmake".replace("~", "$HOME", 1)
+    cmakelists = f"{remote_dir}CMakeLists.txt"
+    cmd = f'test -f "{runtime_cmake}" && grep -q "^add_subdirectory(core)" {cmakelists}'
+    cmd += f' && sed -i "s|^add_subdirectory(core).*$|&\\ninclude({runtime_cmake}) # shared runtime|" {cmakelists}'
+    _, stdout, _ = remote_execute_cmd(cmd)
+    if stdout.channel.recv_exit_status() != 0:
+        return False
+    print(f"Linking {remote_dir} against the shared runtime {runtime_key}.")
+    return True
+
+
+def remote_save_shared_runtime(remote_dir, runtime_key):
+    """
+    Save the runtime library built for a program in the runtime cache, along
+    with a cmake file that makes the runtime target of later programs link
+    it instead of compiling the runtime sources.
+    """
+    runtime_dir = f"{REMOTE_RUNTIME_CACHE}/{runtime_key}"
+    tmp_dir = f"{runtime_dir}.tmp"
+    cmd = f"lib=$(find {remote_dir}build -name 'lib{RUNTIME_TARGET}.a' | head -n 1) && test -n \"$lib\""
+    cmd += f" && rm -rf {tmp_dir} && mkdir -p {tmp_dir} && cp \"$lib\" {tmp_dir}/lib{RUNTIME_TARGET}-shared.a"
+    _, stdout, _ = remote_execute_cmd(cmd)
+    if stdout.channel.recv_exit_status() != 0:
+        print(f"No runtime library found in {remote_dir}build.")
+        return
+
+    sftp = host_get_sftp()
+    tmp_path = remote_expand_path(sftp, tmp_dir)
+    with sftp.open(f"{tmp_path}/empty.c", "w") as file:
+        file.write("typedef int lf_shared_runtime_t;\n")
+    with sftp.open(f"{tmp_path}/runtime.cmake", "w") as file:
+        file.write(
+            "# Generated by run_benchmark.py: link the prebuilt runtime instead of compiling it.\n"
+            "get_filename_component(LF_SHARED_RUNTIME_DIR ${CMAKE_CURRENT_LIST_FILE} DIRECTORY)\n"
+            f"set_property(TARGET {RUNTIME_TARGET} PROPERTY SOURCES ${{LF_SHARED_RUNTIME_DIR}}/empty.c)\n"
+            f"target_link_libraries({RUNTIME_TARGET} PUBLIC ${{LF_SHARED_RUNTIME_DIR}}/lib{RUNTIME_TARGET}-shared.a)\n"
+        )
+    # Publish the runtime only once it is complete.
+    _, stdout, _ = remote_execute_cmd(f"rm -rf {runtime_dir} && mv {tmp_dir} {runtime_dir}")
+    stdout.channel.recv_exit_status()
+    print(f"Saved the shared runtime {runtime_key}.")
+
+
+def remote_sync_cached_program(program, entry, args):
+    """
+    Make sure that the remote build cache holds a compiled copy of the
+    program. The generated code is only copied and compiled if the remote
+    cache does not have a complete build for the program's key.
+    Return the remote program directory.
+    """
+    remote_dir, hit = remote_upload_cached_program(program, entry, args)
+    if not hit:
+        remote_build_cached_program(program, entry, remote_dir, args)
+    return remote_dir
+
+
+def remote_unlink_shared_runtime(remote_dir):
+    # Undo remote_link_shared_runtime() and start from a clean build directory.
+    cmd = f'sed -i "/# shared runtime$/d" {remote_dir}CMakeLists.txt && rm -rf {remote_dir}build'
+    _, stdout, _ = remote_execute_cmd(cmd)
+    stdout.channel.recv_exit_status()
+
+
+def remote_upload_cached_program(program, entry, args):
+    """
+    Copy the generated code of a program into the remote build cache, unless
+    the cache already has a complete build for the program's key. The build
+    runs from the cache, so a miss is copied even with --no-scp.
+    Return the remote program directory and whether the cache was hit.
+    """
+    remote_key_dir = f"{REMOTE_CACHE}/{entry['key']}"
+    remote_dir = f"{remote_key_dir}/{program}/"
+    _, stdout, _ = remote_execute_cmd(f"test -f {remote_dir}build/{CACHE_COMPLETE_STAMP} && echo hit")
+    if stdout.read().decode("utf8").strip() == "hit":
+        print(f"Remote build cache hit: {program} ({entry['key']})")
+        return remote_dir, True
+
+    if args.no_scp:
+        print(f"Remote build cache miss: {program} ({entry['key']}). Copying it despite --no-scp.")
+    remote_rm_dir(remote_key_dir)
+    # The generated code directory is named after the program. A staged
+    # executable directory is not, so it is copied as the program directory
+    # itself.
+    if entry.get("prebuilt", False):
+        host_copy_dir(entry["dir"], remote_dir.rstrip("/"), args, from_host_to_remote=True)
+    else:
+        remote_create_dir(remote_key_dir)
+        host_copy_dir(entry["dir"], remote_key_dir, args, from_host_to_remote=True)
+    return remote_dir, False
+
+
 ####################################################
 ###############         Main         ###############
 ####################################################
@@ -389,25 +1255,35 @@ def main(args=None):
         remote_execute_cmd("hostname")
 
         # Step 4.1.
-        selected = None
-        excluded = []
-        if args.select is not None:
-            selected = [prog + ".lf" for prog in args.select] # Add the .lf extension.
-        if args.exclude is not None:
-            excluded = [prog + ".lf" for prog in args.exclude] # Add the .lf extension.
+        selected, excluded = host_get_selection(args)
         if not args.no_lfc:
-            host_rm_dir(host_src_gen)
-            host_compile_lf_files_in_dir(args, host_src, selected, excluded)
-
-        # Step 4.2.
-        if not args.no_scp:
+            if args.clear_cache:
+                host_rm_dir(benchmarks_dir / HOST_CACHE_DIRNAME)
+                remote_rm_dir(REMOTE_CACHE)
+                remote_rm_dir(REMOTE_RUNTIME_CACHE)
+            programs = host_update_lfc_cache(args, host_src, host_src_gen, selected, excluded, benchmarks_dir / HOST_CACHE_DIRNAME)
+            if args.cross_compile:
+                programs = host_cross_compile_programs(programs, args)
+
+            # Step 4.2 and 4.3: copy and compile the programs missing from the
+            # remote build cache, then link the cached builds into the remote
+            # destination.
             remote_rm_dir(remost_dest)
             remote_create_dir(remost_dest)
-            host_forall_subdirs_do(host_scp_dir, host_src_gen, remost_dest, args, True)
+            for program, entry in programs.items():
+                remote_dir = remote_sync_cached_program(program, entry, args)
+                _, stdout, _ = remote_execute_cmd(f"ln -sfn {remote_dir} {remost_dest}/{program}")
+                stdout.channel.recv_exit_status()
+        else:
+            # Step 4.2.
+            if not args.no_scp:
+                remote_rm_dir(remost_dest)
+                remote_create_dir(remost_dest)
+                host_forall_subdirs_do(host_copy_dir, host_src_gen, remost_dest, args, True)
 
-        # Step 4.3
-        if not args.no_cmake:
-            remote_forall_subdirs_do(remote_compile_cmake_project, remost_dest)
+            # Step 4.3
+            if not args.no_cmake:
+                remote_forall_subdirs_do(remote_compile_cmake_project, remost_dest)
 
         # Step 4.4
         # Skipped. Assuming tracing is in use
@@ -420,8 +1296,10 @@ def main(args=None):
             
             # Step 4.6: run tracing remotely
             if not args.no_tracing:
-                convert_for_chrome = True
-                remote_forall_files_in_dir_do(remote_run_trace_conversion, remote_data, remote_data, convert_for_chrome)
+                if not args.no_parse:
+                    convert_for_chrome = True
+                    # Only the traces, not the <program>.env.json files next to them.
+                    remote_forall_files_in_dir_do(remote_run_trace_conversion, remote_data, remote_data, convert_for_chrome, pattern="*.lft")
 
                 # Step 4.7
                 host_create_dir(host_data)
@@ -430,7 +1308,7 @@ def main(args=None):
                     data_entry_dir = host_data / time
                 else:
                     data_entry_dir = args.data_dir
-                host_scp_dir(remote_data, data_entry_dir, args, from_host_to_remote=False)
+                host_copy_dir(remote_data, data_entry_dir, args, from_host_to_remote=False)
             
             # If this is true, we are doing performance benchmarking.
             # Copy the txt file back to host.
@@ -439,7 +1317,7 @@ def main(args=None):
                     data_entry_dir = host_data / time
                 else:
                     data_entry_dir = args.data_dir
-                host_scp_dir(remote_data, data_entry_dir, args, from_host_to_remote=False)
+                host_copy_dir(remote_data, data_entry_dir, args, from_host_to_remote=False)
             
         # Step 4.8
         host_close_connection_to_remote()
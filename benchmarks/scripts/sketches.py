@@ -0,0 +1,209 @@
+"""
+Mergeable streaming sketches of integer samples (e.g., lags, time differences,
+and execution times in nanoseconds). A sketch combines:
+    - an HDR-histogram style log-linear histogram: values below 2**bits are
+      counted exactly, and larger values in buckets whose width is at most
+      2**-bits of the value, which bounds the relative error of quantiles,
+    - Welford's running count, mean, and sum of squared differences, with
+      the exact minimum and maximum.
+Sketches are updated with batches of samples, merged by adding their counts,
+and saved as JSON, so that the statistics of repeated runs or of different
+boards can be combined without keeping the samples.
+
+A sketch is a dictionary. Use the functions of this module to create,
+update, merge, and query it.
+"""
+
+import json
+import math
+
+import numpy as np
+
+# Buckets per power of two. 7 bits bound the relative error to ~0.8%.
+DEFAULT_BITS = 7
+
+
+def new_sketch(bits=DEFAULT_BITS):
+    return {
+        "bits": bits,
+        "count": 0,
+        "mean": 0.0,
+        "m2": 0.0,
+        "min": None,
+        "max": None,
+        "keys": np.zeros(0, dtype=np.int64),
+        "counts": np.zeros(0, dtype=np.int64),
+    }
+
+
+def bucket_keys(values, bits):
+    # The bucket of every value. Negative values get negative keys, so that
+    # the keys sort like the values.
+    magnitude = np.abs(values)
+    # frexp returns the bit length, exactly for values below 2**53.
+    _, bit_length = np.frexp(magnitude.astype(np.float64))
+    shift = np.maximum(bit_length.astype(np.int64) - 1 - bits, 0)
+    index = (shift << bits) + (magnitude >> shift)
+    return np.where(values < 0, -index - 1, index)
+
+
+def bucket_values(keys, bits):
+    # The value in the middle of every bucket.
+    index = np.where(keys < 0, -keys - 1, keys)
+    shift = np.maximum((index >> bits) - 1, 0)
+    lower = (index - (shift << bits)) << shift
+    middle = lower + ((1 << shift) - 1) / 2
+    return np.where(keys < 0, -middle, middle)
+
+
+def update_sketch(sketch, values):
+    """
+    Add a batch of samples to the sketch, in place. Float samples are rounded
+    to integers. Return the sketch.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        values = np.rint(values[~np.isnan(values)])
+    values = values.astype(np.int64)
+    if len(values) == 0:
+        return sketch
+    batch = {
+        "bits": sketch["bits"],
+        "count": len(values),
+        "mean": float(values.mean()),
+        "m2": float(((values - values.mean()) ** 2).sum()),
+        "min": int(values.min()),
+        "max": int(values.max()),
+    }
+    batch["keys"], batch["counts"] = np.unique(bucket_keys(values, sketch["bits"]), return_counts=True)
+    sketch.update(merge_sketches(sketch, batch))
+    return sketch
+
+
+def merge_sketches(a, b):
+    """
+    Return the sketch of the samples of both sketches. The sketches must have
+    the same number of bits.
+    """
+    if a["bits"] != b["bits"]:
+        raise ValueError(f"Cannot merge sketches with {a['bits']} and {b['bits']} bits.")
+    count = a["count"] + b["count"]
+    if count == 0:
+        return new_sketch(a["bits"])
+
+    # Parallel form of Welford's algorithm (Chan et al.).
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * b["count"] / count
+    m2 = a["m2"] + b["m2"] + delta ** 2 * a["count"] * b["count"] / count
+
+    keys, inverse = np.unique(np.concatenate([a["keys"], b["keys"]]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([a["counts"], b["counts"]]), minlength=len(keys))
+    return {
+        "bits": a["bits"],
+        "count": count,
+        "mean": mean,
+        "m2": m2,
+        "min": min(x for x in [a["min"], b["min"]] if x is not None),
+        "max": max(x for x in [a["max"], b["max"]] if x is not None),
+        "keys": keys.astype(np.int64),
+        "counts": counts.astype(np.int64),
+    }
+
+
+def sketch_quantile(sketch, q):
+    """
+    Return the q-quantile (0 <= q <= 1) of the samples, or NaN if the sketch
+    is empty. The 0- and 1-quantiles are the exact minimum and maximum.
+    """
+    if sketch["count"] == 0:
+        return math.nan
+    if q <= 0:
+        return sketch["min"]
+    if q >= 1:
+        return sketch["max"]
+    rank = min(max(math.ceil(q * sketch["count"]), 1), sketch["count"])
+    bucket = np.searchsorted(np.cumsum(sketch["counts"]), rank, side="left")
+    value = bucket_values(sketch["keys"][bucket], sketch["bits"])
+    return float(min(max(value, sketch["min"]), sketch["max"]))
+
+
+def sketch_rank(sketch, value, side="left"):
+    """
+    Return the number of samples below value ("left") or at most value
+    ("right"), counting the samples of a bucket at its middle value.
+    """
+    middles = np.clip(bucket_values(sketch["keys"], sketch["bits"]), sketch["min"], sketch["max"])
+    below = middles < value if side == "left" else middles <= value
+    return int(sketch["counts"][below].sum())
+
+
+def sketch_statistics(sketch, quantiles=(0.5, 0.99, 0.999)):
+    """
+    Return the count, mean, (sample) standard deviation, minimum, maximum,
+    and the given quantiles (e.g., "p99.9" for 0.999) of the samples.
+    """
+    count = sketch["count"]
+    stats = {
+        "count": count,
+        "mean": sketch["mean"] if count > 0 else math.nan,
+        "std": math.sqrt(sketch["m2"] / (count - 1)) if count > 1 else math.nan,
+        "min": sketch["min"] if count > 0 else math.nan,
+        "max": sketch["max"] if count > 0 else math.nan,
+    }
+    for q in quantiles:
+        stats[f"p{q * 100:g}"] = sketch_quantile(sketch, q)
+    return stats
+
+
+def group_sketches(df, keys, column, bits=DEFAULT_BITS):
+    """
+    Return a sketch of the column for every group of the DataFrame, keyed by
+    the "<key 1>, <key 2>, ..." label used for the plot groups.
+    """
+    result = {}
+    if df is None:
+        return result
+    for group, values in df.groupby(keys, observed=True, sort=True)[column]:
+        group = group if isinstance(group, tuple) else (group,)
+        result[", ".join(str(key) for key in group)] = update_sketch(new_sketch(bits), values.to_numpy())
+    return result
+
+
+def merge_sketch_sets(a, b):
+    # Merge two (nested) dictionaries of sketches, key by key.
+    result = dict(a)
+    for key, value in b.items():
+        if key not in result:
+            result[key] = value
+        elif "bits" in value:
+            result[key] = merge_sketches(result[key], value)
+        else:
+            result[key] = merge_sketch_sets(result[key], value)
+    return result
+
+
+def to_json(value):
+    # Convert a (nested) dictionary of sketches into JSON-compatible values.
+    if "bits" in value:
+        return {**value, "keys": value["keys"].tolist(), "counts": value["counts"].tolist()}
+    return {key: to_json(sketch) for key, sketch in value.items()}
+
+
+def from_json(value):
+    if "bits" in value:
+        return {
+            **value,
+            "keys": np.asarray(value["keys"], dtype=np.int64),
+            "counts": np.asarray(value["counts"], dtype=np.int64),
+        }
+    return {key: from_json(sketch) for key, sketch in value.items()}
+
+
+def save_sketches(path, sketches):
+    with open(path, "w") as file:
+        json.dump(to_json(sketches), file)
+
+
+def load_sketches(path):
+    with open(path, "r") as file:
+        return from_json(json.load(file))
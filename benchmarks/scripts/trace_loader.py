@@ -0,0 +1,475 @@
+"""
+Host-side decoder for the binary .lft trace files written by the reactor-c
+tracing. This replaces running `trace_to_csv` on the board: only the compact
+.lft file needs to be copied back, and the conversion runs on the host.
+
+The .lft format is:
+    - the start time (int64),
+    - the size of the object table (int),
+    - the object table, where each entry is a pointer to a self struct or a
+      trigger, a pointer to the trigger, the object type (int), and a
+      null-terminated description,
+    - a sequence of chunks (one per flush of a worker's trace buffer), each
+      made of the number of records (int) followed by the records.
+
+The records are read through mmap into a NumPy structured array with the
+layout of `trace_record_t`. The pointer size of the board must be given,
+e.g., 8 for a 64-bit RPi4 OS and 4 for a 32-bit ODROID-XU4 OS.
+"""
+
+import glob
+import json
+import mmap
+import os
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import report
+
+# Column names of the CSV files generated by trace_to_csv.
+TRACE_COLUMNS = [
+    "Event",
+    "Reactor",
+    "Source",
+    "Destination",
+    "Elapsed Logical Time",
+    "Microstep",
+    "Elapsed Physical Time",
+    "Trigger",
+    "Extra Delay",
+]
+
+# The decoded records. Times are elapsed since the start time. Reactors and
+# triggers are indices into the object table (-1 if not found). The source is
+# the worker that recorded the event.
+TRACE_DTYPE = np.dtype([
+    ("event", "<i4"),
+    ("reactor", "<i4"),
+    ("source", "<i4"),
+    ("destination", "<i4"),
+    ("logical_time", "<i8"),
+    ("microstep", "<u4"),
+    ("physical_time", "<i8"),
+    ("trigger", "<i4"),
+    ("extra_delay", "<i8"),
+])
+
+# Event names used when the tracing header of reactor-c cannot be found. These
+# are the first entries of `trace_event_names`, which are shared by all
+# versions of reactor-c.
+DEFAULT_EVENT_NAMES = [
+    "Reaction starts",
+    "Reaction ends",
+    "Reaction deadline missed",
+    "Schedule called",
+    "User-defined event",
+    "User-defined valued event",
+    "Worker wait starts",
+    "Worker wait ends",
+    "Scheduler advancing time starts",
+    "Scheduler advancing time ends",
+]
+
+
+def record_dtype(pointer_size=8):
+    # The layout of trace_record_t on the board, including the C padding.
+    ptr = "<u8" if pointer_size == 8 else "<u4"
+    return np.dtype([
+        ("event_type", "<i4"),
+        ("pointer", ptr),
+        ("src_id", "<i4"),
+        ("dst_id", "<i4"),
+        ("logical_time", "<i8"),
+        ("microstep", "<u4"),
+        ("physical_time", "<i8"),
+        ("trigger", ptr),
+        ("extra_delay", "<i8"),
+    ], align=True)
+
+
+def find_trace_header():
+    # Look for the reactor-c header that defines trace_event_names in the
+    # lingua-franca submodule.
+    repo_dir = Path(__file__).resolve().parent.parent.parent
+    for name in ["tracepoint.h", "trace.h"]:
+        pattern = str(repo_dir / "lingua-franca" / "**" / "reactor-c" / "include" / "core" / name)
+        for path in glob.glob(pattern, recursive=True):
+            with open(path, "r") as file:
+                if "trace_event_names" in file.read():
+                    return path
+    return None
+
+
+def load_event_names(header=None):
+    """
+    Return the list of event names indexed by event type, as printed by
+    trace_to_csv. They are parsed from the `trace_event_names` array of the
+    reactor-c header in use, so that the events added by the static scheduler
+    (e.g., the PretVM instructions) are decoded with the right names.
+    """
+    if header is None:
+        header = find_trace_header()
+    if header is None:
+        print("WARNING: reactor-c tracing header not found. Only the default event names are known.")
+        return list(DEFAULT_EVENT_NAMES)
+    with open(header, "r") as file:
+        content = file.read()
+    # Remove comments before extracting the string literals.
+    content = re.sub(r"/\*.*?\*/|//[^\n]*", "", content, flags=re.DOTALL)
+    match = re.search(r"trace_event_names\s*\[\s*\]\s*=\s*\{(.*?)\};", content, flags=re.DOTALL)
+    if match is None:
+        return list(DEFAULT_EVENT_NAMES)
+    return re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(1))
+
+
+def read_lft(path, pointer_size=8):
+    """
+    Decode an .lft file. Return a dictionary with the start time, the object
+    table (a list of (pointer, trigger, type, description) tuples), and the
+    records as a structured array of TRACE_DTYPE.
+    """
+    trace = None
+    chunks = []
+    for trace in iter_lft(path, pointer_size):
+        chunks.append(trace["records"])
+    trace["records"] = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    return trace
+
+
+def iter_lft(path, pointer_size=8, chunksize=None):
+    """
+    Decode an .lft file in chunks of at most chunksize records (all records
+    at once if None). Yield dictionaries with the start time, the object
+    table, and the records of the chunk as a structured array of TRACE_DTYPE.
+    At least one (possibly empty) chunk is yielded.
+    """
+    ptr_dtype = np.dtype("<u8" if pointer_size == 8 else "<u4")
+    rec_dtype = record_dtype(pointer_size)
+    pending = []
+    with open(path, "rb") as file:
+        # mmap cannot map an empty file.
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError(f"Empty trace file: {path}")
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        start_time = int(np.frombuffer(buffer, dtype="<i8", count=1, offset=0)[0])
+        table_size = int(np.frombuffer(buffer, dtype="<i4", count=1, offset=8)[0])
+        offset = 12
+
+        # Object table
+        objects = []
+        for _ in range(table_size):
+            pointer, trigger = np.frombuffer(buffer, dtype=ptr_dtype, count=2, offset=offset)
+            offset += 2 * pointer_size
+            object_type = int(np.frombuffer(buffer, dtype="<i4", count=1, offset=offset)[0])
+            offset += 4
+            end = buffer.find(b"\0", offset)
+            description = buffer[offset:end].decode("utf8", errors="replace")
+            offset = end + 1
+            objects.append((int(pointer), int(trigger), object_type, description))
+        pointers = [o[0] for o in objects]
+        triggers = [o[1] for o in objects]
+
+        def decode(raw):
+            # Convert into the compact decoded layout. This copies the records
+            # out of the mapped file.
+            records = np.empty(len(raw), dtype=TRACE_DTYPE)
+            records["event"] = raw["event_type"]
+            records["reactor"] = lookup_objects(raw["pointer"], pointers)
+            records["source"] = raw["src_id"]
+            records["destination"] = raw["dst_id"]
+            records["logical_time"] = raw["logical_time"] - start_time
+            records["microstep"] = raw["microstep"]
+            records["physical_time"] = raw["physical_time"] - start_time
+            records["trigger"] = lookup_objects(raw["trigger"], triggers)
+            records["extra_delay"] = raw["extra_delay"]
+            return {"start_time": start_time, "objects": objects, "records": records}
+
+        # Record chunks, as flushed by the workers. They are regrouped into
+        # chunks of chunksize records.
+        pending_count = 0
+        yielded = False
+        while offset + 4 <= len(buffer):
+            count = int(np.frombuffer(buffer, dtype="<i4", count=1, offset=offset)[0])
+            offset += 4
+            if count <= 0 or offset + count * rec_dtype.itemsize > len(buffer):
+                break
+            pending.append(np.frombuffer(buffer, dtype=rec_dtype, count=count, offset=offset))
+            pending_count += count
+            offset += count * rec_dtype.itemsize
+            while chunksize is not None and pending_count >= chunksize:
+                raw = np.concatenate(pending)
+                yield decode(raw[:chunksize])
+                yielded = True
+                pending = [raw[chunksize:]]
+                pending_count -= chunksize
+        if pending_count > 0 or not yielded:
+            raw = np.concatenate(pending) if len(pending) > 0 else np.zeros(0, dtype=rec_dtype)
+            yield decode(raw)
+    finally:
+        # The pending records are views of the mapped file. They must be
+        # released before closing it, also if the generator is closed early.
+        pending = None
+        buffer.close()
+
+
+def lookup_objects(pointers, table):
+    """
+    Return, for each pointer, the index of the first equal non-null entry in
+    the table, or -1 if there is none.
+    """
+    table = np.asarray(table, dtype=np.uint64)
+    result = np.full(len(pointers), -1, dtype=np.int32)
+    valid = np.nonzero(table != 0)[0]
+    if len(valid) == 0:
+        return result
+    # Keep the first occurrence of each pointer, like a linear search would.
+    unique, first = np.unique(table[valid], return_index=True)
+    index = valid[first]
+    pointers = np.asarray(pointers, dtype=np.uint64)
+    pos = np.clip(np.searchsorted(unique, pointers), 0, len(unique) - 1)
+    found = unique[pos] == pointers
+    result[found] = index[pos[found]]
+    return result
+
+
+def lft_to_dataframe(trace, event_names=None):
+    """
+    Convert a decoded trace into a DataFrame with the same columns and values
+    as the CSV file generated by trace_to_csv.
+    """
+    if event_names is None:
+        event_names = load_event_names()
+    records = trace["records"]
+    descriptions = [o[3] for o in trace["objects"]]
+
+    # Label lookups are done once per distinct value, not once per record.
+    names = np.array(list(event_names) + ["UNKNOWN EVENT"], dtype=object)
+    events = names[np.clip(records["event"], 0, len(event_names))]
+    events[records["event"] < 0] = "UNKNOWN EVENT"
+    reactor_names = np.array(descriptions + ["NO REACTOR"], dtype=object)
+    trigger_names = np.array(descriptions + ["NO TRIGGER"], dtype=object)
+
+    return pd.DataFrame({
+        "Event": events,
+        "Reactor": reactor_names[records["reactor"]],
+        "Source": records["source"],
+        "Destination": records["destination"],
+        "Elapsed Logical Time": records["logical_time"],
+        "Microstep": records["microstep"],
+        "Elapsed Physical Time": records["physical_time"],
+        "Trigger": trigger_names[records["trigger"]],
+        "Extra Delay": records["extra_delay"],
+    })
+
+
+# Typed columns of a loaded trace. Strings are categoricals, times are int64.
+CATEGORICAL_COLUMNS = ["Event", "Reactor", "Trigger"]
+INT_COLUMNS = ["Source", "Destination", "Elapsed Logical Time", "Microstep", "Elapsed Physical Time", "Extra Delay"]
+
+# Reactors that are filtered out of the reaction analyses.
+IGNORED_REACTOR_PREFIXES = ("delay", "NO REACTOR")
+
+
+def read_trace(csv, pointer_size=8):
+    """
+    Read a trace as a DataFrame with typed columns. The CSV file is read if
+    it exists. Otherwise, the .lft file with the same name is decoded on the
+    host. Raise FileNotFoundError if neither exists.
+    """
+    csv = Path(csv)
+    if csv.is_file():
+        # trace_to_csv separates the values with ", ", so skip the leading
+        # spaces while parsing instead of stripping every string afterwards.
+        header = pd.read_csv(csv, nrows=0, skipinitialspace=True).columns
+        names = {column.strip(): column for column in header}
+        dtype = {names[c]: "category" for c in CATEGORICAL_COLUMNS if c in names}
+        dtype.update({names[c]: "int64" for c in INT_COLUMNS if c in names})
+        df = pd.read_csv(csv, skipinitialspace=True, dtype=dtype)
+        df.columns = df.columns.str.strip()
+    else:
+        lft = csv.with_suffix(".lft")
+        if not lft.is_file():
+            raise FileNotFoundError(str(csv))
+        df = lft_to_dataframe(read_lft(lft, pointer_size))
+        for column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype("category")
+    # The source is the worker number. Keep numeric categories so that it
+    # sorts numerically.
+    df["Source"] = df["Source"].astype("int64").astype("category")
+    return df
+
+
+def iter_trace_chunks(csv, pointer_size=8, chunksize=1000000):
+    """
+    Read a trace in chunks of at most chunksize rows, like read_trace(). The
+    chunks have the same columns, but the strings are not categoricals, since
+    the categories of the chunks would differ. Raise FileNotFoundError if
+    neither the CSV file nor the .lft file exists.
+    """
+    csv = Path(csv)
+    if csv.is_file():
+        header = pd.read_csv(csv, nrows=0, skipinitialspace=True).columns
+        names = {column.strip(): column for column in header}
+        dtype = {names[c]: "int64" for c in INT_COLUMNS if c in names}
+        with pd.read_csv(csv, skipinitialspace=True, dtype=dtype, chunksize=chunksize) as reader:
+            for df in reader:
+                df.columns = df.columns.str.strip()
+                yield df
+    else:
+        lft = csv.with_suffix(".lft")
+        if not lft.is_file():
+            raise FileNotFoundError(str(csv))
+        event_names = load_event_names()
+        for trace in iter_lft(lft, pointer_size, chunksize):
+            yield lft_to_dataframe(trace, event_names)
+
+
+def load_trace(csv, pointer_size=8, cache=False):
+    """
+    Load a trace once for all analyses. Return a dictionary with:
+        - "events": every event of the trace,
+        - "reactions": the "Reaction starts" and "Reaction ends" events,
+          without the delay and NO REACTOR reactors, sorted by Reactor,
+          Destination, and Elapsed Physical Time.
+    Both frames are shared by the analyses and must not be modified in
+    place. With pandas copy-on-write enabled, deriving new columns from
+    them never copies or changes the shared data.
+
+    If cache is True, the decoded trace is kept in a cache next to the trace
+    (see read_trace_cache()) and reloaded from there while the trace does
+    not change.
+    """
+    if cache:
+        source = trace_source(csv)
+        cache_dir = trace_cache_dir(source)
+        trace = read_trace_cache(cache_dir, source, pointer_size)
+        if trace is not None:
+            return trace
+
+    events = read_trace(csv, pointer_size)
+    reactor = events["Reactor"]
+    # Evaluate the string filters once per category instead of once per row.
+    ignored_categories = [c for c in reactor.cat.categories if str(c).strip().startswith(IGNORED_REACTOR_PREFIXES)]
+    keep = events["Event"].isin(["Reaction starts", "Reaction ends"]) & ~reactor.isin(ignored_categories)
+    reactions = events[keep].sort_values(by=["Reactor", "Destination", "Elapsed Physical Time"])
+
+    if cache:
+        try:
+            write_trace_cache(cache_dir, trace_cache_key(source, pointer_size), events, reactions.index.to_numpy())
+        except OSError as e:
+            print(f"WARNING: cannot write the trace cache {cache_dir}: {e}")
+    return {"events": events, "reactions": reactions}
+
+
+# Version of the decoded trace layout. Bump it whenever read_trace() or
+# load_trace() changes what they return, to invalidate the existing caches.
+TRACE_CACHE_VERSION = 1
+TRACE_CACHE_SUFFIX = ".cache"
+TRACE_CACHE_METADATA = "metadata.json"
+
+
+def trace_source(csv):
+    # The file that read_trace() decodes: the CSV file, or else the .lft file.
+    csv = Path(csv)
+    if csv.is_file():
+        return csv
+    lft = csv.with_suffix(".lft")
+    if lft.is_file():
+        return lft
+    raise FileNotFoundError(str(csv))
+
+
+def trace_cache_dir(source):
+    # E.g., NP/PingPong.csv is cached in NP/PingPong.csv.cache/.
+    return source.with_name(source.name + TRACE_CACHE_SUFFIX)
+
+
+def trace_cache_key(source, pointer_size):
+    # The key of a cached trace. The size and modification time let a reload
+    # skip hashing the trace when it was not touched.
+    stat = source.stat()
+    return {
+        "version": TRACE_CACHE_VERSION,
+        "source": source.name,
+        "pointer_size": pointer_size if source.suffix == ".lft" else None,
+        "sha256": report.hash_file(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def write_trace_cache(cache_dir, key, events, reaction_rows):
+    """
+    Write the decoded events to cache_dir, one .npy file per column, and the
+    rows of the reactions frame. Categoricals are stored as their codes, with
+    the categories in the metadata file. The metadata file is written last,
+    so an interrupted write leaves an invalid cache.
+    """
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    cache_dir.mkdir()
+    columns = []
+    for i, (name, column) in enumerate(events.items()):
+        entry = {"name": name, "file": f"{i}.npy"}
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            entry["categories"] = column.cat.categories.tolist()
+            values = column.cat.codes.to_numpy()
+        else:
+            values = column.to_numpy()
+        if values.dtype == object:
+            raise OSError(f"column {name} cannot be cached")
+        np.save(cache_dir / entry["file"], values)
+        columns.append(entry)
+    np.save(cache_dir / "reactions.npy", reaction_rows.astype(np.int64))
+    with open(cache_dir / TRACE_CACHE_METADATA, "w") as file:
+        json.dump({**key, "columns": columns}, file, indent=4)
+
+
+def read_trace_cache(cache_dir, source, pointer_size):
+    """
+    Reload a trace written by write_trace_cache(), like load_trace(). The
+    columns are memory-mapped instead of read. Return None if there is no
+    cache, or if it was written by another version of this module, with
+    another pointer size, or from another content of the trace.
+    """
+    try:
+        with open(cache_dir / TRACE_CACHE_METADATA, "r") as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if metadata.get("version") != TRACE_CACHE_VERSION or metadata.get("source") != source.name:
+        return None
+    if metadata.get("pointer_size") != (pointer_size if source.suffix == ".lft" else None):
+        return None
+    stat = source.stat()
+    if stat.st_size != metadata["size"]:
+        return None
+    if stat.st_mtime_ns != metadata["mtime_ns"]:
+        # The trace was touched, e.g., fetched again. Only its content matters.
+        if report.hash_file(source) != metadata["sha256"]:
+            return None
+        metadata["mtime_ns"] = stat.st_mtime_ns
+        try:
+            with open(cache_dir / TRACE_CACHE_METADATA, "w") as file:
+                json.dump(metadata, file, indent=4)
+        except OSError:
+            pass
+
+    try:
+        columns = {}
+        for entry in metadata["columns"]:
+            # A plain view of the mapping, so that pandas sees an ndarray.
+            values = np.load(cache_dir / entry["file"], mmap_mode="r").view(np.ndarray)
+            if "categories" in entry:
+                values = pd.Categorical.from_codes(values, categories=entry["categories"])
+            columns[entry["name"]] = values
+        reaction_rows = np.load(cache_dir / "reactions.npy")
+    except (OSError, ValueError, KeyError):
+        return None
+    events = pd.DataFrame(columns, copy=False)
+    return {"events": events, "reactions": events.iloc[reaction_rows]}
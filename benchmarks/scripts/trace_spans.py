@@ -0,0 +1,205 @@
+"""
+Reconstruction of spans, i.e., pairs of a start event and its end event, from
+a trace loaded by trace_loader. The events are matched with sorted NumPy
+arrays instead of per-group Python loops, so that traces with millions of
+events can be processed.
+
+Reaction invocations are matched per worker and reaction. Within a group,
+the events are ordered by a single int64 key that combines the group code
+and the rank of the physical time, with ties broken by trace order. Each
+start is then matched with the first end of its group after it through
+`np.searchsorted`.
+
+PretVM instructions are matched per worker with their nesting level, see
+reconstruct_instruction_spans().
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def sort_keys(groups, times):
+    """
+    Combine group codes and times into int64 keys that sort by group first,
+    by time second, and by row last. The times are replaced by their rank,
+    so the keys cannot overflow regardless of the time range. Events with
+    equal timestamps keep their trace order, e.g., an end stays before the
+    next start of its group.
+    """
+    ranks = np.empty(len(times), dtype=np.int64)
+    ranks[np.lexsort((np.arange(len(times)), times))] = np.arange(len(times))
+    return groups.astype(np.int64) * (len(times) + 1) + ranks
+
+
+def match_spans(groups, times, is_start):
+    """
+    Match the start and end events given as parallel arrays, in trace
+    order. A start is matched with the first end of its group after it (in
+    time, then in trace order), unless another start of the group comes in
+    between (the start is then unmatched).
+    Return (starts, ends), the row positions of the matched pairs ordered by
+    start row, and the row positions of the unmatched starts and ends.
+    """
+    keys = sort_keys(groups, times)
+    start_rows = np.flatnonzero(is_start)
+    end_rows = np.flatnonzero(~is_start)
+    start_rows = start_rows[np.argsort(keys[start_rows], kind="stable")]
+    end_rows = end_rows[np.argsort(keys[end_rows], kind="stable")]
+
+    if len(start_rows) == 0 or len(end_rows) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, start_rows, end_rows
+
+    candidates = np.searchsorted(keys[end_rows], keys[start_rows], side="left")
+    found = candidates < len(end_rows)
+    candidates = np.minimum(candidates, len(end_rows) - 1)
+    matched = found & (groups[end_rows[candidates]] == groups[start_rows])
+    # Candidates are non-decreasing, so a start whose end is also the
+    # candidate of the next start has no end of its own.
+    claimed_by_next = np.append(candidates[1:] == candidates[:-1], False) & np.append(matched[1:], False)
+    matched &= ~claimed_by_next
+
+    starts = start_rows[matched]
+    ends = end_rows[candidates[matched]]
+    order = np.argsort(starts, kind="stable")
+    unmatched_ends = np.setdiff1d(end_rows, ends, assume_unique=True)
+    return starts[order], ends[order], start_rows[~matched], unmatched_ends
+
+
+def pair_reaction_invocations(reactions):
+    """
+    Pair every "Reaction starts" event with its "Reaction ends" event, per
+    worker (Source) and reaction (Reactor, Destination). `reactions` holds
+    the "reactions" frame of trace_loader.load_trace(). Return a dictionary
+    with:
+        - "invocations": the start event of every invocation, in the order
+          of `reactions`, with its "Execution Time",
+        - "unmatched_starts" and "unmatched_ends": the number of events
+          without a counterpart, e.g., at the end of a truncated trace.
+    """
+    groups = reactions.groupby(["Source", "Reactor", "Destination"], observed=True, sort=False).ngroup().to_numpy()
+    times = reactions["Elapsed Physical Time"].to_numpy()
+    is_start = (reactions["Event"] == "Reaction starts").to_numpy()
+    starts, ends, unmatched_starts, unmatched_ends = match_spans(groups, times, is_start)
+
+    invocations = reactions.iloc[starts].assign(**{"Execution Time": times[ends] - times[starts]})
+    return {
+        "invocations": invocations,
+        "unmatched_starts": len(unmatched_starts),
+        "unmatched_ends": len(unmatched_ends),
+    }
+
+
+# PretVM instructions whose spans are reconstructed by default. Their end
+# events are named "End <opcode>".
+INSTRUCTION_OPCODES = ["ADD", "ADDI", "ADV", "ADVI", "BEQ", "BGE", "BLT", "BNE", "JAL", "JALR", "STP"]
+
+# PretVM instructions that execute reactions or wait. Their spans contain
+# other events, so they are only reconstructed on request.
+BLOCKING_OPCODES = ["EXE", "DU", "WU", "WLT"]
+
+
+def classify_instruction_events(names, opcodes=INSTRUCTION_OPCODES):
+    """
+    Classify the event names (a Series) as PretVM instruction events. Return
+    the index of the opcode in opcodes of every event (-1 if the event is not
+    an instruction of opcodes), and whether the event is an end event.
+    """
+    if not isinstance(names.dtype, pd.CategoricalDtype):
+        names = names.astype("category")
+
+    # Classify each event name once. The extra last entry is for code -1.
+    categories = [str(c).strip() for c in names.cat.categories]
+    index = {opcode: i for i, opcode in enumerate(opcodes)}
+    category_opcode = np.full(len(categories) + 1, -1, dtype=np.int64)
+    category_is_end = np.zeros(len(categories) + 1, dtype=bool)
+    for i, name in enumerate(categories):
+        if name in index:
+            category_opcode[i] = index[name]
+        elif name.startswith("End ") and name[4:] in index:
+            category_opcode[i] = index[name[4:]]
+            category_is_end[i] = True
+    codes = names.cat.codes.to_numpy()
+    return category_opcode[codes], category_is_end[codes]
+
+
+def match_nested_spans(workers, times, opcode, is_end):
+    """
+    Match the start and end events of instructions, given as parallel arrays
+    in any order. This is the vectorized form of a stack per worker: the
+    nesting level of every event is computed with a cumulative sum, and a
+    start is matched with the end that directly follows it at the same
+    level. A start and an end with different opcodes are not matched. An
+    event dropped from the trace only leaves its own counterpart unmatched.
+
+    Return (starts, ends, open_starts), the positions of the matched pairs
+    ordered by worker and start time, and the positions of the starts that
+    are still open after the last event, i.e., the content of the stacks.
+    """
+    # Order the events by worker and time. lexsort is stable, so events with
+    # equal timestamps keep the order in which they were given.
+    order = np.lexsort((times, workers))
+    workers = workers[order]
+    is_end = is_end[order]
+    opcode = opcode[order]
+
+    # Nesting level: the depth after a start, or before an end, per worker.
+    depth = np.cumsum(np.where(is_end, -1, 1))
+    boundary = np.ones(len(workers), dtype=bool)
+    boundary[1:] = workers[1:] != workers[:-1]
+    first = np.flatnonzero(boundary)
+    offset = np.where(first > 0, depth[first - 1], 0)
+    depth -= np.repeat(offset, np.diff(np.r_[first, len(workers)]))
+    level = np.where(is_end, depth + 1, depth)
+
+    # Within a (worker, level), a matched start is directly followed by its end.
+    by_level = np.lexsort((np.arange(len(level)), level, workers))
+    current = by_level[:-1]
+    following = by_level[1:]
+    same_level = (workers[current] == workers[following]) & (level[current] == level[following])
+    matched = ~is_end[current] & is_end[following] & same_level \
+        & (opcode[current] == opcode[following])
+    starts = current[matched]
+    ends = following[matched]
+    starts_order = np.argsort(starts, kind="stable")
+
+    # A start is still open if no event follows it at its level.
+    last = np.ones(len(by_level), dtype=bool)
+    last[:-1] = ~same_level
+    open_starts = np.sort(by_level[last & ~is_end[by_level]])
+    return order[starts[starts_order]], order[ends[starts_order]], order[open_starts]
+
+
+def reconstruct_instruction_spans(events, opcodes=INSTRUCTION_OPCODES):
+    """
+    Reconstruct the spans of the given PretVM instructions per worker
+    (Source), see match_nested_spans(). `events` holds the "events" frame of
+    trace_loader.load_trace().
+
+    Return a dictionary with:
+        - "spans": a DataFrame with the "Opcode" (categorical), "Worker",
+          "Start Time", and "Duration" of every span, sorted by worker and
+          start time,
+        - "unmatched_starts" and "unmatched_ends": the number of events
+          without a counterpart.
+    """
+    opcodes = list(opcodes)
+    opcode, is_end = classify_instruction_events(events["Event"], opcodes)
+    rows = np.flatnonzero(opcode >= 0)
+    workers = np.asarray(events["Source"].to_numpy()[rows], dtype=np.int64)
+    times = events["Elapsed Physical Time"].to_numpy()[rows]
+    opcode = opcode[rows]
+    is_end = is_end[rows]
+    starts, ends, _ = match_nested_spans(workers, times, opcode, is_end)
+
+    spans = pd.DataFrame({
+        "Opcode": pd.Categorical.from_codes(opcode[starts], categories=opcodes),
+        "Worker": workers[starts],
+        "Start Time": times[starts],
+        "Duration": times[ends] - times[starts],
+    })
+    return {
+        "spans": spans,
+        "unmatched_starts": int(np.count_nonzero(~is_end)) - len(starts),
+        "unmatched_ends": int(np.count_nonzero(is_end)) - len(ends),
+    }
@@ -0,0 +1,332 @@
+"""
+Streaming computation of the timing metrics of experiment_timing.py, for
+traces that are too large to be loaded at once. The trace is read in chunks
+of a fixed number of rows (see trace_loader.iter_trace_chunks()), and only
+bounded state is carried from one chunk to the next:
+    - for every group of every metric (the timing precision, the lag, and
+      the reaction execution time of each (Reactor, Destination), and the
+      duration of each PretVM (instruction, worker)): its sketch (see
+      sketches.py) and its reservoir of the most extreme values (see
+      binned_plots.update_extremes()),
+    - timing precision: the last start of each (Reactor, Destination), and
+      a window of the latest reaction starts of all groups, which are
+      reordered by physical time before their differences are taken (the
+      starts that arrive too late for the window are counted and dropped),
+    - timing accuracy: the lags of each (Reactor, Destination) at the last
+      tag seen so far, since the last tag of the trace is not counted,
+    - reaction execution times: the reaction starts that are not ended yet,
+      per worker and reaction,
+    - instruction spans: the instructions that are not ended yet, i.e., the
+      stack of each worker,
+    - if requested, the lag sketches at a bounded number of points of the
+      trace, for the frames of the timing accuracy animation.
+None of this grows with the length of the trace, so the peak memory is set
+by the chunk size and the number of groups. The plots are drawn from these
+summaries (see binned_plots.sketch_summaries()).
+"""
+
+import numpy as np
+import pandas as pd
+
+import binned_plots
+import sketches
+import trace_loader
+import trace_spans
+
+# Same rules as post_process_timing_accuracy() in experiment_timing.py.
+WARMUP_LOGICAL_TIME = 20000000
+MIN_GROUP_SIZE = 20
+
+# Number of reaction starts held back to reorder the starts of the workers
+# by physical time before the time differences are taken.
+DEFAULT_REORDER_WINDOW = 100000
+
+REACTION_KEYS = ["Source", "Reactor", "Destination"]
+REACTION_COLUMNS = ["Event", "Reactor", "Source", "Destination", "Elapsed Physical Time"]
+
+
+def select_reactions(chunk):
+    # Keep the reaction events, without the delay and NO REACTOR reactors.
+    keep = chunk["Event"].isin(["Reaction starts", "Reaction ends"]) \
+        & ~chunk["Reactor"].str.strip().str.startswith(trace_loader.IGNORED_REACTOR_PREFIXES)
+    return chunk[keep]
+
+
+def new_group():
+    return {"sketch": sketches.new_sketch(), "extremes": None}
+
+
+def update_group(group, values, limit, **context):
+    # Add a batch of values (with their context columns) to a group.
+    sketches.update_sketch(group["sketch"], values)
+    group["extremes"] = binned_plots.update_extremes(group["extremes"], values, limit, **context)
+
+
+def rows_by_code(codes, num_codes):
+    # The rows of every code (0 to num_codes - 1) that has rows, in order.
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(num_codes + 1))
+    for code in range(num_codes):
+        if bounds[code + 1] > bounds[code]:
+            yield code, order[bounds[code]:bounds[code + 1]]
+
+
+def factorize_keys(keys):
+    # The code of every row, and the key (a tuple) of every code, in order
+    # of first appearance.
+    if len(keys[0]) == 0:
+        return np.zeros(0, dtype=np.int64), []
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays(keys))
+    return codes, list(uniques)
+
+
+def update_groups(groups, keys, values, limit, **context):
+    # Add the values to the groups of their keys (a list of columns).
+    codes, uniques = factorize_keys(keys)
+    for code, rows in rows_by_code(codes, len(uniques)):
+        update_group(groups.setdefault(uniques[code], new_group()), values[rows], limit, **{name: column[rows] for name, column in context.items()})
+
+
+def update_time_differences(state, reactions, window, limit):
+    """
+    Add the time differences between the consecutive reaction starts of
+    every (Reactor, Destination) to its group. The workers flush their
+    events in blocks, so the starts of a group are not in order of physical
+    time in the trace. The latest window starts are held back and sorted
+    with the next chunk, so the differences are exact as long as no start
+    is recorded window starts or more after a later one. A start that
+    arrives after a later start of its group was already taken is late: it
+    is counted in state["late"] and dropped, instead of giving a wrong (or
+    negative) difference. Pass a reactions frame of None to flush the held
+    starts at the end of the trace.
+    """
+    held = state["held"]
+    if reactions is not None:
+        df = reactions[reactions["Event"] == "Reaction starts"]
+        codes, uniques = factorize_keys([df["Reactor"].to_numpy(), df["Destination"].to_numpy()])
+        ids = np.array([state["ids"].setdefault(key, len(state["ids"])) for key in uniques] + [0], dtype=np.int64)[codes]
+        held = (np.concatenate([held[0], ids]), np.concatenate([held[1], df["Elapsed Physical Time"].to_numpy()]))
+    emitted = len(held[0]) - (window if reactions is not None else 0)
+    if emitted <= 0:
+        state["held"] = held
+        return
+    order = np.argsort(held[1], kind="stable")
+    emit = order[:emitted]
+    state["held"] = (held[0][order[emitted:]], held[1][order[emitted:]])
+
+    # The emitted starts of a group, in order of physical time, after the
+    # last start emitted before.
+    times = held[1][emit]
+    keys = list(state["ids"].keys())
+    for group_id, rows in rows_by_code(held[0][emit], len(keys)):
+        group_times = times[rows]
+        key = keys[group_id]
+        if key in state["last"]:
+            late = group_times < state["last"][key]
+            state["late"] += int(np.count_nonzero(late))
+            group_times = np.concatenate([[state["last"][key]], group_times[~late]])
+        state["last"][key] = group_times[-1]
+        if len(group_times) > 1:
+            update_group(state["groups"].setdefault(key, new_group()), np.diff(group_times), limit)
+
+
+def update_lags(state, reactions, limit):
+    """
+    Add the lags of the reaction starts after the warm-up to the group of
+    their (Reactor, Destination), with their logical and physical times.
+    The starts at the last tag seen so far are kept pending, since the
+    starts of the last tag of the trace (the shutdown phase) are not
+    counted. They are added once a later tag is seen.
+    """
+    df = reactions[(reactions["Event"] == "Reaction starts") & (reactions["Elapsed Logical Time"] >= WARMUP_LOGICAL_TIME)]
+    logical_times = df["Elapsed Logical Time"].to_numpy()
+    physical_times = df["Elapsed Physical Time"].to_numpy()
+    added = []
+    for key, rows in df.groupby(["Reactor", "Destination"], sort=False).indices.items():
+        group = state["groups"].setdefault(key, {**new_group(), "last_tag": None, "pending": []})
+        last_tag = logical_times[rows].max()
+        if group["last_tag"] is None or last_tag > group["last_tag"]:
+            added += [(key, *pending) for pending in group["pending"]]
+            group["pending"] = []
+            group["last_tag"] = last_tag
+        at_last_tag = logical_times[rows] == group["last_tag"]
+        added.append((key, logical_times[rows[~at_last_tag]], physical_times[rows[~at_last_tag]]))
+        group["pending"].append((logical_times[rows[at_last_tag]], physical_times[rows[at_last_tag]]))
+    if len(added) == 0:
+        return
+
+    # Add the lags in order of physical time, so that the snapshots of the
+    # animation are prefixes of the run.
+    keys = [key for key, _, _ in added]
+    codes = np.repeat(np.arange(len(added)), [len(logical) for _, logical, _ in added])
+    logical = np.concatenate([logical for _, logical, _ in added])
+    physical = np.concatenate([physical for _, _, physical in added])
+    order = np.argsort(physical, kind="stable")
+    codes = codes[order]
+    logical = logical[order]
+    physical = physical[order]
+    frames = state["frames"]
+    if frames is None:
+        add_lags(state, keys, codes, logical, physical, limit)
+        return
+    # Split the lags at the snapshots. The interval between the snapshots
+    # doubles whenever there would be more than twice the number of frames.
+    while (frames["count"] + len(order)) // frames["interval"] > 2 * frames["num_frames"]:
+        frames["interval"] *= 2
+        frames["snapshots"] = frames["snapshots"][1::2]
+    start = 0
+    while start < len(order):
+        end = min(len(order), start + frames["interval"] - frames["count"] % frames["interval"])
+        add_lags(state, keys, codes[start:end], logical[start:end], physical[start:end], limit)
+        frames["count"] += end - start
+        if frames["count"] % frames["interval"] == 0:
+            frames["snapshots"].append({key: dict(group["sketch"]) for key, group in state["groups"].items()})
+        start = end
+
+
+def add_lags(state, keys, codes, logical, physical, limit):
+    # Add the lags of the rows to the groups of keys[code].
+    for code, rows in rows_by_code(codes, len(keys)):
+        update_group(state["groups"][keys[code]], physical[rows] - logical[rows], limit,
+                     **{"Elapsed Logical Time": logical[rows], "Elapsed Physical Time": physical[rows]})
+
+
+def pair_reactions(open_starts, reactions):
+    """
+    Pair the reaction starts and ends of a chunk, after the starts left open
+    by the previous chunks. A worker records the start of a reaction before
+    its end, so an end is never in an earlier chunk than its start.
+    Return (invocations, open_starts, unmatched_starts, unmatched_ends).
+    """
+    frame = pd.concat([open_starts, reactions[REACTION_COLUMNS]], ignore_index=True)
+    groups = frame.groupby(REACTION_KEYS, sort=False).ngroup().to_numpy()
+    times = frame["Elapsed Physical Time"].to_numpy()
+    is_start = (frame["Event"] == "Reaction starts").to_numpy()
+    starts, ends, unmatched_starts, unmatched_ends = trace_spans.match_spans(groups, times, is_start)
+
+    # An unmatched start that is the last event of its group may be ended in
+    # a later chunk.
+    last_row = np.full(groups.max() + 1 if len(groups) > 0 else 0, -1)
+    np.maximum.at(last_row, groups, np.arange(len(groups)))
+    still_open = unmatched_starts == last_row[groups[unmatched_starts]]
+
+    invocations = frame.iloc[starts][REACTION_KEYS + ["Elapsed Physical Time"]]
+    invocations = invocations.assign(**{"Execution Time": times[ends] - times[starts]})
+    return invocations, frame.iloc[unmatched_starts[still_open]], int(np.count_nonzero(~still_open)), len(unmatched_ends)
+
+
+def stream_timing_metrics(csv, pointer_size=8, chunksize=1000000, opcodes=None, outlier_limit=binned_plots.DEFAULT_OUTLIER_LIMIT, num_frames=None, reorder_window=DEFAULT_REORDER_WINDOW):
+    """
+    Compute the timing metrics of a trace in chunks of chunksize rows. The
+    reaction starts are reordered by physical time in a window of
+    reorder_window starts (see update_time_differences()).
+    Return a dictionary with:
+        - "groups": the sketch and the reservoir of the outlier_limit
+          smallest and largest values (see binned_plots.update_extremes())
+          of every group of the "time_difference", the "lag" (with the
+          logical and physical times of the lags), and the
+          "execution_time", keyed by (Reactor, Destination), and of the
+          "vm_execution_time" of the given PretVM opcodes, keyed by (Opcode,
+          Worker) in order of first appearance (None if opcodes is None),
+        - "sketches": the sketches (see sketches.py) of the "lag", the
+          "time_difference", and the "execution_time" of every group,
+          keyed by the labels of the plot groups,
+        - "lag_snapshots": if num_frames is given, the lag sketches of every
+          (Reactor, Destination) after every "interval" lags, in order of
+          physical time, with the total "count" of lags (see
+          experiment_timing.timing_accuracy_animation()), else None,
+        - "unmatched": the number of unmatched reaction and instruction
+          events,
+        - "late_starts": the number of reaction starts that arrived too late
+          for the reorder window, and are not in the "time_difference".
+    Raise FileNotFoundError if the trace does not exist.
+    """
+    precision = {"ids": {}, "held": (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)), "last": {}, "groups": {}, "late": 0}
+    frames = None if num_frames is None else {"num_frames": num_frames, "interval": 1, "count": 0, "snapshots": []}
+    accuracy = {"groups": {}, "frames": frames}
+    execution_times = {}
+    open_reactions = pd.DataFrame({column: pd.Series(dtype=np.int64) for column in REACTION_COLUMNS})
+    unmatched = {"reaction_starts": 0, "reaction_ends": 0, "instruction_starts": 0, "instruction_ends": 0}
+    if opcodes is not None:
+        opcodes = list(opcodes)
+        open_instructions = (np.zeros(0, dtype=np.int64),) * 3
+        spans = {}
+        span_firsts = {}
+
+    for chunk in trace_loader.iter_trace_chunks(csv, pointer_size, chunksize):
+        reactions = select_reactions(chunk)
+        update_time_differences(precision, reactions, reorder_window, outlier_limit)
+        update_lags(accuracy, reactions, outlier_limit)
+
+        invocations, open_reactions, unmatched_starts, unmatched_ends = pair_reactions(open_reactions, reactions)
+        update_groups(
+            execution_times,
+            [invocations["Reactor"].to_numpy(), invocations["Destination"].to_numpy()],
+            invocations["Execution Time"].to_numpy(),
+            outlier_limit,
+        )
+        unmatched["reaction_starts"] += unmatched_starts
+        unmatched["reaction_ends"] += unmatched_ends
+
+        if opcodes is not None:
+            opcode, is_end = trace_spans.classify_instruction_events(chunk["Event"], opcodes)
+            rows = np.flatnonzero(opcode >= 0)
+            # Prepend the instructions left open by the previous chunks.
+            workers = np.concatenate([open_instructions[0], chunk["Source"].to_numpy()[rows].astype(np.int64)])
+            times = np.concatenate([open_instructions[1], chunk["Elapsed Physical Time"].to_numpy()[rows]])
+            opcode = np.concatenate([open_instructions[2], opcode[rows]])
+            is_end = np.concatenate([np.zeros(len(open_instructions[0]), dtype=bool), is_end[rows]])
+            span_starts, span_ends, open_starts = trace_spans.match_nested_spans(workers, times, opcode, is_end)
+            span_keys = [np.asarray(opcodes, dtype=object)[opcode[span_starts]], workers[span_starts]]
+            update_groups(spans, span_keys, times[span_ends] - times[span_starts], outlier_limit)
+            # The first start of every group, to order the groups by worker
+            # and first start, as the span table.
+            codes, uniques = factorize_keys(span_keys)
+            firsts = np.full(len(uniques), np.iinfo(np.int64).max)
+            np.minimum.at(firsts, codes, times[span_starts])
+            for key, first in zip(uniques, firsts):
+                span_firsts[key] = min(span_firsts.get(key, first), first)
+            open_instructions = (workers[open_starts], times[open_starts], opcode[open_starts])
+            unmatched["instruction_starts"] += int(np.count_nonzero(~is_end)) - len(span_starts) - len(open_starts)
+            unmatched["instruction_ends"] += int(np.count_nonzero(is_end)) - len(span_ends)
+        del chunk, reactions, invocations
+
+    # The starts that are still open at the end of the trace are unmatched.
+    unmatched["reaction_starts"] += len(open_reactions)
+    update_time_differences(precision, None, reorder_window, outlier_limit)
+
+    # The pending lags are at the last tag and are dropped, like the groups
+    # with too few starts left.
+    lags = {
+        key: {"sketch": group["sketch"], "extremes": group["extremes"]}
+        for key, group in sorted(accuracy["groups"].items())
+        if group["sketch"]["count"] >= MIN_GROUP_SIZE
+    }
+    groups = {
+        "time_difference": dict(sorted(precision["groups"].items())),
+        "lag": lags,
+        "execution_time": dict(sorted(execution_times.items())),
+        "vm_execution_time": None,
+    }
+    if opcodes is not None:
+        unmatched["instruction_starts"] += len(open_instructions[0])
+        groups["vm_execution_time"] = {key: spans[key] for key in sorted(spans, key=lambda key: (key[1], span_firsts[key]))}
+
+    lag_snapshots = None
+    if frames is not None:
+        lag_snapshots = {
+            "interval": frames["interval"],
+            "count": frames["count"],
+            "snapshots": [{key: snapshot[key] for key in lags if key in snapshot} for snapshot in frames["snapshots"]],
+        }
+
+    return {
+        "groups": groups,
+        "sketches": {
+            metric: {f"{reactor}, {destination}": group["sketch"] for (reactor, destination), group in groups[metric].items()}
+            for metric in ["lag", "time_difference", "execution_time"]
+        },
+        "lag_snapshots": lag_snapshots,
+        "unmatched": unmatched,
+        "late_starts": precision["late"],
+    }